@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+'''
+Measures how long it takes for a mixer to switch source: from the API call (e.g. cut_to_source) to
+the first frame leaving the mixer that shows the new source.
+
+Brave is run within this process, so that each frame can be inspected as it leaves the mixer's
+compositor. Several inputs are created, each a different solid colour, and the mixer is repeatedly
+switched between them. The colour of the centre pixel shows which input is in the mix.
+
+This is repeated for each input type and mixer size. Results (percentiles, in milliseconds, of both the
+API call itself and the time until the first new frame) are printed as JSON. Usage:
+
+    benchmarks/cut.py [--switches N] [--input-type test_video image] [--mixer-size 640x360 1920x1080]
+'''
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import gi
+import yaml
+gi.require_version('Gst', '1.0')
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gi.repository import Gst  # noqa: E402
+import brave.api  # noqa: E402
+import brave.config  # noqa: E402
+import brave.session  # noqa: E402
+from brave.helpers import run_on_master_thread_when_idle  # noqa: E402
+from transports import percentile  # noqa: E402
+
+# The test_video patterns used for the inputs, and the (red, green, blue) colour of each:
+PATTERNS = [(4, (255, 0, 0)), (5, (0, 255, 0)), (6, (0, 0, 255)), (3, (255, 255, 255))]
+COLOUR_TOLERANCE = 40
+FRAME_TIMEOUT = 5
+SETTLE_TIME = 0.3
+
+
+def setup_args():
+    parser = argparse.ArgumentParser(description='Benchmark the time for a mixer to switch source')
+    parser.add_argument('--switches', type=int, default=50, help='number of times to switch, per operation')
+    parser.add_argument('--input-type', nargs='*', default=['test_video', 'image'], choices=['test_video', 'image'])
+    parser.add_argument('--mixer-size', nargs='*', default=['640x360', '1280x720', '1920x1080'],
+                        help='mixer size(s), as WIDTHxHEIGHT')
+    parser.add_argument('--transport', help='transport between the inputs and mixer (default: the config default)')
+    parser.add_argument('--port', type=int, default=5103, help='port for Brave\'s API')
+    return vars(parser.parse_args())
+
+
+def api(method, path, body=None):
+    request = urllib.request.Request('http://localhost:%d%s' % (args['port'], path), method=method,
+                                     data=json.dumps(body).encode() if body is not None else None)
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read().decode())
+
+
+def run_on_master_thread_and_block(func):
+    '''
+    Runs the function on the master thread (which runs GStreamer), waiting for it to complete.
+    '''
+    done = threading.Event()
+
+    def runner():
+        func()
+        done.set()
+
+    run_on_master_thread_when_idle(runner)
+    done.wait()
+
+
+def create_image(pattern, width, height):
+    '''
+    Creates a PNG of a single colour, for the image input type. Returns its URI.
+    '''
+    location = os.path.join(tempfile.gettempdir(), 'brave_benchmark_pattern%d.png' % pattern)
+    pipeline = Gst.parse_launch('videotestsrc num-buffers=1 pattern=%d ! video/x-raw,width=%d,height=%d ! '
+                                'videoconvert ! pngenc ! filesink location=%s' % (pattern, width, height, location))
+    pipeline.set_state(Gst.State.PLAYING)
+    pipeline.get_bus().timed_pop_filtered(Gst.CLOCK_TIME_NONE, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+    pipeline.set_state(Gst.State.NULL)
+    return 'file://' + location
+
+
+class FrameWatcher():
+    '''
+    Watches the frames leaving a mixer, noting when the first frame of a given colour appears.
+    '''
+
+    def __init__(self, mixer, width, height):
+        # The mixer's output is RGBA, so the centre pixel is at:
+        self._offset = ((height // 2) * width + (width // 2)) * 4
+        self._expected_colour = None
+        self._seen = threading.Event()
+        self.seen_at = None
+        pad = mixer.video_output_queue.get_static_pad('sink')
+        pad.add_probe(Gst.PadProbeType.BUFFER, self._on_frame)
+
+    def expect(self, colour):
+        self.seen_at = None
+        self._seen.clear()
+        self._expected_colour = colour
+
+    def wait(self):
+        return self._seen.wait(FRAME_TIMEOUT)
+
+    def _on_frame(self, pad, info):
+        if self._expected_colour is not None:
+            success, map_info = info.get_buffer().map(Gst.MapFlags.READ)
+            if success:
+                pixel = map_info.data[self._offset:self._offset + 3]
+                info.get_buffer().unmap(map_info)
+                if all(abs(a - b) <= COLOUR_TOLERANCE for a, b in zip(pixel, self._expected_colour)):
+                    self.seen_at = time.monotonic()
+                    self._expected_colour = None
+                    self._seen.set()
+        return Gst.PadProbeReturn.OK
+
+
+def timed_switch(watcher, colour, method, path, body):
+    '''
+    Makes the API call, and returns the time (in ms) for it to respond, and for the new colour to appear.
+    '''
+    watcher.expect(colour)
+    start = time.monotonic()
+    api(method, path, body)
+    api_time = time.monotonic() - start
+    if not watcher.wait():
+        return api_time * 1000, None
+    return api_time * 1000, (watcher.seen_at - start) * 1000
+
+
+def summarise(times):
+    return {
+        'api_ms': {'p50': percentile([t[0] for t in times], 50), 'p95': percentile([t[0] for t in times], 95)},
+        'frame_ms': {
+            'p50': percentile([t[1] for t in times if t[1] is not None], 50),
+            'p95': percentile([t[1] for t in times if t[1] is not None], 95),
+            'max': max([t[1] for t in times if t[1] is not None], default=None)
+        },
+        'timeouts': len([t for t in times if t[1] is None])
+    }
+
+
+def benchmark(session, input_type, width, height):
+    input_ids = []
+    for pattern, colour in PATTERNS:
+        if input_type == 'image':
+            details = {'type': 'image', 'uri': create_image(pattern, width, height)}
+        else:
+            details = {'type': 'test_video', 'pattern': pattern, 'width': width, 'height': height}
+        input_ids.append(api('PUT', '/api/inputs', details)['id'])
+    mixer_id = api('PUT', '/api/mixers', {'width': width, 'height': height})['id']
+    mixer_path = '/api/mixers/%d' % mixer_id
+    time.sleep(2)
+
+    watchers = []
+    run_on_master_thread_and_block(lambda: watchers.append(FrameWatcher(session.mixers[mixer_id], width, height)))
+    watcher = watchers[0]
+
+    def source(index):
+        body = {'uid': 'input%d' % input_ids[index % len(input_ids)]}
+        if args['transport']:
+            body['transport'] = args['transport']
+        return body, PATTERNS[index % len(PATTERNS)][1]
+
+    # Start with the first input in the mix:
+    timed_switch(watcher, source(0)[1], 'POST', mixer_path + '/cut_to_source', source(0)[0])
+    times = {'cut_to_source': [], 'overlay_source': [], 'remove_source': []}
+    for i in range(1, args['switches'] + 1):
+        body, colour = source(i)
+        times['cut_to_source'].append(timed_switch(watcher, colour, 'POST', mixer_path + '/cut_to_source', body))
+        time.sleep(SETTLE_TIME)
+
+        # Overlay the next input on top, then remove it, so that the first is visible again:
+        overlay_body, overlay_colour = source(i + 1)
+        times['overlay_source'].append(timed_switch(watcher, overlay_colour, 'POST', mixer_path + '/overlay_source',
+                                                    {**overlay_body, 'zorder': 10}))
+        time.sleep(SETTLE_TIME)
+        times['remove_source'].append(timed_switch(watcher, colour, 'POST', mixer_path + '/remove_source',
+                                                   overlay_body))
+        time.sleep(SETTLE_TIME)
+
+    api('DELETE', mixer_path)
+    for id in input_ids:
+        api('DELETE', '/api/inputs/%d' % id)
+    time.sleep(1)
+
+    return {
+        'input_type': input_type,
+        'mixer_width': width,
+        'mixer_height': height,
+        **{operation: summarise(t) for operation, t in times.items()}
+    }
+
+
+def run_benchmarks(session):
+    results = []
+    try:
+        for input_type in args['input_type']:
+            for size in args['mixer_size']:
+                width, height = [int(n) for n in size.split('x')]
+                print('Benchmarking switching %s inputs on a %dx%d mixer...' % (input_type, width, height),
+                      file=sys.stderr)
+                results.append(benchmark(session, input_type, width, height))
+        print(json.dumps(results, indent=2))
+    finally:
+        run_on_master_thread_when_idle(session.end)
+
+
+def start_api_when_ready(session):
+    threading.Thread(target=brave.api.RestApi, args=(session,), name='api-thread', daemon=True).start()
+    start = time.time()
+    while time.time() - start < 30:
+        try:
+            api('GET', '/api/all')
+            break
+        except OSError:
+            time.sleep(0.5)
+    run_benchmarks(session)
+
+
+if __name__ == '__main__':
+    args = setup_args()
+    with tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False) as config_file:
+        yaml.dump({'enable_audio': False, 'api_port': args['port'], 'mixers': []}, config_file)
+    brave.config.init(config_file.name)
+    os.remove(config_file.name)
+
+    session = brave.session.init()
+    threading.Thread(target=start_api_when_ready, args=(session,), name='benchmark-thread', daemon=True).start()
+    session.start()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+'''
+Measures glass-to-glass latency through Brave: from a frame being created by an input, to it being
+received from an output.
+
+Brave is started with a test_video input that has 'timestamp_marker' set, so that the time each frame
+is created is drawn into the frame. The input is routed through one of several chains (see SCENARIOS)
+to a TCP output. This script receives that output, decodes it, reads the time from each frame (with
+'simplevideomarkdetect') and so works out the latency. Both must run on the same machine (or have
+synchronised clocks).
+
+Results are printed as JSON. Usage:
+
+    benchmarks/latency.py [--duration SECONDS] [--scenario NAME ...]
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import gi
+import yaml
+gi.require_version('Gst', '1.0')
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gi.repository import Gst, GLib  # noqa: E402
+from brave.inputs.test_video import TIMESTAMP_MARKER_PROPERTIES, TIMESTAMP_MARKER_MASK, \
+    timestamp_marker_now  # noqa: E402
+from mixing import BRAVE, wait_until_playing  # noqa: E402
+from transports import percentile  # noqa: E402
+
+API_PORTS = [5101, 5102]
+TCP_PORTS = [7101, 7102]
+MIXER = {'width': 640, 'height': 360}
+MARKED_INPUT = {'type': 'test_video', 'timestamp_marker': True, **MIXER}
+
+# Latencies above this are assumed to be misread markers:
+MAX_LATENCY_MS = 60000
+
+
+def tcp_output(source, port):
+    return {'type': 'tcp', 'source': source, 'host': '127.0.0.1', 'port': port, **MIXER}
+
+
+# Each scenario is a list of Brave configs, each started in turn. The last one's TCP output is measured.
+SCENARIOS = {
+    'input': [
+        {'inputs': [MARKED_INPUT], 'outputs': [tcp_output('input1', TCP_PORTS[0])]}
+    ],
+    'mixer': [
+        {'inputs': [MARKED_INPUT], 'mixers': [{**MIXER, 'sources': [{'uid': 'input1'}]}],
+         'outputs': [tcp_output('mixer1', TCP_PORTS[0])]}
+    ],
+    'mixer_to_mixer': [
+        {'inputs': [MARKED_INPUT],
+         'mixers': [{**MIXER, 'sources': [{'uid': 'input1'}]}, {**MIXER, 'sources': [{'uid': 'mixer1'}]}],
+         'outputs': [tcp_output('mixer2', TCP_PORTS[0])]}
+    ],
+    # Like tests/test_tcp.py, one Brave's TCP output is the input of another:
+    'tcp_round_trip': [
+        {'inputs': [MARKED_INPUT], 'outputs': [tcp_output('input1', TCP_PORTS[0])]},
+        {'inputs': [{'type': 'tcp_client', 'host': '127.0.0.1', 'port': TCP_PORTS[0]}],
+         'outputs': [tcp_output('input1', TCP_PORTS[1])]}
+    ]
+}
+
+
+def setup_args():
+    parser = argparse.ArgumentParser(description='Measure glass-to-glass latency through Brave')
+    parser.add_argument('--duration', type=int, default=20, help='seconds to measure each scenario for')
+    parser.add_argument('--warmup', type=int, default=5, help='seconds to wait before measuring')
+    parser.add_argument('--scenario', nargs='*', default=list(SCENARIOS.keys()), help='scenario(s) to run')
+    return vars(parser.parse_args())
+
+
+def start_brave(config, api_port):
+    with tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False) as config_file:
+        yaml.dump({'enable_audio': False, **config}, config_file)
+    process = subprocess.Popen([sys.executable, BRAVE, '-c', config_file.name],
+                               env={**os.environ, 'PORT': str(api_port)},
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_playing(api_port, process)
+    finally:
+        os.remove(config_file.name)
+    return process
+
+
+def measure(port, warmup, duration):
+    '''
+    Receives Brave's TCP output on the given port, and returns the latency of each frame, in milliseconds.
+    '''
+    pipeline = Gst.parse_launch('tcpclientsrc host=127.0.0.1 port=%d ! tsdemux ! decodebin ! videoconvert ! '
+                                'video/x-raw,format=I420 ! simplevideomarkdetect name=detect ! '
+                                'fakesink sync=false' % port)
+    detect = pipeline.get_by_name('detect')
+    for name, value in TIMESTAMP_MARKER_PROPERTIES.items():
+        detect.set_property(name, value)
+
+    latencies = []
+    measuring = {'started': False}
+
+    # A sync handler, so that the time is taken on the streaming thread, as soon as the frame is read:
+    def on_message(bus, message):
+        structure = message.get_structure()
+        if measuring['started'] and structure.get_name() == 'GstSimpleVideoMarkDetect' and \
+                structure.get_value('have-pattern'):
+            latency = (timestamp_marker_now() - structure.get_value('data')) & TIMESTAMP_MARKER_MASK
+            if latency < MAX_LATENCY_MS:
+                latencies.append(latency)
+
+    def start_measuring():
+        measuring['started'] = True
+        return False
+
+    bus = pipeline.get_bus()
+    bus.enable_sync_message_emission()
+    bus.connect('sync-message::element', on_message)
+
+    mainloop = GLib.MainLoop()
+    pipeline.set_state(Gst.State.PLAYING)
+    GLib.timeout_add(warmup * 1000, start_measuring)
+    GLib.timeout_add((warmup + duration) * 1000, mainloop.quit)
+    mainloop.run()
+    pipeline.set_state(Gst.State.NULL)
+    return latencies
+
+
+def run_scenario(name, args):
+    processes = []
+    try:
+        for config, api_port in zip(SCENARIOS[name], API_PORTS):
+            processes.append(start_brave(config, api_port))
+        latencies = measure(SCENARIOS[name][-1]['outputs'][0]['port'], args['warmup'], args['duration'])
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+        # Give the ports time to be released before the next scenario:
+        time.sleep(1)
+
+    return {
+        'latency_ms': {
+            'mean': sum(latencies) / len(latencies) if latencies else None,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'max': max(latencies) if latencies else None
+        },
+        'samples': len(latencies)
+    }
+
+
+if __name__ == '__main__':
+    Gst.init(None)
+    args = setup_args()
+    results = {}
+    for name in args['scenario']:
+        print('Measuring latency of the "%s" scenario for %d seconds...' % (name, args['duration']), file=sys.stderr)
+        results[name] = run_scenario(name, args)
+    print(json.dumps(results, indent=2))
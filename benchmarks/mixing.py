@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+'''
+Benchmarks how well Brave mixes an increasing number of inputs.
+
+For each number of inputs (N), Brave is started with a generated config file: N test_video inputs,
+tiled (like config/video_wall.yaml) into each of one or more mixers, each mixer having an 'image'
+output. Once everything is playing, the frame rate achieved by each mixer, the frames dropped (as
+reported by QoS messages), and Brave's CPU and memory (RSS) usage are measured from /metrics.
+
+Only test sources and image outputs are used, so no network, display or GPU is needed.
+Results are printed as JSON, so that releases can be compared. Usage:
+
+    benchmarks/mixing.py [--inputs N ...] [--mixers M] [--duration SECONDS] [--output FILE]
+'''
+import argparse
+import json
+import math
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import psutil
+import yaml
+
+BRAVE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'brave.py')
+METRIC_REGEX = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+LABEL_REGEX = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+STARTUP_TIMEOUT = 60
+
+
+def setup_args():
+    parser = argparse.ArgumentParser(description='Benchmark Brave mixing an increasing number of inputs')
+    parser.add_argument('--inputs', type=int, nargs='*', default=[1, 4, 9, 16, 25], help='number(s) of inputs')
+    parser.add_argument('--mixers', type=int, default=1, help='number of mixers, each mixing every input')
+    parser.add_argument('--width', type=int, default=640, help='width of each mixer')
+    parser.add_argument('--height', type=int, default=360, help='height of each mixer')
+    parser.add_argument('--warmup', type=int, default=5, help='seconds to wait before measuring')
+    parser.add_argument('--duration', type=int, default=20, help='seconds to measure for')
+    parser.add_argument('--port', type=int, default=5099, help='port for Brave\'s API')
+    parser.add_argument('--output', help='file to write the JSON results to (default: stdout)')
+    return vars(parser.parse_args())
+
+
+def create_config(num_inputs, num_mixers, width, height):
+    '''
+    Returns a Brave config with the inputs tiled across each mixer.
+    '''
+    columns = math.ceil(math.sqrt(num_inputs))
+    rows = math.ceil(num_inputs / columns)
+    tile_width, tile_height = width // columns, height // rows
+    sources = [{'uid': 'input%d' % (i + 1), 'width': tile_width, 'height': tile_height,
+                'xpos': (i % columns) * tile_width, 'ypos': (i // columns) * tile_height}
+               for i in range(num_inputs)]
+    return {
+        'enable_audio': False,
+        'inputs': [{'type': 'test_video', 'pattern': i % 25, 'width': tile_width, 'height': tile_height}
+                   for i in range(num_inputs)],
+        'mixers': [{'width': width, 'height': height, 'sources': sources} for _ in range(num_mixers)],
+        'outputs': [{'type': 'image', 'source': 'mixer%d' % (i + 1),
+                     'location': os.path.join(tempfile.gettempdir(), 'brave_benchmark_mixer%d.jpg' % (i + 1))}
+                    for i in range(num_mixers)]
+    }
+
+
+def api_get(port, path):
+    with urllib.request.urlopen('http://localhost:%d%s' % (port, path), timeout=5) as response:
+        return response.read().decode()
+
+
+def wait_until_playing(port, process):
+    '''
+    Waits until Brave is running, and every input, mixer and output is in the PLAYING state.
+    '''
+    start = time.time()
+    while time.time() - start < STARTUP_TIMEOUT:
+        if process.poll() is not None:
+            raise RuntimeError('Brave exited with code %d' % process.returncode)
+        try:
+            blocks = json.loads(api_get(port, '/api/all'))
+            if all(block.get('state') == 'PLAYING'
+                   for collection in ['inputs', 'mixers', 'outputs'] for block in blocks[collection]):
+                return time.time() - start
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError('Brave did not reach the PLAYING state within %d seconds' % STARTUP_TIMEOUT)
+
+
+def get_metrics(port):
+    '''
+    Returns a dictionary of (metric name, labels) to value, from Brave's /metrics.
+    '''
+    metrics = {}
+    for line in api_get(port, '/metrics').splitlines():
+        match = METRIC_REGEX.match(line)
+        if match:
+            labels = tuple(sorted(LABEL_REGEX.findall(match.group(2) or '')))
+            metrics[(match.group(1), labels)] = float(match.group(3))
+    return metrics
+
+
+def increase(before, after, name):
+    '''
+    Returns, per set of labels, how much a counter has increased by.
+    '''
+    return {labels: value - before.get((metric_name, labels), 0)
+            for (metric_name, labels), value in after.items() if metric_name == name}
+
+
+def benchmark(num_inputs, args):
+    config = create_config(num_inputs, args['mixers'], args['width'], args['height'])
+    with tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False) as config_file:
+        yaml.dump(config, config_file)
+
+    process = subprocess.Popen([sys.executable, BRAVE, '-c', config_file.name],
+                               env={**os.environ, 'PORT': str(args['port'])},
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        startup_seconds = wait_until_playing(args['port'], process)
+        time.sleep(args['warmup'])
+
+        brave_process = psutil.Process(process.pid)
+        metrics_before, cpu_before, time_before = get_metrics(args['port']), brave_process.cpu_times(), time.time()
+        time.sleep(args['duration'])
+        metrics_after, cpu_after, time_after = get_metrics(args['port']), brave_process.cpu_times(), time.time()
+        rss = brave_process.memory_info().rss
+    finally:
+        process.terminate()
+        process.wait()
+        os.remove(config_file.name)
+
+    elapsed = time_after - time_before
+    mixer_fps = [frames / elapsed for frames in increase(metrics_before, metrics_after,
+                                                         'brave_video_frames_total').values()]
+    dropped = increase(metrics_before, metrics_after, 'brave_qos_dropped_total').values()
+    cpu_seconds = (cpu_after.user - cpu_before.user) + (cpu_after.system - cpu_before.system)
+    return {
+        'inputs': num_inputs,
+        'mixers': args['mixers'],
+        'startup_seconds': round(startup_seconds, 2),
+        'mixer_fps': {
+            'mean': round(sum(mixer_fps) / len(mixer_fps), 2) if mixer_fps else None,
+            'min': round(min(mixer_fps), 2) if mixer_fps else None
+        },
+        'dropped_frames': int(sum(dropped)),
+        'cpu_percent': round(100 * cpu_seconds / elapsed, 1),
+        'rss_mb': round(rss / 1024 / 1024, 1)
+    }
+
+
+if __name__ == '__main__':
+    args = setup_args()
+    results = []
+    for num_inputs in args['inputs']:
+        print('Benchmarking %d input(s) into %d mixer(s) for %d seconds...' %
+              (num_inputs, args['mixers'], args['duration']), file=sys.stderr)
+        results.append(benchmark(num_inputs, args))
+
+    output = json.dumps({'width': args['width'], 'height': args['height'], 'results': results}, indent=2)
+    if args['output']:
+        with open(args['output'], 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+'''
+Benchmarks each transport (the way content is carried between pipelines, e.g. from an input to a mixer).
+
+For each transport, a source pipeline is connected to a destination pipeline in the same way that Brave
+connects an input to a mixer. The source video is switched between black and white, and the time for
+each switch to cross from one pipeline to the other is measured. CPU usage is also measured.
+
+Results are printed as JSON. Usage:
+
+    benchmarks/transports.py [--duration SECONDS] [--transport NAME ...]
+'''
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+import gi
+gi.require_version('Gst', '1.0')
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gi.repository import Gst, GLib  # noqa: E402
+from brave.transports import TRANSPORTS, create_transport  # noqa: E402
+
+VIDEO_CAPS = 'video/x-raw,format=RGBA,width=640,height=360,framerate=30/1'
+PATTERN_BLACK, PATTERN_WHITE = 2, 3
+SWITCH_PERIOD_MS = 500
+
+
+def setup_args():
+    parser = argparse.ArgumentParser(description='Benchmark the transports between Brave pipelines')
+    parser.add_argument('--duration', type=int, default=10, help='seconds to run each transport for')
+    parser.add_argument('--transport', nargs='*', default=list(TRANSPORTS.keys()), help='transport(s) to test')
+    return vars(parser.parse_args())
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def first_byte(buffer):
+    success, map_info = buffer.map(Gst.MapFlags.READ)
+    if not success:
+        return None
+    value = map_info.data[0]
+    buffer.unmap(map_info)
+    return value
+
+
+def benchmark_transport(transport_name, duration):
+    '''
+    Connects two pipelines with the named transport, and returns the measured latency and CPU.
+    '''
+    transport = create_transport(transport_name)
+    clock = Gst.SystemClock.obtain()
+
+    # Just like a connection, the source's tee is connected to: queue -> intersink
+    src_pipeline = Gst.parse_launch('videotestsrc is-live=true name=videotestsrc pattern=%d ! %s ! '
+                                    'identity name=before_transport ! tee name=tee allow-not-linked=true' %
+                                    (PATTERN_BLACK, VIDEO_CAPS))
+    dest_pipeline = Gst.Pipeline.new()
+
+    def add_to_src(factory_name, name=None):
+        e = Gst.ElementFactory.make(factory_name, name)
+        src_pipeline.add(e)
+        return e
+
+    def add_to_dest(factory_name, name=None):
+        e = Gst.ElementFactory.make(factory_name, name)
+        dest_pipeline.add(e)
+        return e
+
+    queue = add_to_src('queue')
+    src_pipeline.get_by_name('tee').link(queue)
+    first_element, intersink = transport.create_intersink('video', add_to_src)
+    queue.link(first_element)
+
+    intersrc = transport.create_intersrc('video', add_to_dest)
+    appsink = add_to_dest('appsink')
+    appsink.set_property('emit-signals', True)
+    appsink.set_property('sync', False)
+    intersrc.link(appsink)
+    transport.pair('video', intersink, intersrc)
+
+    switch_times = {}
+    latencies = []
+
+    def on_frame_leaving_source(pad, info):
+        value = first_byte(info.get_buffer())
+        if value not in switch_times:
+            switch_times.clear()
+            switch_times[value] = clock.get_time()
+        return Gst.PadProbeReturn.OK
+
+    last_value_received = {'value': None}
+
+    def on_frame_arriving_at_dest(sink):
+        sample = sink.emit('pull-sample')
+        value = first_byte(sample.get_buffer())
+        if value != last_value_received['value']:
+            last_value_received['value'] = value
+            if value in switch_times:
+                latencies.append((clock.get_time() - switch_times[value]) / Gst.MSECOND)
+        return Gst.FlowReturn.OK
+
+    before_transport = src_pipeline.get_by_name('before_transport')
+    before_transport.get_static_pad('src').add_probe(Gst.PadProbeType.BUFFER, on_frame_leaving_source)
+    appsink.connect('new-sample', on_frame_arriving_at_dest)
+
+    videotestsrc = src_pipeline.get_by_name('videotestsrc')
+
+    def switch_pattern():
+        current = videotestsrc.get_property('pattern')
+        videotestsrc.set_property('pattern', PATTERN_WHITE if current == PATTERN_BLACK else PATTERN_BLACK)
+        return True
+
+    mainloop = GLib.MainLoop()
+    src_pipeline.set_state(Gst.State.PLAYING)
+    dest_pipeline.set_state(Gst.State.PLAYING)
+    src_pipeline.get_state(Gst.CLOCK_TIME_NONE)
+    dest_pipeline.get_state(Gst.CLOCK_TIME_NONE)
+    transport.start('video', intersink, intersrc)
+
+    usage_before, wall_before = resource.getrusage(resource.RUSAGE_SELF), time.time()
+    GLib.timeout_add(SWITCH_PERIOD_MS, switch_pattern)
+    GLib.timeout_add(duration * 1000, mainloop.quit)
+    mainloop.run()
+    usage_after, wall_after = resource.getrusage(resource.RUSAGE_SELF), time.time()
+
+    src_pipeline.set_state(Gst.State.NULL)
+    dest_pipeline.set_state(Gst.State.NULL)
+
+    cpu_seconds = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+    return {
+        'latency_ms': {
+            'mean': sum(latencies) / len(latencies) if latencies else None,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'max': max(latencies) if latencies else None
+        },
+        'samples': len(latencies),
+        'cpu_percent': 100 * cpu_seconds / (wall_after - wall_before)
+    }
+
+
+if __name__ == '__main__':
+    Gst.init(None)
+    args = setup_args()
+    results = {}
+    for transport_name in args['transport']:
+        print('Benchmarking the "%s" transport for %d seconds...' % (transport_name, args['duration']),
+              file=sys.stderr)
+        results[transport_name] = benchmark_transport(transport_name, args['duration'])
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+'''
+Load-tests WebRTC signalling: how quickly Brave can take on many WebRTC peers, and whether its memory
+stays bounded as they come and go.
+
+Brave is started with a test_video input and a webrtc output. Simulated peers then connect to its
+websocket, each asking to join the webrtc output ('webrtc-init') and waiting for its SDP offer. The
+peers do not answer the offer, so no media is sent; what is measured is the signalling, and the cost
+of the per-peer elements that Brave creates. All peers stay connected for a while, and then leave.
+
+This is repeated for several rounds. If memory is bounded, Brave's RSS after each round (once every
+peer has left) should level off, rather than keep growing. Results are printed as JSON. Usage:
+
+    benchmarks/webrtc_peers.py [--peers N] [--rounds R] [--concurrency C]
+'''
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import psutil
+import websockets
+import yaml
+from mixing import BRAVE, wait_until_playing, get_metrics
+from transports import percentile
+
+OFFER_TIMEOUT = 30
+SETTLE_TIME = 3
+
+
+def setup_args():
+    parser = argparse.ArgumentParser(description='Load-test WebRTC signalling with many simulated peers')
+    parser.add_argument('--peers', type=int, default=200, help='number of peers to connect in each round')
+    parser.add_argument('--rounds', type=int, default=3, help='number of times to connect (and disconnect) the peers')
+    parser.add_argument('--concurrency', type=int, default=20, help='number of peers joining at the same time')
+    parser.add_argument('--hold', type=int, default=5, help='seconds to keep all the peers connected for')
+    parser.add_argument('--port', type=int, default=5104, help='port for Brave\'s API')
+    return vars(parser.parse_args())
+
+
+class SimulatedPeer():
+    '''
+    A websocket client that asks to join the webrtc output, and waits for the SDP offer.
+    '''
+
+    def __init__(self, port, output_id):
+        self.port = port
+        self.output_id = output_id
+        self.ws = None
+        self.time_to_offer = None
+        self.ice_candidates = 0
+        self._reader = None
+
+    async def join(self):
+        start = time.monotonic()
+        self.ws = await websockets.connect('ws://localhost:%d/socket' % self.port, max_size=None)
+        await self.ws.send(json.dumps({'msg_type': 'webrtc-init', 'output_id': self.output_id}))
+        offer_received = asyncio.Event()
+        self._reader = asyncio.ensure_future(self._read(offer_received))
+        try:
+            await asyncio.wait_for(offer_received.wait(), OFFER_TIMEOUT)
+            self.time_to_offer = (time.monotonic() - start) * 1000
+        except asyncio.TimeoutError:
+            pass
+
+    async def leave(self):
+        if self._reader:
+            self._reader.cancel()
+        if self.ws:
+            await self.ws.close()
+
+    async def _read(self, offer_received):
+        try:
+            async for message in self.ws:
+                data = json.loads(message)
+                if 'sdp' in data:
+                    offer_received.set()
+                elif 'ice' in data:
+                    self.ice_candidates += 1
+        except websockets.ConnectionClosed:
+            pass
+
+
+def connected_peers(port):
+    return int(sum(value for (name, _), value in get_metrics(port).items() if name == 'brave_webrtc_peers'))
+
+
+async def run_round(args, output_id, brave_process):
+    peers = [SimulatedPeer(args['port'], output_id) for _ in range(args['peers'])]
+    semaphore = asyncio.Semaphore(args['concurrency'])
+
+    async def join(peer):
+        async with semaphore:
+            await peer.join()
+
+    start = time.monotonic()
+    await asyncio.gather(*[join(peer) for peer in peers])
+    join_seconds = time.monotonic() - start
+
+    await asyncio.sleep(args['hold'])
+    rss_connected = brave_process.memory_info().rss
+    threads_connected = brave_process.num_threads()
+    peers_in_brave = connected_peers(args['port'])
+
+    await asyncio.gather(*[peer.leave() for peer in peers])
+    await asyncio.sleep(SETTLE_TIME)
+
+    times = [peer.time_to_offer for peer in peers if peer.time_to_offer is not None]
+    return {
+        'peers': args['peers'],
+        'peers_in_brave': peers_in_brave,
+        'joins_per_second': round(len(times) / join_seconds, 1),
+        'time_to_offer_ms': {
+            'p50': percentile(times, 50),
+            'p95': percentile(times, 95),
+            'max': max(times, default=None)
+        },
+        'offer_timeouts': len(peers) - len(times),
+        'ice_candidates_per_peer': round(sum(peer.ice_candidates for peer in peers) / len(peers), 1),
+        'rss_mb_connected': round(rss_connected / 1024 / 1024, 1),
+        'threads_connected': threads_connected,
+        'rss_mb_after': round(brave_process.memory_info().rss / 1024 / 1024, 1),
+        'threads_after': brave_process.num_threads(),
+        'peers_in_brave_after': connected_peers(args['port'])
+    }
+
+
+def benchmark(args):
+    config = {
+        'enable_audio': False,
+        'inputs': [{'type': 'test_video'}],
+        'mixers': [],
+        'outputs': [{'type': 'webrtc', 'source': 'input1'}]
+    }
+    with tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False) as config_file:
+        yaml.dump(config, config_file)
+
+    process = subprocess.Popen([sys.executable, BRAVE, '-c', config_file.name],
+                               env={**os.environ, 'PORT': str(args['port'])},
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_playing(args['port'], process)
+        brave_process = psutil.Process(process.pid)
+        results = {'rss_mb_before': round(brave_process.memory_info().rss / 1024 / 1024, 1), 'rounds': []}
+        loop = asyncio.get_event_loop()
+        for round_number in range(args['rounds']):
+            print('Round %d: connecting %d peers...' % (round_number + 1, args['peers']), file=sys.stderr)
+            results['rounds'].append(loop.run_until_complete(run_round(args, 1, brave_process)))
+        return results
+    finally:
+        process.terminate()
+        process.wait()
+        os.remove(config_file.name)
+
+
+if __name__ == '__main__':
+    print(json.dumps(benchmark(setup_args()), indent=2))
@@ -3,6 +3,7 @@
 Runs Brave as a daemon with RestAPI interface
 '''
 
+import asyncio
 import sys
 import threading
 import signal
@@ -11,7 +12,9 @@ import brave.session
 from gi.repository import Gst
 assert sys.version_info >= (3, 6)
 import brave.api
+import brave.api.reconcile
 import brave.config
+import brave.profiler
 from brave.helpers import run_on_master_thread_when_idle
 import brave.exceptions
 
@@ -56,17 +59,25 @@ def start_brave():
         print("Received keyboard interrupt to exit, so tidying up...")
         session.end()
 
+    def reload_config_file(signal, frame):
+        print("Received SIGHUP, so reloading the config file...")
+        if hasattr(session, 'rest_api') and hasattr(session.rest_api, 'loop'):
+            asyncio.run_coroutine_threadsafe(brave.api.reconcile.reload_config_file(session), session.rest_api.loop)
+
     signal.signal(signal.SIGINT, keyboard_exit)
+    signal.signal(signal.SIGHUP, reload_config_file)
     session.start()
 
 
 if __name__ == '__main__':
-    Gst.init(None)
-    if not check_gstreamer_plugins():
-        sys.exit(1)
     args = setup_args()
     try:
         setup_config(args)
+        # The config is read first, as it decides which GStreamer tracers are enabled:
+        brave.profiler.enable_tracers()
+        Gst.init(None)
+        if not check_gstreamer_plugins():
+            sys.exit(1)
         start_brave()
     except brave.exceptions.InvalidConfiguration as e:
         print('Invalid configuration: %s' % e)
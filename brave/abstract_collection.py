@@ -10,6 +10,8 @@ class AbstractCollection(collections.abc.MutableMapping):
         self.session = session
         self._items = {}
         self._next_id = 1
+        # Set while items are being created off the master thread, so that they do not change state there:
+        self.state_changes_deferred = False
 
     def __getitem__(self, key):
         if key in self._items:
@@ -34,6 +36,31 @@ class AbstractCollection(collections.abc.MutableMapping):
             self._next_id += 1
         return self._next_id
 
+    def assign_ids(self, configs):
+        '''
+        Given a list of configs (dictionaries of properties) of items to add, returns a copy of them in which
+        every one has an ID. This allows the items to be added at the same time without their IDs clashing.
+        '''
+        ids_in_config = set(c['id'] for c in configs if 'id' in c)
+        assigned = []
+        for item_config in configs:
+            if 'id' not in item_config:
+                while self.get_new_id() in ids_in_config:
+                    self._next_id += 1
+                item_config = {**item_config, 'id': self.get_new_id()}
+                ids_in_config.add(item_config['id'])
+            assigned.append(item_config)
+        return assigned
+
+    def put_in_order(self, ids):
+        '''
+        Orders the items so that those with the given IDs are last, in the order given.
+        (Items are otherwise in the order they were added.)
+        '''
+        ordered = {id: item for id, item in self._items.items() if id not in ids}
+        ordered.update({id: self._items[id] for id in ids if id in self._items})
+        self._items = ordered
+
     def summarise(self, for_config_file=False):
         s = []
         for id, obj in self.items():
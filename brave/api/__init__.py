@@ -8,6 +8,8 @@ from sanic.exceptions import NotFound, InvalidUsage
 import brave.config as config
 import brave.api.websockets_handler
 import brave.api.route_handler
+from brave.api.snapshot import Snapshot
+from brave.api.update_queue import UpdateQueue
 import brave.exceptions
 
 
@@ -20,6 +22,8 @@ class RestApi(object):
         app = Sanic()
         app.config.KEEP_ALIVE = False
         session.rest_api = self
+        session.snapshot = Snapshot(session)
+        session.update_queue = UpdateQueue()
         self.webockets_handler = brave.api.websockets_handler.WebsocketsHandler(session)
         route_handler = brave.api.route_handler
 
@@ -46,6 +50,12 @@ class RestApi(object):
             if request.method in ['POST', 'PUT'] and not isinstance(request.json, dict):
                 return sanic.response.json({'error': 'Invalid JSON'}, 400)
 
+        @app.middleware('response')
+        async def refresh_snapshot_after_changes(request, response):
+            # Requests that may have changed something mean the snapshot of the blocks needs refreshing:
+            if request.method in ['POST', 'PUT', 'DELETE']:
+                session.snapshot.invalidate()
+
         @app.exception(brave.exceptions.InvalidConfiguration)
         async def invalid_cf(request, exception):
             msg = 'Invalid configuration: ' + str(exception)
@@ -62,6 +72,9 @@ class RestApi(object):
         app.add_route(route_handler.overlays, "/api/overlays")
         app.add_route(route_handler.mixers, "/api/mixers")
         app.add_route(route_handler.elements, "/api/elements")
+        app.add_route(route_handler.websockets, "/api/websockets")
+        app.add_route(route_handler.metrics, "/metrics")
+        app.add_route(route_handler.profile, "/api/profile")
 
         app.add_route(route_handler.create_input, '/api/inputs', methods=['PUT'])
         app.add_route(route_handler.create_output, '/api/outputs', methods=['PUT'])
@@ -84,8 +97,10 @@ class RestApi(object):
 
         app.add_route(route_handler.get_body, '/api/outputs/<id:int>/body')
 
+        app.add_route(route_handler.batch, '/api/batch', methods=['POST'])
         app.add_route(route_handler.restart, '/api/restart', methods=['POST'])
         app.add_route(route_handler.config_yaml, '/api/config/current.yaml', methods=['GET'])
+        app.add_route(route_handler.update_config, '/api/config', methods=['PUT'])
 
         @app.websocket('/socket')
         async def feed(request, ws):
@@ -94,9 +109,12 @@ class RestApi(object):
         def start_server():
             asyncio.set_event_loop(uvloop.new_event_loop())
             loop = asyncio.get_event_loop()
+            # Kept so that other threads can run coroutines on the API's event loop:
+            self.loop = loop
             server = app.create_server(host=config.api_host(), port=config.api_port(), access_log=False, return_asyncio_server=True)
             asyncio.ensure_future(server)
-            loop.create_task(self.webockets_handler.periodic_check())
+            loop.create_task(self.webockets_handler.send_updates_when_notified())
+            loop.create_task(self.webockets_handler.send_pings())
             loop.run_forever()
 
         start_server()
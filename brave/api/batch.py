@@ -0,0 +1,227 @@
+'''
+Handles /api/batch, which applies a list of operations together.
+
+Each operation is the equivalent of one API call, e.g.
+    {"method": "PUT", "path": "/api/inputs", "body": {"type": "test_video"}}
+
+All operations, including the props of blocks being created or updated, are validated before any are applied.
+They are then applied, in order, during a single iteration of the master thread's main loop, so that no
+intermediate state is seen on any output.
+'''
+import asyncio
+import re
+from sanic.exceptions import InvalidUsage
+import brave.exceptions
+import brave.helpers
+from brave.helpers import run_on_master_thread_when_idle
+from brave.transports import get_transport_class
+from brave.inputs import INPUT_TYPES
+from brave.outputs import OUTPUT_TYPES
+from brave.overlays import OVERLAY_TYPES
+from brave.mixers.mixer import Mixer
+logger = brave.helpers.get_logger('api_batch')
+
+PATH_REGEX = re.compile(r'^/api/(input|output|overlay|mixer)s(?:/(\d+))?'
+                        r'(?:/(cut_to_source|overlay_source|remove_source))?$')
+
+# The result given to operations that were not attempted because an earlier one failed:
+NOT_ATTEMPTED = {'status': 424, 'error': 'Not attempted, as an earlier operation failed'}
+
+
+async def apply(session, operations):
+    '''
+    Validate, and then apply, a list of operations. Returns a list of results, one per operation.
+    '''
+    parsed_operations = validate(session, operations)
+    loop = asyncio.get_event_loop()
+    future = loop.create_future()
+
+    def apply_on_master_thread():
+        results = apply_validated(session, parsed_operations)
+        loop.call_soon_threadsafe(future.set_result, results)
+
+    run_on_master_thread_when_idle(apply_on_master_thread)
+    return await future
+
+
+def validate(session, operations):
+    '''
+    Checks that every operation is valid, raising InvalidUsage if not. Returns the parsed operations.
+    '''
+    if not isinstance(operations, list) or len(operations) == 0:
+        raise InvalidUsage('"operations" must be a non-empty list')
+
+    parsed_operations = []
+    created_types = set()
+    for index, operation in enumerate(operations):
+        try:
+            parsed_operation = _parse(session, operation, created_types)
+        except (InvalidUsage, brave.exceptions.InvalidConfiguration) as e:
+            raise InvalidUsage('Operation %d is invalid: %s' % (index, e))
+        parsed_operations.append(parsed_operation)
+        if parsed_operation['action'] == 'create':
+            created_types.add(parsed_operation['block_type'])
+    return parsed_operations
+
+
+def apply_validated(session, parsed_operations):
+    '''
+    Applies operations that have been returned by validate(), in order. Must be called on the master thread.
+    Returns a list of results, one per operation.
+    '''
+    results = []
+    for operation in parsed_operations:
+        # Once an operation has failed, later operations are not attempted:
+        if len(results) > 0 and results[-1]['status'] != 200:
+            results.append(NOT_ATTEMPTED)
+        else:
+            results.append(_apply_operation(session, operation))
+    return results
+
+
+def _parse(session, operation, created_types):
+    '''
+    Checks that an operation is valid, and returns it as a dictionary of action, block type, id and body.
+    '''
+    if not isinstance(operation, dict):
+        raise InvalidUsage('must be an object')
+    if 'method' not in operation or 'path' not in operation:
+        raise InvalidUsage('requires "method" and "path"')
+    body = operation.get('body', {})
+    if not isinstance(body, dict):
+        raise InvalidUsage('"body" must be an object')
+
+    method = str(operation['method']).upper()
+    match = PATH_REGEX.search(str(operation['path']))
+    if not match:
+        raise InvalidUsage('unsupported path "%s"' % operation['path'])
+    block_type, id, mixer_action = match.group(1), match.group(2), match.group(3)
+
+    if id is None:
+        if method != 'PUT':
+            raise InvalidUsage('%s is not supported for %s' % (method, operation['path']))
+        if 'type' not in body and block_type != 'mixer':
+            raise InvalidUsage("%s missing 'type'" % block_type)
+        _check_props(_prototype(block_type, body.get('type')), block_type, body, updating=False)
+        return {'action': 'create', 'block_type': block_type, 'body': body}
+
+    id = int(id)
+    # Blocks created earlier in this batch will not exist yet, so cannot be checked.
+    if block_type not in created_types and session.get_block_by_type(block_type, id) is None:
+        raise InvalidUsage('no such %s ID %d' % (block_type, id))
+
+    if mixer_action:
+        if method != 'POST' or block_type != 'mixer':
+            raise InvalidUsage('%s is not supported for %s' % (method, operation['path']))
+        if 'uid' not in body:
+            raise InvalidUsage('Requires "uid" field in body')
+        session.uid_to_block(body['uid'])
+        if 'transport' in body:
+            get_transport_class(body['transport'])
+        return {'action': mixer_action, 'block_type': block_type, 'id': id, 'body': body}
+
+    if method == 'POST':
+        block = session.get_block_by_type(block_type, id)
+        if block is not None:
+            _check_props(block, block_type, body, updating=True)
+        return {'action': 'update', 'block_type': block_type, 'id': id, 'body': body}
+    if method == 'DELETE':
+        return {'action': 'delete', 'block_type': block_type, 'id': id, 'body': body}
+    raise InvalidUsage('%s is not supported for %s' % (method, operation['path']))
+
+
+def _prototype(block_type, type):
+    '''
+    Returns an uninitialised instance of the class that a block of the type would be, to check its props.
+    '''
+    if block_type == 'mixer':
+        block_class = Mixer
+    else:
+        block_classes = {'input': INPUT_TYPES, 'output': OUTPUT_TYPES, 'overlay': OVERLAY_TYPES}[block_type]
+        if type not in block_classes:
+            raise InvalidUsage("Invalid %s type '%s'" % (block_type, type))
+        block_class = block_classes[type]
+    return block_class.__new__(block_class)
+
+
+def _check_props(block, block_type, body, updating):
+    '''
+    Checks the props of a create or update, so that a bad one is found before any operation is applied.
+    '''
+    # The source of outputs and overlays is handled separately from their other props:
+    block.validate_props(body, updating, ignore=['source'] if block_type in ['output', 'overlay'] else [])
+
+
+def _apply_operation(session, operation):
+    '''
+    Applies one operation, returning its result. Must be called on the master thread.
+    '''
+    try:
+        response = _ACTIONS[operation['action']](session, operation)
+        return {'status': 200, 'response': response if response is not None else {'status': 'OK'}}
+    except (InvalidUsage, brave.exceptions.InvalidConfiguration) as e:
+        return {'status': 400, 'error': str(e)}
+    except Exception as e:
+        logger.warning('Error applying batch operation %s: %s' % (operation, e))
+        return {'status': 500, 'error': str(e)}
+
+
+def _block(session, operation):
+    block = session.get_block_by_type(operation['block_type'], operation['id'])
+    if block is None:
+        raise InvalidUsage('no such %s ID %d' % (operation['block_type'], operation['id']))
+    return block
+
+
+def _create(session, operation):
+    collection = getattr(session, operation['block_type'] + 's')
+    block = collection.add(**operation['body'])
+    if operation['block_type'] == 'input':
+        block.setup()
+    elif operation['block_type'] == 'mixer':
+        block.setup_sources()
+    logger.info('Created %s with details %s' % (block.uid, operation['body']))
+    return {'id': block.id, 'uid': block.uid}
+
+
+def _update(session, operation):
+    block = _block(session, operation)
+    # Updates from other requests, waiting to be applied, are applied first, so that they cannot overwrite this:
+    session.update_queue.flush(block)
+    block.update(operation['body'])
+
+
+def _delete(session, operation):
+    _block(session, operation).delete()
+
+
+def _connection(session, operation, create_if_not_made):
+    source = session.uid_to_block(operation['body']['uid'], error_if_not_exists=True)
+    connection = _block(session, operation).connection_for_source(source, create_if_not_made=create_if_not_made)
+    if not connection and create_if_not_made:
+        raise InvalidUsage('Unable to connect "%s" to mixer %d' % (operation['body']['uid'], operation['id']))
+    return connection
+
+
+def _cut_to_source(session, operation):
+    _connection(session, operation, create_if_not_made=True).cut(details=operation['body'])
+
+
+def _overlay_source(session, operation):
+    _connection(session, operation, create_if_not_made=True).add_to_mix(details=operation['body'])
+
+
+def _remove_source(session, operation):
+    connection = _connection(session, operation, create_if_not_made=False)
+    if connection:
+        connection.remove_from_mix()
+
+
+_ACTIONS = {
+    'create': _create,
+    'update': _update,
+    'delete': _delete,
+    'cut_to_source': _cut_to_source,
+    'overlay_source': _overlay_source,
+    'remove_source': _remove_source
+}
@@ -0,0 +1,235 @@
+'''
+Changes the running blocks to match a config (in the same format as the config file, and as returned by
+/api/config/current.yaml), making only the changes needed.
+
+Blocks are matched by type and ID. Blocks that are in the config but not running are created; those
+running but not in the config are deleted; and those in both are updated with any properties that differ.
+A block is only deleted and recreated if a property that cannot be updated (e.g. its type) has changed.
+When a block is recreated, the blocks that use it are reconnected to it (and outputs, which cannot change
+source whilst playing, are recreated too).
+The changes are made as /api/batch operations.
+'''
+import asyncio
+import yaml
+from gi.repository import Gst
+import brave.config as config
+import brave.helpers
+import brave.api.batch
+from brave.helpers import run_on_master_thread_and_wait
+logger = brave.helpers.get_logger('reconcile')
+
+# Blocks are created in this order, so that each block's sources exist first. They are deleted in reverse.
+BLOCK_TYPES = ['input', 'mixer', 'output', 'overlay']
+
+# Deleting a block can take a moment (it is disconnected first), so it is waited for before recreating it:
+DELETION_TIMEOUT = 10
+
+
+async def reconcile(session, desired_config):
+    '''
+    Changes the running blocks to match the desired config. Returns the operations made, and their results.
+    '''
+    config.validate(desired_config)
+    deletions, changes = await run_on_master_thread_and_wait(_diff, session=session, desired_config=desired_config)
+
+    operations, results = [], []
+    if deletions:
+        operations += deletions
+        results += await brave.api.batch.apply(session, deletions)
+        await _wait_until_deleted(session, deletions)
+    if changes and all(result['status'] == 200 for result in results):
+        operations += changes
+        results += await brave.api.batch.apply(session, changes)
+
+    logger.info('Reconciled config with %d operation(s)' % len(operations))
+    return {
+        'operations': operations,
+        'results': results,
+        'settings_needing_restart': _changed_settings(desired_config)
+    }
+
+
+async def reload_config_file(session):
+    '''
+    Re-reads the config file that Brave was started with, and reconciles the running blocks with it.
+    '''
+    with open(config.config_filename, 'r') as stream:
+        desired_config = yaml.load(stream, Loader=yaml.FullLoader) or {}
+    try:
+        response = await reconcile(session, desired_config)
+        failures = [result for result in response['results'] if result['status'] != 200]
+        if failures:
+            logger.warning('Errors reloading config file: %s' % failures)
+    except Exception as e:
+        logger.warning('Unable to reload config file %s: %s' % (config.config_filename, e))
+
+
+def _diff(session, desired_config):
+    '''
+    Returns the batch operations needed to turn the running blocks into the desired config: first, a list
+    of deletions, and then a list of everything else. Must be called on the master thread.
+    '''
+    deletions, creations, source_changes, updates = [], [], [], []
+    # The UIDs of the blocks being deleted and created again:
+    recreated = set()
+    # The blocks being kept (and updated), with their config:
+    kept = []
+    for block_type in BLOCK_TYPES:
+        collection = getattr(session, block_type + 's')
+        path = '/api/%ss' % block_type
+        desired_blocks = _with_ids(desired_config.get(block_type + 's') or [])
+
+        for id in list(collection.keys()):
+            # Links to other nodes are created and deleted with the outputs that use them:
+            if hasattr(collection[id], 'cluster_link'):
+                continue
+            if id not in desired_blocks:
+                deletions.append({'method': 'DELETE', 'path': '%s/%d' % (path, id)})
+
+        for id, block_config in desired_blocks.items():
+            block = collection[id] if id in collection else None
+            if block is not None:
+                changed_props = _changed_props(block, block_config)
+                if not _must_recreate(block, block_config, changed_props) and \
+                        not _source_recreated(block, recreated):
+                    if changed_props:
+                        updates.append({'method': 'POST', 'path': '%s/%d' % (path, id), 'body': changed_props})
+                    kept.append((block, block_config, changed_props))
+                    continue
+                deletions.append({'method': 'DELETE', 'path': '%s/%d' % (path, id)})
+                recreated.add(block.uid)
+
+            # A mixer's sources may not exist yet, so are set after everything has been created:
+            creations.append({'method': 'PUT', 'path': path,
+                              'body': {key: value for key, value in block_config.items() if key != 'sources'}})
+            if 'sources' in block_config:
+                source_changes.append({'method': 'POST', 'path': '%s/%d' % (path, id),
+                                       'body': {'sources': block_config['sources']}})
+
+    source_changes += _reconnections(kept, recreated)
+
+    # Blocks that others depend on (e.g. the input of a mixer) are deleted last:
+    deletions.sort(key=lambda operation: -BLOCK_TYPES.index(operation['path'].split('/')[2][:-1]))
+    return deletions, creations + source_changes + updates
+
+
+def _source_recreated(block, recreated):
+    '''
+    Whether the block is an output whose source is being recreated. Deleting the source disconnects the output,
+    and an output cannot be given a source whilst it is playing, so the output is recreated too.
+    '''
+    return block.input_output_overlay_or_mixer() == 'output' and \
+        block.summarise(for_config_file=True).get('source') in recreated
+
+
+def _reconnections(kept, recreated):
+    '''
+    Deleting a block disconnects the mixers and overlays that use it, although their config has not changed.
+    Returns the operations to connect them again, once it has been recreated.
+    '''
+    operations = []
+    for block, block_config, changed_props in kept:
+        current = block.summarise(for_config_file=True)
+        path = '/api/%ss/%d' % (block.input_output_overlay_or_mixer(), block.id)
+        if 'sources' in current and 'sources' not in changed_props and \
+                any(source.get('uid') in recreated for source in current['sources']):
+            operations.append({'method': 'POST', 'path': path,
+                               'body': {'sources': block_config.get('sources', current['sources'])}})
+        elif block.input_output_overlay_or_mixer() == 'overlay' and 'source' not in changed_props and \
+                current.get('source') in recreated:
+            operations.append({'method': 'POST', 'path': path, 'body': {'source': current['source']}})
+    return operations
+
+
+def _with_ids(block_configs):
+    '''
+    Returns a dictionary of block configs by ID, giving an ID to any without, as happens when starting Brave.
+    '''
+    ids_in_config = set(c['id'] for c in block_configs if 'id' in c)
+    blocks, next_id = {}, 1
+    for block_config in block_configs:
+        if 'id' not in block_config:
+            while next_id in ids_in_config:
+                next_id += 1
+            block_config = {**block_config, 'id': next_id}
+            ids_in_config.add(next_id)
+        blocks[block_config['id']] = block_config
+    return blocks
+
+
+def _changed_props(block, block_config):
+    '''
+    Returns the properties in the block's config that differ from the running block.
+    Properties not in the config are left as they are.
+    '''
+    current = block.summarise(for_config_file=True)
+    changed = {}
+    for key, value in block_config.items():
+        if key in ['id', 'type']:
+            continue
+        if key == 'sources':
+            if not _sources_match(current.get('sources', []), value):
+                changed[key] = value
+        elif current.get(key) != value:
+            changed[key] = value
+    return changed
+
+
+def _sources_match(current_sources, desired_sources):
+    '''
+    Whether a mixer's sources match those desired. Only the properties given in the desired sources are compared.
+    '''
+    if not isinstance(desired_sources, list) or len(current_sources) != len(desired_sources):
+        return False
+    for current, desired in zip(current_sources, desired_sources):
+        if not isinstance(desired, dict):
+            return False
+        if any(key not in ['in_mix'] and current.get(key) != value for key, value in desired.items()):
+            return False
+        if current.get('in_mix') != desired.get('in_mix', True):
+            return False
+    return True
+
+
+def _must_recreate(block, block_config, changed_props):
+    '''
+    Whether the block has to be deleted and created again, because a change cannot be made to it while running.
+    '''
+    if 'type' in block_config and block_config['type'] != block.type:
+        return True
+
+    permitted_props = block.permitted_props()
+    for key in changed_props:
+        if key in permitted_props and permitted_props[key].get('updatable') is False:
+            return True
+
+    # Outputs cannot change source whilst playing:
+    return block.input_output_overlay_or_mixer() == 'output' and 'source' in changed_props and \
+        block.state in [Gst.State.PLAYING, Gst.State.PAUSED]
+
+
+def _changed_settings(desired_config):
+    '''
+    Returns the names of settings (other than blocks) that differ from the running config.
+    These only take effect when Brave is restarted.
+    '''
+    current_config = config.raw()
+    block_keys = [block_type + 's' for block_type in BLOCK_TYPES]
+    keys = set(desired_config.keys()) | set(current_config.keys())
+    return sorted(key for key in keys if key not in block_keys and desired_config.get(key) != current_config.get(key))
+
+
+async def _wait_until_deleted(session, deletions):
+    def any_remaining():
+        return any(session.get_block_by_type(*_block_type_and_id(operation)) for operation in deletions)
+
+    for _ in range(DELETION_TIMEOUT * 10):
+        if not await run_on_master_thread_and_wait(any_remaining):
+            return
+        await asyncio.sleep(0.1)
+    logger.warning('Timed out waiting for blocks to be deleted')
+
+
+def _block_type_and_id(operation):
+    _, _, collection_name, id = operation['path'].split('/')
+    return collection_name[:-1], int(id)
@@ -2,35 +2,35 @@ import brave.helpers
 logger = brave.helpers.get_logger('api_routes')
 import sanic
 import sanic.response
-from brave.helpers import run_on_master_thread_when_idle
+import yaml
+from brave.helpers import run_on_master_thread_when_idle, run_on_master_thread_and_wait
 from brave.outputs.image import ImageOutput
 from sanic.exceptions import InvalidUsage
+from brave.transports import get_transport_class
 import brave.config_file
+import brave.api.batch
+import brave.api.reconcile
+import brave.metrics
 
 
 async def all(request):
-    return sanic.response.json({
-        'inputs': request['session'].inputs.summarise(),
-        'overlays': request['session'].overlays.summarise(),
-        'outputs': request['session'].outputs.summarise(),
-        'mixers': request['session'].mixers.summarise()
-    })
+    return await _snapshot_response(request, 'all')
 
 
 async def inputs(request):
-    return sanic.response.json(request['session'].inputs.summarise())
+    return await _snapshot_response(request, 'inputs')
 
 
 async def outputs(request):
-    return sanic.response.json(request['session'].outputs.summarise())
+    return await _snapshot_response(request, 'outputs')
 
 
 async def overlays(request):
-    return sanic.response.json(request['session'].overlays.summarise())
+    return await _snapshot_response(request, 'overlays')
 
 
 async def mixers(request):
-    return sanic.response.json(request['session'].mixers.summarise())
+    return await _snapshot_response(request, 'mixers')
 
 
 async def elements(request):
@@ -43,6 +43,27 @@ async def elements(request):
     })
 
 
+async def websockets(request):
+    return sanic.response.json(request['session'].rest_api.webockets_handler.summarise())
+
+
+async def metrics(request):
+    # Collected on the master thread, as it reads from the pipelines:
+    text = await run_on_master_thread_and_wait(brave.metrics.collect, session=request['session'])
+    return sanic.response.text(text, content_type='text/plain; version=0.0.4')
+
+
+async def profile(request):
+    if request['session'].profiler is None:
+        raise InvalidUsage('Profiling is not enabled. Set "profile: true" in the config file.')
+    try:
+        top = int(request.args.get('top', 10))
+    except ValueError:
+        raise InvalidUsage('"top" must be a number')
+    report = await run_on_master_thread_and_wait(request['session'].profiler.report, top=top)
+    return sanic.response.json(report)
+
+
 async def delete_input(request, id):
     input = _get_input(request, id)
     run_on_master_thread_when_idle(input.delete)
@@ -86,22 +107,22 @@ async def remove_source(request, id):
 
 
 async def update_input(request, id):
-    _get_input(request, id).update(request.json)
+    await request['session'].update_queue.update(_get_input(request, id), request.json)
     return _status_ok_response()
 
 
 async def update_output(request, id):
-    _get_output(request, id).update(request.json)
+    await request['session'].update_queue.update(_get_output(request, id), request.json)
     return _status_ok_response()
 
 
 async def update_overlay(request, id):
-    _get_overlay(request, id).update(request.json)
+    await request['session'].update_queue.update(_get_overlay(request, id), request.json)
     return _status_ok_response()
 
 
 async def update_mixer(request, id):
-    _get_mixer(request, id).update(request.json)
+    await request['session'].update_queue.update(_get_mixer(request, id), request.json)
     return _status_ok_response()
 
 
@@ -148,6 +169,13 @@ async def get_body(request, id):
         raise InvalidUsage('No such body')
 
 
+async def batch(request):
+    if 'operations' not in request.json:
+        raise InvalidUsage('Body must contain "operations" key')
+    results = await brave.api.batch.apply(request['session'], request.json['operations'])
+    return sanic.response.json({'results': results})
+
+
 async def restart(request):
     if 'config' not in request.json:
         raise InvalidUsage('Body must contain "config" key')
@@ -163,6 +191,21 @@ async def config_yaml(request):
                                headers={'Content-Type': 'application/x-yaml'})
 
 
+async def update_config(request):
+    '''
+    Changes the running blocks to match the config provided (as YAML or JSON), making only the changes needed.
+    '''
+    if 'yaml' in request.content_type:
+        try:
+            desired_config = yaml.load(request.body, Loader=yaml.FullLoader)
+        except yaml.YAMLError as e:
+            raise InvalidUsage('Invalid YAML: %s' % e)
+    else:
+        desired_config = request.json
+    response = await brave.api.reconcile.reconcile(request['session'], desired_config)
+    return sanic.response.json(response)
+
+
 def _get_output(request, id):
     if id not in request['session'].outputs or request['session'].outputs[id] is None:
         raise InvalidUsage('no such output ID')
@@ -195,6 +238,10 @@ def _get_connection(request, id, create_if_not_made):
     if source is None:
         raise InvalidUsage('No such item "%s"' % request.json['uid'])
 
+    # Validate now, as the connection is updated later on the master thread:
+    if 'transport' in request.json:
+        get_transport_class(request.json['transport'])
+
     connection = _get_mixer(request, id).connection_for_source(source, create_if_not_made=create_if_not_made)
     if not connection and create_if_not_made is True:
         raise InvalidUsage('Unable to connect "%s" to mixer %d' % (request.json['uid'], id))
@@ -203,3 +250,14 @@ def _get_connection(request, id, create_if_not_made):
 
 def _status_ok_response():
     return sanic.response.json({'status': 'OK'})
+
+
+async def _snapshot_response(request, name):
+    '''
+    Responds with the latest snapshot of the blocks (see brave/api/snapshot.py).
+    If the client already has this version (as given by the If-None-Match header), a 304 is returned.
+    '''
+    body, etag = await request['session'].snapshot.get(name)
+    if etag in request.headers.get('If-None-Match', ''):
+        return sanic.response.text('', status=304, headers={'ETag': etag})
+    return sanic.response.text(body, headers={'ETag': etag}, content_type='application/json')
@@ -0,0 +1,108 @@
+import asyncio
+import hashlib
+import json
+import threading
+from gi.repository import GLib
+import brave.helpers
+import brave.config as config
+from brave.helpers import run_on_master_thread_when_idle, set_future_result
+logger = brave.helpers.get_logger('snapshot')
+COLLECTIONS = ['inputs', 'outputs', 'mixers', 'overlays']
+
+# If the master thread does not refresh the snapshot within this time, the previous snapshot is served:
+REFRESH_TIMEOUT = 5
+
+
+class Snapshot():
+    '''
+    A cache of the summary of every block (input, output, mixer, overlay), for the API to serve.
+
+    It is refreshed on the master thread (the thread running GStreamer), so that API requests
+    never query pipelines themselves. It is refreshed when something changes, and periodically
+    (every 'snapshot_refresh_period' seconds) so that values such as position stay up to date.
+    Each response is serialised once, with an ETag, however many times it is requested.
+    '''
+
+    def __init__(self, session):
+        self.session = session
+        self._responses = None
+        self._lock = threading.Lock()
+        self._refresh_pending = False
+        self._expired = False
+        self._read_since_refresh = False
+        self._waiters = []
+        session.items_updated_listeners.append(self.invalidate)
+        GLib.timeout_add(int(config.snapshot_refresh_period() * 1000), self._on_refresh_period)
+
+    def invalidate(self):
+        '''
+        Request that the snapshot is refreshed, because something has changed. Can be called from any thread.
+        '''
+        with self._lock:
+            if self._refresh_pending:
+                return
+            self._refresh_pending = True
+        run_on_master_thread_when_idle(self.refresh)
+
+    def refresh(self):
+        '''
+        Summarise every block. Must be called on the master thread.
+        '''
+        with self._lock:
+            self._refresh_pending = False
+            self._expired = False
+            self._read_since_refresh = False
+            waiters, self._waiters = self._waiters, []
+
+        try:
+            summaries = {name: getattr(self.session, name).summarise() for name in COLLECTIONS}
+            responses = {name: self._create_response(summaries[name]) for name in COLLECTIONS}
+            responses['all'] = self._create_response(summaries)
+            self._responses = responses
+        finally:
+            for loop, future in waiters:
+                loop.call_soon_threadsafe(set_future_result, future)
+
+    async def get(self, name):
+        '''
+        Returns a tuple of the response body (a JSON string) and its ETag.
+        'name' is either 'all' or a collection name (e.g. 'inputs').
+        If the snapshot is out of date, this waits for the master thread to refresh it.
+        '''
+        with self._lock:
+            self._read_since_refresh = True
+            up_to_date = self._responses is not None and not self._refresh_pending and not self._expired
+            if not up_to_date:
+                loop = asyncio.get_event_loop()
+                future = loop.create_future()
+                self._waiters.append((loop, future))
+                refresh_needed = not self._refresh_pending
+
+        if not up_to_date:
+            if refresh_needed:
+                self.invalidate()
+            try:
+                await asyncio.wait_for(future, REFRESH_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning('Timed out waiting for the master thread to refresh the snapshot')
+
+        if self._responses is None:
+            raise RuntimeError('No snapshot of the blocks is available')
+        return self._responses[name]
+
+    def _on_refresh_period(self):
+        '''
+        Called periodically on the master thread. There's no point refreshing if no-one has asked
+        for the snapshot since the last refresh; instead, it is marked as expired, so that the next
+        request will cause a refresh.
+        '''
+        if self._read_since_refresh:
+            self.refresh()
+        else:
+            with self._lock:
+                self._expired = True
+        return True
+
+    def _create_response(self, data):
+        body = json.dumps(data)
+        return body, '"%s"' % hashlib.sha1(body.encode()).hexdigest()
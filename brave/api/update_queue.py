@@ -0,0 +1,93 @@
+import asyncio
+import threading
+import time
+import weakref
+from gi.repository import GLib
+import brave.config as config
+from brave.helpers import run_on_master_thread_when_idle, set_future_result
+
+
+class UpdateQueue():
+    '''
+    Queues updates to blocks (inputs, outputs, mixers and overlays) from the API, so that they are
+    applied on the master thread.
+
+    Each block's updates are applied at most once per 'update_coalesce_period'. Updates that arrive
+    sooner (e.g. every movement of a volume slider) are merged, so that only the latest value of each
+    property is applied. The API request waits until its update has been applied, so that any error
+    can still be returned to the user. If merged updates fail, each is applied again on its own, so that
+    only the request(s) that caused the error are given it.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last_applied = weakref.WeakKeyDictionary()
+
+    async def update(self, block, updates):
+        '''
+        Queue an update, and wait for it to be applied. Raises any error from applying it.
+        '''
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        with self._lock:
+            if block in self._pending:
+                self._pending[block]['updates'].update(updates)
+                self._pending[block]['waiters'].append((loop, future, updates))
+                delay = None
+            else:
+                self._pending[block] = {'updates': {**updates}, 'waiters': [(loop, future, updates)]}
+                time_since_last_applied = time.monotonic() - self._last_applied.get(block, 0)
+                delay = max(0, config.update_coalesce_period() - time_since_last_applied)
+
+        if delay == 0:
+            run_on_master_thread_when_idle(self._apply, block=block)
+        elif delay is not None:
+            GLib.timeout_add(int(delay * 1000), self._apply_after_timeout, block)
+
+        error = await future
+        if error is not None:
+            raise error
+
+    def _apply_after_timeout(self, block):
+        self._apply(block)
+        return False
+
+    def flush(self, block):
+        '''
+        Apply any pending updates to the block now, so that they cannot later overwrite a change made
+        another way (e.g. by /api/batch). Called on the master thread.
+        '''
+        self._apply(block)
+
+    def _apply(self, block):
+        '''
+        Apply all pending updates to the block. Called on the master thread.
+        '''
+        with self._lock:
+            pending = self._pending.pop(block, None)
+            if pending is None:
+                # Already applied, by flush()
+                return
+            self._last_applied[block] = time.monotonic()
+
+        waiters = pending['waiters']
+        errors = [self._update(block, pending['updates'])] * len(waiters)
+
+        # One bad update should not fail the others that it was merged with:
+        if errors[0] is not None and len(waiters) > 1:
+            errors = [self._update(block, updates) for loop, future, updates in waiters]
+
+        for (loop, future, updates), error in zip(waiters, errors):
+            loop.call_soon_threadsafe(set_future_result, future, error)
+
+    def _update(self, block, updates):
+        '''
+        Applies the updates to the block, returning the error if there is one.
+        '''
+        try:
+            # A copy is given, as update() may remove what it has handled (e.g. an output's 'source'):
+            block.update({**updates})
+            return None
+        except Exception as e:
+            return e
@@ -0,0 +1,145 @@
+import websockets
+import asyncio
+import collections
+import json
+import time
+import brave.helpers
+import brave.config as config
+logger = brave.helpers.get_logger('websockets')
+
+
+class OutgoingMessage():
+    '''
+    A message to be sent to one or more websocket clients.
+    It is serialised (to JSON) once, however many clients it is sent to.
+    '''
+
+    def __init__(self, msg, has_sequence_number=True):
+        self.msg = msg
+        self.has_sequence_number = has_sequence_number
+        self._serialised = None
+        self._serialised_patches = {}
+
+    def serialised(self):
+        if self._serialised is None:
+            self._serialised = json.dumps(self.msg)
+        return self._serialised
+
+    def serialised_patch_from(self, previous):
+        '''
+        For 'update' messages, returns the serialised 'patch' message that changes 'previous' into this,
+        or None if there are no changes. Clients that were sent the same previous update share the result.
+        '''
+        if id(previous) not in self._serialised_patches:
+            patch = brave.helpers.create_json_patch(previous, self.msg['data'])
+            serialised_patch = json.dumps({
+                'msg_type': 'patch',
+                'block_type': self.msg['block_type'],
+                'id': self.msg['data']['id'],
+                'patch': patch
+            }) if patch else None
+            # 'previous' is kept too, so that its id cannot be reused by another object:
+            self._serialised_patches[id(previous)] = (previous, serialised_patch)
+        return self._serialised_patches[id(previous)][1]
+
+
+class WebsocketClient():
+    '''
+    A client connected by websocket.
+    Each client has its own queue of messages, sent by its own task, so that a slow client cannot hold up others.
+    The queue holds at most one message per block; if a client falls behind, a newer update for a block
+    replaces the older one that has not yet been sent.
+    '''
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.sequence_number = 0
+        self.superseded_messages_dropped = 0
+        self.queue_overflows = 0
+        self._queue = collections.OrderedDict()
+        self._queue_not_empty = asyncio.Event()
+        self.reset_snapshots()
+        self._task = asyncio.ensure_future(self._send_queued_messages())
+
+    def queue(self, key, outgoing_message, ignore_size_limit=False):
+        '''
+        Queue a message to send. 'key' identifies what the message is about (e.g. a block), so that
+        it can replace an older message about the same thing. Returns False if the queue is full
+        (unless 'ignore_size_limit' is set, as it is when queuing the full state, which must not be cut short).
+        '''
+        if key in self._queue:
+            del self._queue[key]
+            self.superseded_messages_dropped += 1
+        elif len(self._queue) >= config.websocket_client_queue_size() and not ignore_size_limit:
+            self.queue_overflows += 1
+            return False
+        self._queue[key] = outgoing_message
+        self._queue_not_empty.set()
+        return True
+
+    def clear_queue(self):
+        '''
+        Removes all queued messages, except for deletions (which cannot be recreated later).
+        '''
+        for key in [k for k, m in self._queue.items() if m.msg['msg_type'] != 'delete']:
+            del self._queue[key]
+
+    def queue_length(self):
+        return len(self._queue)
+
+    def reset_snapshots(self):
+        '''
+        Forget what the client has been sent, so that it is next sent each block in full.
+        '''
+        self.sent_snapshots = {}
+        self.last_full_update_time = time.time()
+
+    def close(self):
+        self._task.cancel()
+
+    def summarise(self):
+        return {
+            'queue_length': self.queue_length(),
+            'superseded_messages_dropped': self.superseded_messages_dropped,
+            'queue_overflows': self.queue_overflows
+        }
+
+    async def _send_queued_messages(self):
+        while True:
+            await self._queue_not_empty.wait()
+            self._queue_not_empty.clear()
+            while len(self._queue) > 0:
+                key, outgoing_message = self._queue.popitem(last=False)
+                text = self._text_to_send(key, outgoing_message)
+                if text is None:
+                    continue
+                try:
+                    await self.ws.send(text)
+                except websockets.ConnectionClosed:
+                    logger.debug('Websocket client has closed, so can no longer send to it')
+                    return
+
+    def _text_to_send(self, key, outgoing_message):
+        '''
+        Returns the text to send to this client for the given message, or None if there is nothing to send.
+        Block updates are sent as a patch (just the changes since the last update this client was sent
+        for that block), unless the client has not yet been sent the block in full.
+        '''
+        msg_type = outgoing_message.msg['msg_type']
+        if msg_type == 'delete':
+            self.sent_snapshots.pop(key, None)
+        elif msg_type == 'update':
+            previous = self.sent_snapshots.get(key)
+            self.sent_snapshots[key] = outgoing_message.msg['data']
+            if previous is not None:
+                text = outgoing_message.serialised_patch_from(previous)
+                return self._with_sequence_number(text) if text is not None else None
+
+        text = outgoing_message.serialised()
+
+        return self._with_sequence_number(text) if outgoing_message.has_sequence_number else text
+
+    def _with_sequence_number(self, text):
+        # Each client has its own sequence number, so it is added to the already-serialised JSON object:
+        self.sequence_number += 1
+        return '%s, "seq": %d}' % (text[:-1], self.sequence_number)
@@ -1,9 +1,13 @@
 import websockets
 import asyncio
+import copy
 import json
+import time
 import brave.helpers
+import brave.config as config
 import psutil
 from brave.outputs.webrtc import WebRTCOutput
+from brave.api.websocket_client import WebsocketClient, OutgoingMessage
 logger = brave.helpers.get_logger('websockets')
 
 
@@ -14,37 +18,66 @@ class WebsocketsHandler():
 
     def __init__(self, session):
         self.session = session
-        self._websocket_clients = []
+        self._clients = {}
+        self._cpu_percent = None
+        # Totals from clients that have disconnected:
+        self._superseded_messages_dropped = 0
+        self._queue_overflows = 0
 
     async def send_message_to_first_client(self, m):
-        ws = self._websocket_clients[0]
+        ws = next(iter(self._clients))
         await ws.send(json.dumps({'msg': m}))
 
     async def feed(self, request, ws):
-        self._websocket_clients.append(ws)
-
-        logger.debug('New websocket client... I now have %d websocket clients' % len(self._websocket_clients))
-
-        async def heartbeat():
-            try:
-                HEARTBEAT_PERIOD = 5
-                while True:
-                    await ws.send(json.dumps({'msg_type': 'ping', 'cpu_percent': psutil.cpu_percent(interval=0)}))
-                    await asyncio.sleep(HEARTBEAT_PERIOD)
-            except websockets.ConnectionClosed:
-                if ws in self._websocket_clients:
-                    self._websocket_clients.remove(ws)
-                if hasattr(ws, 'webrtc_output'):
-                    await ws.webrtc_output.remove_peer_request(ws)
-                    delattr(ws, 'webrtc_output')
-                # await output.remove_peer_request()
-
-        asyncio.ensure_future(heartbeat())
+        client = WebsocketClient(ws)
+        self._clients[ws] = client
+        logger.debug('New websocket client... I now have %d websocket clients' % len(self._clients))
+        if self._cpu_percent is not None:
+            client.queue('ping', self._ping_message())
+
+        try:
+            await self._handle_messages_from_client(ws)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            client.close()
+            del self._clients[ws]
+            self._superseded_messages_dropped += client.superseded_messages_dropped
+            self._queue_overflows += client.queue_overflows
+            if hasattr(ws, 'webrtc_output'):
+                await ws.webrtc_output.remove_peer_request(ws)
+                delattr(ws, 'webrtc_output')
+            logger.debug('Websocket client gone... I now have %d websocket clients' % len(self._clients))
+
+    async def send_pings(self):
+        '''
+        Periodically sends every client a 'ping', containing the CPU usage.
+        The CPU usage is sampled once, however many clients there are.
+        '''
+        HEARTBEAT_PERIOD = 5
+        while True:
+            self._cpu_percent = psutil.cpu_percent(interval=0)
+            ping = self._ping_message()
+            for client in list(self._clients.values()):
+                client.queue('ping', ping)
+            await asyncio.sleep(HEARTBEAT_PERIOD)
+
+    def summarise(self):
+        return {
+            'clients': [client.summarise() for client in self._clients.values()],
+            'superseded_messages_dropped': self._superseded_messages_dropped +
+            sum(c.superseded_messages_dropped for c in self._clients.values()),
+            'queue_overflows': self._queue_overflows + sum(c.queue_overflows for c in self._clients.values())
+        }
+
+    async def _handle_messages_from_client(self, ws):
         while True:
             data_json = await ws.recv()
             data = json.loads(data_json)
             if ('msg_type' in data and data['msg_type'] == 'pong'):
                 pass
+            elif ('msg_type' in data and data['msg_type'] == 'resync'):
+                self.resync_client(self._clients[ws])
             elif ('msg_type' in data and data['msg_type'] == 'webrtc-init'):
                 if 'output_id' not in data or data['output_id'] is None:
                     await ws.send(json.dumps({'error': 'no output_id'}))
@@ -80,44 +113,111 @@ class WebsocketsHandler():
             else:
                 logger.warning('Unknown websocket message from client:' + data_json)
 
-    async def periodic_check(self):
+    async def send_updates_when_notified(self):
+        '''
+        Sends updates to clients whenever the session reports that something has changed.
+        Nothing is done when there are no changes.
+        '''
+        self._loop = asyncio.get_event_loop()
+        self._updates_available = asyncio.Event()
+        self._notification_pending = False
+        self.session.items_updated_listeners.append(self._on_items_updated)
+        self.session.level_meters.listeners.append(self._on_levels)
         while True:
-            UPDATE_PERIOD = 0.1
+            await self._updates_available.wait()
+
+            # Wait briefly, so that a burst of changes (e.g. a block changing state) is sent together:
+            await asyncio.sleep(config.websocket_update_window())
+            self._updates_available.clear()
+            self._notification_pending = False
             try:
-                messages_to_send = await self.check_for_items_recently_updated()
-                messages_to_send.extend(await self.check_for_items_recently_deleted())
-                await self.send_to_all_clients(messages_to_send)
+                messages_to_send = self.check_for_items_recently_updated()
+                messages_to_send.extend(self.check_for_items_recently_deleted())
+                self.send_to_all_clients(messages_to_send)
             except Exception as e:
-                logger.warning('Error on periodic websocket check:' + str(e))
-            await asyncio.sleep(UPDATE_PERIOD)
-
-    async def check_for_items_recently_updated(self):
-        items_recently_updated = set(self.session.items_recently_updated)
-        self.session.items_recently_updated = []
+                logger.warning('Error sending updates to websocket clients:' + str(e))
+
+    def _on_items_updated(self):
+        '''
+        Called by the session, from whichever thread made the change (normally the master thread).
+        '''
+        if not self._notification_pending:
+            self._notification_pending = True
+            self._loop.call_soon_threadsafe(self._updates_available.set)
+
+    def _on_levels(self, levels):
+        '''
+        Called by the session's level meters (on the master thread) with the latest audio levels of every block
+        that has a level meter. They are sent to every client as one message.
+        '''
+        if len(self._clients) > 0:
+            message = OutgoingMessage({'msg_type': 'levels', 'levels': levels}, has_sequence_number=False)
+            self._loop.call_soon_threadsafe(self._queue_levels, message)
+
+    def _queue_levels(self, message):
+        # A client that has not yet been sent the previous levels is sent just these instead:
+        for client in list(self._clients.values()):
+            client.queue('levels', message)
+
+    def check_for_items_recently_updated(self):
+        items_recently_updated, self.session.items_recently_updated = self.session.items_recently_updated, []
+        if len(self._clients) == 0:
+            return []
+
+        # Each block is only summarised once, however many times it was updated:
+        return [self._update_message(o) for o in dict.fromkeys(items_recently_updated)]
+
+    def check_for_items_recently_deleted(self):
+        items_recently_deleted, self.session.items_recently_deleted = self.session.items_recently_deleted, []
         messages_to_send = []
-        for o in items_recently_updated:
-            messages_to_send.append({
-                'msg_type': 'update',
-                'block_type': o.input_output_overlay_or_mixer(),
-                'data': o.summarise()
-            })
-        return messages_to_send
-
-    async def check_for_items_recently_deleted(self):
-        messages_to_send = []
-        for item in self.session.items_recently_deleted:
-            messages_to_send.append({
+        for item in items_recently_deleted:
+            messages_to_send.append(OutgoingMessage({
                 'msg_type': 'delete',
                 'block_type': item['block_type'],
                 'id': item['id']
-            })
-        self.session.items_recently_deleted = []
+            }))
         return messages_to_send
 
-    async def send_to_all_clients(self, messages_to_send):
-        for msg in messages_to_send:
-            for ws in self._websocket_clients:
-                try:
-                    await ws.send(json.dumps(msg))
-                except websockets.ConnectionClosed:
-                    self._websocket_clients.remove(ws)
+    def resync_client(self, client):
+        '''
+        Queues the full state of every block to the client.
+        Clients request this if they miss a message (i.e. there is a gap in the sequence numbers.)
+        It also happens if the client has fallen so far behind that its queue is full.
+        As the client must be sent every block, this may take its queue beyond websocket_client_queue_size
+        (but, with one message per block, no further).
+        '''
+        client.clear_queue()
+        client.reset_snapshots()
+        for collection in [self.session.inputs, self.session.mixers, self.session.outputs, self.session.overlays]:
+            for block in list(collection.values()):
+                message = self._update_message(block)
+                client.queue(self._key(message), message, ignore_size_limit=True)
+
+    def send_to_all_clients(self, messages_to_send):
+        '''
+        Queues the messages for every client. This does not wait for them to be sent.
+        '''
+        for client in list(self._clients.values()):
+            if time.time() - client.last_full_update_time > config.websocket_resync_period():
+                client.reset_snapshots()
+            for message in messages_to_send:
+                if not client.queue(self._key(message), message):
+                    logger.warning('Websocket client has fallen behind, so will be sent everything again')
+                    self.resync_client(client)
+                    break
+
+    def _key(self, message):
+        if message.msg['msg_type'] == 'update':
+            return (message.msg['block_type'], message.msg['data']['id'])
+        return (message.msg['block_type'], message.msg['id'])
+
+    def _update_message(self, block):
+        # A copy is made, so that the snapshot cannot be changed by the block after it has been sent:
+        return OutgoingMessage({
+            'msg_type': 'update',
+            'block_type': block.input_output_overlay_or_mixer(),
+            'data': copy.deepcopy(block.summarise())
+        })
+
+    def _ping_message(self):
+        return OutgoingMessage({'msg_type': 'ping', 'cpu_percent': self._cpu_percent}, has_sequence_number=False)
@@ -0,0 +1,243 @@
+'''
+Cluster mode: placing outputs on other Brave instances ('peers'), so that more can be encoded than
+one host can manage, whilst this Brave (the 'controller') presents them all through its API.
+
+An output with a 'node' property is created on that peer (see brave/outputs/remote.py). Its source's
+content is sent to the peer by a Link: a low-latency TCP output on this Brave, received by a
+'tcp_client' input on the peer. Outputs on the same peer with the same source share a Link.
+
+Peers are ordinary Brave instances, controlled through their API. All requests to peers are made on
+one thread, so that they do not hold up GStreamer or the API. That thread also polls each peer, so
+that the state of its outputs is known, and recreates anything that has gone missing from it
+(e.g. because the peer restarted).
+'''
+import json
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+import brave.config as config
+import brave.exceptions
+from brave.helpers import get_logger, run_on_master_thread_when_idle
+from brave.outputs.remote import RemoteOutput
+
+POLL_FREQUENCY = 2
+REQUEST_TIMEOUT = 5
+
+# Link outputs are given IDs from here, so that they do not take IDs that a config file may use:
+LINK_OUTPUT_ID_START = 10000
+
+
+class Peer():
+    '''
+    Another Brave instance, reached via its API.
+    '''
+
+    def __init__(self, name, url):
+        self.name = name
+        self.url = url.rstrip('/')
+
+    def request(self, method, path, body=None):
+        '''
+        Makes a request to the peer's API, returning the response (JSON) body.
+        Raises OSError (including urllib's errors) or ValueError on failure.
+        '''
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                return json.loads(response.read().decode())
+        except urllib.error.HTTPError as e:
+            raise OSError('%s %s returned %d: %s' % (method, path, e.code, e.read().decode(errors='replace')))
+
+
+class Link():
+    '''
+    Sends the content of a source (an input or mixer) to a peer.
+    '''
+
+    def __init__(self, source, peer, output):
+        self.source = source
+        self.peer = peer
+        self.output = output
+        self.peer_input_id = None
+        self.users = set()
+
+
+class Cluster():
+    def __init__(self, session):
+        self.session = session
+        self.logger = get_logger('cluster')
+        self.peers = {name: Peer(name, url) for name, url in config.peers().items()}
+        self.links = {}
+        self._tasks = queue.Queue()
+        threading.Thread(target=self._run, name='cluster-thread', daemon=True).start()
+
+    def get_peer(self, name):
+        if name not in self.peers:
+            raise brave.exceptions.InvalidConfiguration(
+                'Unknown node "%s", must be one of: %s' % (name, ', '.join(self.peers.keys())))
+        return self.peers[name]
+
+    def submit(self, func, **args):
+        '''
+        Queues the function to be run on the cluster thread.
+        '''
+        self._tasks.put((func, args))
+
+    def get_link(self, source, peer):
+        '''
+        Returns the Link that sends the source to the peer, creating it if needed.
+        '''
+        key = (source.uid, peer.name)
+        if key not in self.links:
+            output_props = {'type': 'tcp', 'source': source.uid, 'host': config.cluster_host(),
+                            'low_latency': True, 'id': self._new_link_output_id()}
+            width, height = source.get_dimensions()
+            if width and height:
+                output_props.update({'width': width, 'height': height})
+            output = self.session.outputs.add(**output_props)
+            output.cluster_link = True
+            self.links[key] = Link(source, peer, output)
+            self.logger.info('Created link of %s to node "%s" via %s' % (source.uid, peer.name, output.uid))
+        return self.links[key]
+
+    def release_link(self, link, user):
+        '''
+        Called when the user (a RemoteOutput) no longer needs the Link. It is deleted once nothing needs it.
+        '''
+        link.users.discard(user)
+        if len(link.users) == 0:
+            self.links.pop((link.source.uid, link.peer.name), None)
+            link.output.delete()
+            self.submit(self._delete_link_from_peer, link=link)
+
+    def place(self, remote_output):
+        '''
+        Creates the output on its peer (and, if needed, the input on the peer that receives its source).
+        '''
+        if remote_output.deleted or remote_output.remote_id is not None:
+            return
+        peer, link = remote_output.peer, remote_output.link
+        try:
+            if link.peer_input_id is None:
+                link.peer_input_id = peer.request('PUT', '/api/inputs', {
+                    'type': 'tcp_client', 'host': config.cluster_host(), 'port': link.output.port})['id']
+            response = peer.request('PUT', '/api/outputs',
+                                    {**remote_output.remote_props(), 'source': 'input%d' % link.peer_input_id})
+            remote_output.remote_id = response['id']
+            self.logger.info('Created %s on node "%s" as output%d' %
+                             (remote_output.uid, peer.name, remote_output.remote_id))
+        except (OSError, ValueError, KeyError) as e:
+            self._report_error(remote_output, 'Unable to create on node "%s": %s' % (peer.name, e))
+
+    def update_on_peer(self, remote_output, updates):
+        # If it has not been created on the peer yet, it will be created with the updated properties:
+        if remote_output.deleted or remote_output.remote_id is None:
+            return
+        try:
+            remote_output.peer.request('POST', '/api/outputs/%d' % remote_output.remote_id, updates)
+        except (OSError, ValueError) as e:
+            self._report_error(remote_output, 'Unable to update on node "%s": %s' % (remote_output.peer.name, e))
+
+    def delete_from_peer(self, remote_output):
+        if remote_output.remote_id is None:
+            return
+        try:
+            remote_output.peer.request('DELETE', '/api/outputs/%d' % remote_output.remote_id)
+        except (OSError, ValueError) as e:
+            self.logger.warning('Unable to delete %s from node "%s": %s' %
+                                (remote_output.uid, remote_output.peer.name, e))
+        remote_output.remote_id = None
+
+    def end(self):
+        '''
+        Called when this Brave is ending, to delete what it created on its peers.
+        '''
+        for id in list(self.session.outputs):
+            output = self.session.outputs.get(id)
+            if isinstance(output, RemoteOutput):
+                output.deleted = True
+                self.delete_from_peer(output)
+        for link in list(self.links.values()):
+            self._delete_link_from_peer(link)
+
+    def _delete_link_from_peer(self, link):
+        if link.peer_input_id is None:
+            return
+        try:
+            link.peer.request('DELETE', '/api/inputs/%d' % link.peer_input_id)
+        except (OSError, ValueError) as e:
+            self.logger.warning('Unable to delete input%d from node "%s": %s' % (link.peer_input_id, link.peer.name, e))
+        link.peer_input_id = None
+
+    def _new_link_output_id(self):
+        id = LINK_OUTPUT_ID_START
+        while id in self.session.outputs:
+            id += 1
+        return id
+
+    def _run(self):
+        next_poll = time.monotonic()
+        while True:
+            try:
+                func, args = self._tasks.get(timeout=max(0, next_poll - time.monotonic()))
+                func(**args)
+            except queue.Empty:
+                pass
+            except Exception as e:
+                self.logger.warning('Cluster task %s failed: %s' % (func.__name__, e))
+
+            if time.monotonic() >= next_poll:
+                for peer in list(self.peers.values()):
+                    try:
+                        self._poll(peer)
+                    except Exception as e:
+                        self.logger.warning('Unable to poll node "%s": %s' % (peer.name, e))
+                next_poll = time.monotonic() + POLL_FREQUENCY
+
+    def _poll(self, peer):
+        '''
+        Gets the state of the outputs on the peer, and recreates any that are missing.
+        '''
+        # The outputs may be changing on the master thread, so their IDs are copied first:
+        outputs = [self.session.outputs.get(id) for id in list(self.session.outputs)]
+        remote_outputs = [output for output in outputs
+                          if isinstance(output, RemoteOutput) and output.peer is peer and not output.deleted]
+        if len(remote_outputs) == 0:
+            return
+
+        try:
+            outputs_on_peer = {output['id']: output for output in peer.request('GET', '/api/outputs')}
+            inputs_on_peer = set(input['id'] for input in peer.request('GET', '/api/inputs'))
+        except (OSError, ValueError) as e:
+            for remote_output in remote_outputs:
+                self._report_error(remote_output, 'Node "%s" is unreachable: %s' % (peer.name, e))
+            return
+
+        for link in list(self.links.values()):
+            if link.peer is peer and link.peer_input_id is not None and link.peer_input_id not in inputs_on_peer:
+                self.logger.warning('input%d has gone from node "%s", so will be created again' %
+                                    (link.peer_input_id, peer.name))
+                link.peer_input_id = None
+
+        for remote_output in remote_outputs:
+            if remote_output.remote_id in outputs_on_peer and remote_output.link.peer_input_id is not None:
+                run_on_master_thread_when_idle(remote_output.on_remote_summary,
+                                               summary=outputs_on_peer[remote_output.remote_id])
+                continue
+
+            if remote_output.remote_id in outputs_on_peer:
+                # Its source on the peer has gone, so it is replaced:
+                self.delete_from_peer(remote_output)
+            elif remote_output.remote_id is not None:
+                self.logger.warning('%s has gone from node "%s", so will be created again' %
+                                    (remote_output.uid, peer.name))
+                remote_output.remote_id = None
+            self.place(remote_output)
+
+    def _report_error(self, remote_output, message):
+        self.logger.warning('%s: %s' % (remote_output.uid, message))
+        run_on_master_thread_when_idle(remote_output.on_remote_error, message=message)
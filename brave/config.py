@@ -1,22 +1,30 @@
 import yaml
 import os
+import socket
 import brave.exceptions
 DEFAULT_CONFIG_FILENAME = 'config/default.yaml'
 c = {}
+config_filename = None
 
 
 def init(filename=DEFAULT_CONFIG_FILENAME):
+    global config_filename
+    config_filename = filename
     try:
         with open(filename, 'r') as stream:
-            global c
-            c = yaml.load(stream, Loader=yaml.FullLoader)
-            if c is None:
-                c = {}
+            init_from_dict(yaml.load(stream, Loader=yaml.FullLoader) or {})
     except FileNotFoundError as e:
         print('Unable to open config file "%s": %s' % (filename, e))
         exit(1)
 
-    _validate()
+
+def init_from_dict(new_config):
+    '''
+    Uses the provided config, rather than reading one from a file. (Used by input worker processes.)
+    '''
+    validate(new_config)
+    global c
+    c = new_config
 
 
 def raw():
@@ -35,6 +43,51 @@ def api_port():
     return c['api_port'] if 'api_port' in c else 5000
 
 
+def startup_threads():
+    'The number of threads used to create the mixers and inputs in the config file, when starting'
+    return c['startup_threads'] if 'startup_threads' in c else min(8, os.cpu_count() or 1)
+
+
+def update_coalesce_period():
+    'The minimum seconds between applying updates (from the API) to the same block. Updates in between are merged.'
+    return c['update_coalesce_period'] if 'update_coalesce_period' in c else 0.04
+
+
+def snapshot_refresh_period():
+    'Seconds between refreshes of the snapshot of all blocks served by the API (to update values such as position)'
+    return c['snapshot_refresh_period'] if 'snapshot_refresh_period' in c else 1
+
+
+def websocket_update_window():
+    'Seconds to wait after a change, so that a burst of changes are sent to websocket clients together'
+    return c['websocket_update_window'] if 'websocket_update_window' in c else 0.02
+
+
+def websocket_resync_period():
+    'Seconds between sending each websocket client every block in full, rather than just the changes'
+    return c['websocket_resync_period'] if 'websocket_resync_period' in c else 60
+
+
+def websocket_client_queue_size():
+    'The most messages that can be waiting to be sent to each websocket client'
+    return c['websocket_client_queue_size'] if 'websocket_client_queue_size' in c else 1000
+
+
+def level_meter_rate():
+    'How many times a second the audio levels of blocks with a level meter are measured, and sent to websocket clients'
+    return c['level_meter_rate'] if 'level_meter_rate' in c else 10
+
+
+def profile():
+    'Whether to enable GStreamer\'s latency tracer, to provide /api/profile'
+    return c['profile'] if 'profile' in c else False
+
+
+def profile_window():
+    'The number of seconds of measurements that /api/profile covers'
+    return c['profile_window'] if 'profile_window' in c else 10
+
+
 def enable_audio():
     return 'enable_audio' not in c or c['enable_audio'] is True
 
@@ -51,6 +104,27 @@ def default_mixer_height():
     return c['default_mixer_height'] if 'default_mixer_height' in c else 360
 
 
+def default_transport():
+    'How content is sent between pipelines, e.g. from an input to a mixer. See brave/transports.py'
+    return c['default_transport'] if 'default_transport' in c else 'inter'
+
+
+def share_encoders():
+    return 'share_encoders' in c and c['share_encoders'] is True
+
+
+def peers():
+    'Other Brave instances that outputs can be placed on, as a dictionary of name to API URL'
+    return c['peers'] if 'peers' in c and c['peers'] is not None else {}
+
+
+def cluster_host():
+    'The address of this Brave that peers connect to, to receive content from it'
+    if 'cluster_host' in c:
+        return c['cluster_host']
+    return socket.gethostbyname(socket.gethostname())
+
+
 def inputs():
     if 'inputs' in c and c['inputs'] is not None:
         return c['inputs']
@@ -94,16 +168,29 @@ def turn_server():
     return c['turn_server'] if 'turn_server' in c else None
 
 
-def _validate():
+def validate(config):
+    '''
+    Checks that a config (as read from a config file) is valid, raising InvalidConfiguration if not.
+    '''
+    if not isinstance(config, dict):
+        raise brave.exceptions.InvalidConfiguration('Config must be a dictionary')
+    if 'peers' in config and config['peers'] is not None and not isinstance(config['peers'], dict):
+        raise brave.exceptions.InvalidConfiguration(
+            'Config entry "peers" must be a dictionary of name to URL. It is currently: %s' % config['peers'])
+    if 'level_meter_rate' in config and (not isinstance(config['level_meter_rate'], (int, float)) or
+                                         config['level_meter_rate'] <= 0):
+        raise brave.exceptions.InvalidConfiguration(
+            'Config entry "level_meter_rate" must be a positive number. It is currently: %s' %
+            config['level_meter_rate'])
     for type in ['inputs', 'outputs', 'overlays', 'mixers']:
-        if type in c and c[type] is not None:
-            if not isinstance(c[type], list):
+        if type in config and config[type] is not None:
+            if not isinstance(config[type], list):
                 raise brave.exceptions.InvalidConfiguration(
-                    'Config entry "%s" must be an array (list). It is currently: %s' % (type, c[type]))
-            for entry in c[type]:
+                    'Config entry "%s" must be an array (list). It is currently: %s' % (type, config[type]))
+            for entry in config[type]:
                 if not isinstance(entry, dict):
                     raise brave.exceptions.InvalidConfiguration(
-                        'Config entry "%s" contains an entry that is not a dictionary: %s' % (type, c[type]))
+                        'Config entry "%s" contains an entry that is not a dictionary: %s' % (type, config[type]))
                 for key, value in entry.items():
                     if not isinstance(key, str):
                         raise brave.exceptions.InvalidConfiguration(
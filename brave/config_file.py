@@ -17,6 +17,9 @@ def as_yaml(session):
         if len(collection) > 0:
             config[block_type] = []
             for name, block in collection.items():
+                # Links to other nodes are created as needed, so are not part of the config:
+                if hasattr(block, 'cluster_link'):
+                    continue
                 config[block_type].append(block.summarise(for_config_file=True))
     return yaml.dump(config)
 
@@ -13,6 +13,19 @@ class ConnectionCollection(AbstractCollection):
     A Connection connects inputs, mixers, and outputs.
     '''
 
+    def __init__(self, session):
+        super().__init__(session)
+        # Indexes, so that connections can be found without checking every one.
+        # Each maps to a dict of connections by ID, which (like self._items) keeps them in the order added.
+        self._by_source = {}
+        self._by_dest = {}
+        self._by_source_and_dest = {}
+
+    def __delitem__(self, key):
+        if key in self._items:
+            self._remove_from_indexes(self._items[key])
+        super().__delitem__(key)
+
     def add(self, source, dest, **args):
         if isinstance(source, Output):
             raise ValueError('Cannot have a connection with output as source')
@@ -27,22 +40,23 @@ class ConnectionCollection(AbstractCollection):
             self._items[args['id']] = ConnectionToMixer(source=source, dest=dest, collection=self, **args)
         else:
             self._items[args['id']] = ConnectionToOutput(source=source, dest=dest, collection=self, **args)
+        self._add_to_indexes(self._items[args['id']])
         return self._items[args['id']]
 
     def get_first_for_source(self, source):
-        return next((x for x in self._items.values() if x.source == source), None)
+        return next(iter(self._by_source.get(source, {}).values()), None)
 
     def get_all_for_source(self, source):
-        return list(filter(lambda x: x.source == source, self._items.values()))
+        return list(self._by_source.get(source, {}).values())
 
     def get_first_for_dest(self, dest):
-        return next((x for x in self._items.values() if x.dest == dest), None)
+        return next(iter(self._by_dest.get(dest, {}).values()), None)
 
     def get_all_for_dest(self, dest):
-        return list(filter(lambda x: x.dest == dest, self._items.values()))
+        return list(self._by_dest.get(dest, {}).values())
 
     def get_connection_between_source_and_dest(self, source, dest):
-        return next((x for x in self._items.values() if (x.source == source and x.dest == dest)), None)
+        return self._by_source_and_dest.get((source, dest))
 
     def get_or_add_connection_between_source_and_dest(self, source, dest):
         c = self.get_connection_between_source_and_dest(source, dest)
@@ -50,3 +64,23 @@ class ConnectionCollection(AbstractCollection):
             return self.add(source, dest)
         else:
             return c
+
+    def _add_to_indexes(self, connection):
+        self._by_source.setdefault(connection.source, {})[connection.id] = connection
+        self._by_dest.setdefault(connection.dest, {})[connection.id] = connection
+        self._by_source_and_dest.setdefault((connection.source, connection.dest), connection)
+
+    def _remove_from_indexes(self, connection):
+        for index, block in [(self._by_source, connection.source), (self._by_dest, connection.dest)]:
+            index[block].pop(connection.id, None)
+            if not index[block]:
+                del index[block]
+
+        # There should only be one connection between a source and dest, but if not, the next one takes its place:
+        key = (connection.source, connection.dest)
+        if self._by_source_and_dest.get(key) is connection:
+            del self._by_source_and_dest[key]
+            replacement = next((c for c in self._by_source.get(connection.source, {}).values()
+                                if c.dest == connection.dest), None)
+            if replacement:
+                self._by_source_and_dest[key] = replacement
@@ -1,5 +1,7 @@
 from gi.repository import Gst
-from brave.helpers import create_intersink_channel_name, block_pad, unblock_pad
+from brave.helpers import block_pad, unblock_pad
+from brave.transports import create_transport
+import brave.config as config
 
 
 class Connection():
@@ -9,16 +11,21 @@ class Connection():
      - mixer to mixer
      - input to output
      - mixer to output
+
+    Content is carried from the source's pipeline to the dest's pipeline by a transport.
     '''
 
     def __init__(self, **args):
+        transport_name = args.pop('transport', None)
         for a in args:
             setattr(self, a, args[a])
         self.logger = self.source.logger
+        self.transport = create_transport(transport_name or self._default_transport_name())
 
         self._elements_on_dest_pipeline = []
         self._elements_on_src_pipeline = []
         self._queue_into_intersink = {}
+        self._intersink_element = {}
 
     def delete(self, callback=None):
         '''
@@ -44,6 +51,20 @@ class Connection():
         pass
         # overwritten by subclass
 
+    def on_source_state_change(self, new_state):
+        '''
+        Called when the state of the source (input/mixer) pipeline has changed.
+        '''
+        if new_state == Gst.State.PLAYING:
+            self._update_transport_timing()
+
+    def on_dest_state_change(self, new_state):
+        '''
+        Called when the state of the dest (mixer/output) pipeline has changed.
+        '''
+        if new_state == Gst.State.PLAYING:
+            self._update_transport_timing()
+
     def set_new_caps(self, new_caps):
         if hasattr(self, 'capsfilter_after_intervideosrc'):
             self.capsfilter_after_intervideosrc.set_property('caps', new_caps)
@@ -62,6 +83,9 @@ class Connection():
             for audio_or_video in ['audio', 'video']:
                 pad = self._get_intersrc_src_pad(audio_or_video)
                 if pad:
+                    if audio_or_video in self._intersink_element:
+                        self.transport.start(audio_or_video, self._intersink_element[audio_or_video],
+                                             self._get_intersrc(audio_or_video))
                     unblock_pad(pad)
 
     def has_video(self):
@@ -79,25 +103,32 @@ class Connection():
     def summarise(self):
         return {
             'uid': self.source.uid,
-            'in_mix': self.in_mix()
+            'in_mix': self.in_mix(),
+            'transport': self.transport.name
         }
 
+    def _default_transport_name(self):
+        return config.default_transport()
+
+    def _update_transport_timing(self):
+        for audio_or_video, intersink in self._intersink_element.items():
+            intersrc = self._get_intersrc(audio_or_video)
+            if intersrc:
+                self.transport.update_timing(audio_or_video, intersink, intersrc)
+
     def _get_intersrc_src_pad(self, audio_or_video):
         element = self._get_intersrc(audio_or_video)
         return element.get_static_pad('src') if element else None
 
     def _create_inter_elements(self, audio_or_video):
         '''
-        Creates intervideosrc and intervideosink (or the equivalent audio ones)
+        Creates the intersrc and intersink (e.g. intervideosrc and intervideosink) of the transport.
         '''
         intersrc = self._create_intersrc(audio_or_video)
         intersink = self._create_intersink(audio_or_video)
         self._block_intersrc(audio_or_video)
-
-        # Give the 'inter' elements a channel name. It doesn't matter what, so long as they're unique.
-        channel_name = create_intersink_channel_name()
-        intersink.set_property('channel', channel_name)
-        intersrc.set_property('channel', channel_name)
+        self.transport.pair(audio_or_video, intersink, intersrc)
+        self._intersink_element[audio_or_video] = intersink
         return intersrc, intersink
 
     def _block_intersrc(self, audio_or_video):
@@ -114,19 +145,23 @@ class Connection():
 
     def _create_intersink(self, audio_or_video):
         '''
-        The intervideosink/interaudiosink goes on the source (input/mixer) pipeline, to then connect to the destination.
+        The intersink (e.g. intervideosink) goes on the source (input/mixer) pipeline, to then connect to the
+        destination.
         '''
         assert(audio_or_video in ['audio', 'video'])
-        element_name = 'inter%ssink' % audio_or_video
-        element = self._add_element_to_src_pipeline(element_name, audio_or_video)
+
+        def add_element(factory_name, name=None):
+            return self._add_element_to_src_pipeline(factory_name, audio_or_video, name=name)
+
+        first_element, element = self.transport.create_intersink(audio_or_video, add_element)
         queue = self._add_element_to_src_pipeline('queue', audio_or_video, name=audio_or_video + '_queue')
         if not element or not queue:
             return
 
         self._queue_into_intersink[audio_or_video] = queue
 
-        if not queue.link(element):
-            self.logger.error('Failed to connect queue to %s' % element_name)
+        if not queue.link(first_element):
+            self.logger.error('Failed to connect queue to %s' % first_element.name)
 
         return element
 
@@ -210,11 +245,12 @@ class Connection():
         '''
         Make sure the elements created on the source and destination have their state set to match their pipeline.
         '''
+        # Elements with a locked state are ones that the transport will start when ready.
         for e in self._elements_on_dest_pipeline:
-            if not e.sync_state_with_parent():
+            if not e.is_locked_state() and not e.sync_state_with_parent():
                 self.logger.warning('Unable to set %s to state of parent source' % e.name)
         for e in self._elements_on_src_pipeline:
-            if not e.sync_state_with_parent():
+            if not e.is_locked_state() and not e.sync_state_with_parent():
                 self.logger.warning('Unable to set %s to state of parent source' % e.name)
 
     def _elements_are_created(self):
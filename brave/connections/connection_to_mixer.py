@@ -1,5 +1,7 @@
 from gi.repository import Gst
 from brave.connections.connection import Connection
+from brave.transports import create_transport
+import brave.exceptions
 UPDATABLE_PROPERTIES = ['zorder', 'xpos', 'ypos', 'width', 'height', 'volume']
 
 
@@ -44,12 +46,16 @@ class ConnectionToMixer(Connection):
         Places (adds) this input onto the mixer.
         If you want to replace what's on the mix. use source.cut()
         '''
-        self._ensure_elements_are_created()
+        if 'transport' in details:
+            self._set_transport(details['transport'])
 
+        # Props are set first, so that the video is scaled to the right size from the start:
         for prop in UPDATABLE_PROPERTIES:
             if prop in details:
                 setattr(self, prop, details[prop])
 
+        self._ensure_elements_are_created()
+
         if self.has_video():
             self._add_to_mix('video')
         if self.has_audio():
@@ -86,6 +92,17 @@ class ConnectionToMixer(Connection):
                 s[prop] = getattr(self, prop)
         return s
 
+    def _set_transport(self, transport_name):
+        '''
+        Choose the transport for this connection. This can only be done before it is first added to the mix.
+        '''
+        if transport_name == self.transport.name:
+            return
+        if hasattr(self, 'video_is_linked') or hasattr(self, 'audio_is_linked'):
+            raise brave.exceptions.InvalidConfiguration(
+                'Cannot change the transport of %s to %s once created' % (self.source.uid, self.dest.uid))
+        self.transport = create_transport(transport_name)
+
     def _add_to_mix(self, audio_or_video):
         if audio_or_video not in self._mix_request_pad:
             # We need to conect the tee to the destination. This is the pad of the tee:
@@ -136,7 +153,17 @@ class ConnectionToMixer(Connection):
         if volume != prev_volume:
             self._mix_request_pad['audio'].set_property('volume', float(volume))
 
-    def _set_mixer_width_and_height(self):
+    def set_new_caps(self, new_caps):
+        '''
+        Overrides parent. The source's own width and height are ignored, because the video is
+        scaled straight to the size that it is shown at on the mixer (see _set_scaled_caps).
+        '''
+        self._set_scaled_caps()
+
+    def _mixer_width_and_height(self):
+        '''
+        Returns the width and height that this source is shown at on the mixer.
+        '''
         # First stage: go with mixer's size
         width = self.dest.width
         height = self.dest.height
@@ -155,11 +182,33 @@ class ConnectionToMixer(Connection):
             if height + self.ypos > self.dest.height:
                 height = self.dest.height - self.ypos
 
+        return width, height
+
+    def _set_mixer_width_and_height(self):
+        width, height = self._mixer_width_and_height()
         self._mix_request_pad['video'].set_property('width', width)
         self._mix_request_pad['video'].set_property('height', height)
         self.logger.debug('Setting mixer width=%d and mixer height=%d' %
                           (self._mix_request_pad['video'].get_property('width'),
                            self._mix_request_pad['video'].get_property('height')))
+        self._set_scaled_caps()
+
+    def _set_scaled_caps(self):
+        '''
+        The videoscale after the intervideosrc scales to exactly the size that the mixer shows the source at.
+        This means the mixer's compositor has no scaling to do, so each frame is only scaled once.
+        '''
+        if not hasattr(self, 'capsfilter_after_intervideosrc'):
+            return
+        width, height = (max(1, dimension) for dimension in self._mixer_width_and_height())
+        caps_string = 'video/x-raw,pixel-aspect-ratio=1/1,format=RGBA,width=%d,height=%d' % (width, height)
+        current_caps = self.capsfilter_after_intervideosrc.get_property('caps')
+        if current_caps and current_caps.to_string() == Gst.Caps.from_string(caps_string).to_string():
+            return
+        self.logger.debug('Scaling video to ' + caps_string)
+        self.capsfilter_after_intervideosrc.set_property('caps', Gst.Caps.from_string(caps_string))
+        # caps-change-mode=1 allows the old caps to temporarily exist during the crossover period.
+        self.capsfilter_after_intervideosrc.set_property('caps-change-mode', 1)
 
     def _remove_from_mix(self, audio_or_video):
         if (not self._mix_request_pad[audio_or_video].is_linked()):
@@ -208,14 +257,15 @@ class ConnectionToMixer(Connection):
         Create the elements to connect the src and dest pipelines.
         Src pipeline looks like: tee -> queue -> intervideosink
         Dest pipeline looks like: intervideosrc -> videoscale -> videoconvert -> capsfilter -> queue -> tee
+        (The intervideosink and intervideosrc may be other elements, depending on the transport.)
         '''
         intervideosrc, intervideosink = self._create_inter_elements('video')
         self._create_dest_elements_after_intervideosrc(intervideosrc)
 
     def _create_dest_elements_after_intervideosrc(self, intervideosrc):
         '''
-        On the destination pipeline, after the intervideosrc, we scale/convert the video so that we can
-        set the relevant caps. This method provides theose elements.
+        On the destination pipeline, after the intervideosrc, we scale/convert the video to the size
+        and format that the mixer shows it at. This method provides those elements.
         '''
         videoscale = self._add_element_to_dest_pipeline('videoscale', 'video')
         if not intervideosrc.link(videoscale):
@@ -233,6 +283,8 @@ class ConnectionToMixer(Connection):
         if not videoconvert.link(self.capsfilter_after_intervideosrc):
             self.logger.error('Cannot link videoconvert to capsfilter')
 
+        self._set_scaled_caps()
+
         queue = self._add_element_to_dest_pipeline('queue', 'video', name='video_queue')
 
         # We use a tee even though we only have one output because then we can use
@@ -274,17 +326,13 @@ class ConnectionToMixer(Connection):
 
     def _create_intersrc(self, audio_or_video):
         '''
-        Create the intervideosrc / interaudiosrc
+        Create the intersrc (e.g. intervideosrc) of the transport
         '''
         assert(audio_or_video in ['audio', 'video'])
 
-        # Create the receiving 'inter' element to accept the AV into the main pipeline
-        self._intersrc_element[audio_or_video] =\
-            self._add_element_to_dest_pipeline('inter%ssrc' % audio_or_video, audio_or_video)
-
-        # We ask the src to hold the frame for 24 hours (basically, a very long time)
-        # This is optional, but prevents it from going black when it's better to show the last frame.
-        if audio_or_video is 'video':
-            self._intersrc_element[audio_or_video].set_property('timeout', Gst.SECOND * 60 * 60 * 24)
+        def add_element(factory_name, name=None):
+            return self._add_element_to_dest_pipeline(factory_name, audio_or_video, name=name)
 
+        # Create the receiving element(s) to accept the AV into the main pipeline
+        self._intersrc_element[audio_or_video] = self.transport.create_intersrc(audio_or_video, add_element)
         return self._intersrc_element[audio_or_video]
@@ -1,3 +1,4 @@
+from gi.repository import Gst
 from brave.connections.connection import Connection
 
 
@@ -5,7 +6,15 @@ class ConnectionToOutput(Connection):
     '''
     A connection from an input/mixer to an output.
     '''
+    def __init__(self, **args):
+        super().__init__(**args)
+        self.encoder_group = None
+
     def setup(self):
+        if self.dest.uses_shared_encoder():
+            self._join_encoder_group()
+            return
+
         if self.has_video():
             self._create_inter_elements('video')
 
@@ -45,3 +54,52 @@ class ConnectionToOutput(Connection):
             self._connect_tee_to_intersink('video')
         if self.has_audio():
             self._connect_tee_to_intersink('audio')
+
+    def delete(self, callback=None):
+        '''
+        Deletes this connection.
+        '''
+        if self.encoder_group is None:
+            return super().delete(callback)
+
+        self.encoder_group.remove_member(self.dest)
+        self.encoder_group = None
+        self.collection.pop(self.id)
+        if callback:
+            callback()
+
+    def unblock_intersrc_if_ready(self):
+        '''
+        Overridden because, when sharing an encoder, there is no intersrc to unblock.
+        Instead, the output may have been waiting for the source to start.
+        '''
+        if self.encoder_group is None:
+            return super().unblock_intersrc_if_ready()
+        self.dest._consider_changing_state()
+
+    def on_source_state_change(self, new_state):
+        '''
+        Called when the state of the source has changed.
+        An output sharing an encoder must keep the same clock and base time as its source.
+        '''
+        if self.encoder_group is None:
+            return super().on_source_state_change(new_state)
+        if new_state != Gst.State.PLAYING:
+            return
+        if self.dest.state == Gst.State.PLAYING:
+            self.dest.sync_clock_with_source()
+        else:
+            self.dest._consider_changing_state()
+
+    def _default_transport_name(self):
+        '''
+        The output has already created the intersrc, so the transport is decided by the output.
+        '''
+        return self.dest.transport
+
+    def _join_encoder_group(self):
+        '''
+        Rather than sending raw audio/video to the output, connect it to a group of shared encoders.
+        '''
+        self.encoder_group = self.source.session().encoder_groups.get_or_add_for_output(self.dest)
+        self.encoder_group.add_member(self.dest)
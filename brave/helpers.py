@@ -1,7 +1,11 @@
+import asyncio
+import ctypes
 import logging
 import os
 import gi
+import platform
 import sys
+import threading
 import traceback
 gi.require_version('Gst', '1.0')
 from gi.repository import Gst, GLib
@@ -31,6 +35,22 @@ def state_string_to_constant(str):
     return None
 
 
+# The number of the 'gettid' system call, for versions of Python without threading.get_native_id():
+SYS_GETTID = {'x86_64': 186, 'aarch64': 178, 'i686': 224, 'armv7l': 224}
+
+
+def native_thread_id():
+    '''
+    Returns the operating system's ID of the current thread (as found in /proc), or None if unknown.
+    '''
+    if hasattr(threading, 'get_native_id'):
+        return threading.get_native_id()
+    machine = platform.machine()
+    if sys.platform.startswith('linux') and machine in SYS_GETTID:
+        return ctypes.CDLL(None).syscall(SYS_GETTID[machine])
+    return None
+
+
 def round_down(n):
     return round(n - 0.5)
 
@@ -136,6 +156,36 @@ def run_on_master_thread_when_idle(func, **func_args):
     GLib.idle_add(function_runner, {'func': func, 'func_args': func_args})
 
 
+async def run_on_master_thread_and_wait(func, **func_args):
+    '''
+    Like run_on_master_thread_when_idle(), but for use by the API's event loop, waiting for (and returning)
+    the function's result. Any exception from the function is raised.
+    '''
+    loop = asyncio.get_event_loop()
+    future = loop.create_future()
+
+    def runner():
+        try:
+            loop.call_soon_threadsafe(set_future_result, future, (func(**func_args), None))
+        except Exception as e:
+            loop.call_soon_threadsafe(set_future_result, future, (None, e))
+
+    run_on_master_thread_when_idle(runner)
+    result, error = await future
+    if error is not None:
+        raise error
+    return result
+
+
+def set_future_result(future, result=None):
+    '''
+    Sets the result of an asyncio future, unless it has already been set (or cancelled).
+    For use with loop.call_soon_threadsafe(), to pass a result from the master thread to the API thread.
+    '''
+    if not future.done():
+        future.set_result(result)
+
+
 block_probes = {}
 
 
@@ -159,3 +209,29 @@ def unblock_pad(pad):
     if pad in block_probes:
         pad.remove_probe(block_probes[pad])
         del block_probes[pad]
+
+
+def create_json_patch(old, new, path=''):
+    '''
+    Given two JSON-compatible values, returns a list of JSON Patch (RFC 6902) operations
+    that change 'old' into 'new'. Dictionaries are compared key-by-key; anything else
+    (including lists) is replaced whole if it has changed.
+    '''
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return [] if old == new else [{'op': 'replace', 'path': path, 'value': new}]
+
+    operations = []
+    for key in old:
+        if key not in new:
+            operations.append({'op': 'remove', 'path': path + '/' + _json_pointer_escape(key)})
+    for key, value in new.items():
+        key_path = path + '/' + _json_pointer_escape(key)
+        if key not in old:
+            operations.append({'op': 'add', 'path': key_path, 'value': value})
+        else:
+            operations.extend(create_json_patch(old[key], value, key_path))
+    return operations
+
+
+def _json_pointer_escape(key):
+    return str(key).replace('~', '~0').replace('/', '~1')
@@ -4,6 +4,8 @@ from brave.pipeline_messaging import setup_messaging
 import brave.config as config
 import brave.exceptions
 from brave.helpers import state_string_to_constant
+from brave.metrics import BlockMetrics
+from brave.level_meters import add_level_meter_to_tee
 
 
 class InputOutputOverlay():
@@ -17,6 +19,7 @@ class InputOutputOverlay():
         self.elements = {}
         self.probes = {}
         self.setup_complete = False
+        self.metrics = BlockMetrics()
 
         # All blocks go to PLAYING unless the user requests otherwise:
         self._desired_state = Gst.State.PLAYING
@@ -103,6 +106,20 @@ class InputOutputOverlay():
         for state, elements in by_state.items():
             self.logger.debug(f'In {state} state: {", ".join(elements)}')
 
+    def add_level_meter(self):
+        '''
+        If the 'level_meter' property is set, measures the audio of this block (see brave/level_meters.py).
+        Called once the pipeline has been created.
+        '''
+        if getattr(self, 'level_meter', False) and self.has_audio() and hasattr(self, 'final_audio_tee'):
+            add_level_meter_to_tee(self.final_audio_tee)
+
+    def on_level_meter(self, structure):
+        '''
+        Called (on the master thread) with each measurement from this block's level meter.
+        '''
+        self.session().level_meters.on_level(self, structure)
+
     def has_video(self):
         return config.enable_video()
 
@@ -129,6 +146,8 @@ class InputOutputOverlay():
 
             if hasattr(self, 'pipeline'):
                 s['state'] = self.state.value_nick.upper()
+                s['cpu_percent'] = self.metrics.cpu_percent
+                s['threads'] = len(self.metrics.thread_ids)
 
             if self.desired_state:
                 s['desired_state'] = self.desired_state.value_nick.upper()
@@ -222,6 +241,9 @@ class InputOutputOverlay():
         '''
         Called when the state of this pipeline has changed.
         '''
+        if old_state != new_state:
+            self.metrics.state_changes += 1
+
         if new_state is Gst.State.NULL:
             # Likely means an error has occured, so remove user request to change state:
             self.desired_state = None
@@ -251,6 +273,12 @@ class InputOutputOverlay():
         if hasattr(self, 'on_pipeline_start') and starting:
             self.on_pipeline_start()
 
+        if not in_transition_to_another_state:
+            for connection in self.source_connections():
+                connection.on_dest_state_change(new_state)
+            for connection in self.dest_connections():
+                connection.on_source_state_change(new_state)
+
         self.report_update_to_user()
 
     def report_update_to_user(self):
@@ -258,7 +286,7 @@ class InputOutputOverlay():
         Report that this input/output/mixer has changed,
         and the update should be sent to the user via websocket.
         '''
-        self.session().items_recently_updated.append(self)
+        self.session().report_updated_item(self)
 
     def get_dimensions(self):
         '''
@@ -269,6 +297,44 @@ class InputOutputOverlay():
         else:
             return None, None
 
+    def validate_props(self, new_props, updating, ignore=[]):
+        '''
+        Checks, without changing anything, that the props could be set (or, if 'updating', updated),
+        raising InvalidConfiguration if not. Unlike _set_props(), values of the wrong type or not permitted
+        are errors, rather than ignored. Can be called on an uninitialised instance, to check props to create with.
+        '''
+        permitted = self.permitted_props()
+        for key, value in new_props.items():
+            if key in ['type', 'collection'] + ignore:
+                continue
+            if key not in permitted:
+                raise brave.exceptions.InvalidConfiguration(
+                    'Invalid prop provided to %s: "%s"' % (self.input_output_overlay_or_mixer(), key))
+            prop_details = permitted[key]
+            if updating and prop_details.get('updatable') is False and hasattr(self, key) and \
+                    getattr(self, key) != value:
+                raise brave.exceptions.InvalidConfiguration('Cannot update "%s" field' % key)
+            if value is None:
+                continue
+            try:
+                if prop_details.get('type') == 'int':
+                    value = int(value)
+                elif prop_details.get('type') == 'float':
+                    value = float(value)
+                elif prop_details.get('type') == 'bool' and type(value) is not bool:
+                    raise ValueError()
+            except (TypeError, ValueError):
+                raise brave.exceptions.InvalidConfiguration('"%s" must be of type %s' % (key, prop_details['type']))
+            if prop_details.get('uppercase') and isinstance(value, str):
+                value = value.upper()
+            if 'permitted_values' in prop_details and value not in prop_details['permitted_values']:
+                raise brave.exceptions.InvalidConfiguration('"%s" cannot be %s' % (key, value))
+
+        if not updating:
+            for key, details in permitted.items():
+                if details.get('required') and key not in new_props:
+                    raise brave.exceptions.InvalidConfiguration('"%s" property is required' % key)
+
     def _set_default_props(self):
         '''
         Called by the constructor to set up any default props.
@@ -390,7 +456,7 @@ class InputOutputOverlay():
         Called when the block is first started, or the state changes, to decide
         if an additional change needs to be made.
         '''
-        if not self.setup_complete or not self.desired_state:
+        if not self.setup_complete or not self.desired_state or self.collection.state_changes_deferred:
             return
 
         if self.state == self.desired_state:
@@ -5,9 +5,20 @@ from brave.inputs.image import ImageInput
 from brave.inputs.html import HTMLInput
 from brave.inputs.decklink import DecklinkInput
 from brave.inputs.tcp_client import TcpClientInput
+from brave.inputs.worker import WorkerInput
 from brave.abstract_collection import AbstractCollection
 import brave.exceptions
 
+INPUT_TYPES = {
+    'uri': UriInput,
+    'test_video': TestVideoInput,
+    'test_audio': TestAudioInput,
+    'image': ImageInput,
+    'html': HTMLInput,
+    'decklink': DecklinkInput,
+    'tcp_client': TcpClientInput
+}
+
 
 class InputCollection(AbstractCollection):
     def add(self, **args):
@@ -16,22 +27,14 @@ class InputCollection(AbstractCollection):
 
         if 'type' not in args:
             raise brave.exceptions.InvalidConfiguration("Invalid input missing 'type'")
-        elif args['type'] == 'uri':
-            input = UriInput(**args, collection=self)
-        elif args['type'] == 'test_video':
-            input = TestVideoInput(**args, collection=self)
-        elif args['type'] == 'test_audio':
-            input = TestAudioInput(**args, collection=self)
-        elif args['type'] == 'image':
-            input = ImageInput(**args, collection=self)
-        elif args['type'] == 'html':
-            input = HTMLInput(**args, collection=self)
-        elif args['type'] == 'decklink':
-            input = DecklinkInput(**args, collection=self)
-        elif args['type'] == 'tcp_client':
-            input = TcpClientInput(**args, collection=self)
-        else:
+        elif args['type'] not in INPUT_TYPES:
             raise brave.exceptions.InvalidConfiguration(f"Invalid input type '{str(args['type'])}'")
 
+        input_class = INPUT_TYPES[args['type']]
+        if args.get('separate_process'):
+            input = WorkerInput(input_class, **args, collection=self)
+        else:
+            input = input_class(**args, collection=self)
+
         self._items[args['id']] = input
         return input
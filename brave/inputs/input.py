@@ -13,6 +13,7 @@ class Input(InputOutputOverlay):
         Sets up the relevant GStreamer pipeline for this input.
         '''
         self.create_elements()
+        self.add_level_meter()
         self.handle_updated_props()
 
         self.setup_complete = True
@@ -21,6 +22,21 @@ class Input(InputOutputOverlay):
     def input_output_overlay_or_mixer(self):
         return 'input'
 
+    def permitted_props(self):
+        return {
+            **super().permitted_props(),
+            'separate_process': {
+                'type': 'bool',
+                'default': False,
+                'updatable': False
+            },
+            'level_meter': {
+                'type': 'bool',
+                'default': False,
+                'updatable': False
+            }
+        }
+
     def dest_connections(self):
         '''
         Returns an array of Connections, describing what this input is connected to.
@@ -1,5 +1,24 @@
+import time
+from gi.repository import Gst
 from brave.inputs.input import Input
 
+# How the time is drawn by 'simplevideomark' (and read by 'simplevideomarkdetect') when 'timestamp_marker' is set.
+# Each of the 36 squares is 8x8 pixels, in the bottom-left corner. The data is the time, in milliseconds.
+TIMESTAMP_MARKER_PROPERTIES = {
+    'pattern-width': 8,
+    'pattern-height': 8,
+    'pattern-count': 4,
+    'pattern-data-count': 32
+}
+TIMESTAMP_MARKER_MASK = 0xFFFFFFFF
+
+
+def timestamp_marker_now():
+    '''
+    The time (wall-clock, in milliseconds) as stored in the timestamp marker, which wraps after 32 bits.
+    '''
+    return int(time.time() * 1000) & TIMESTAMP_MARKER_MASK
+
 
 class TestVideoInput(Input):
     def has_audio(self):
@@ -19,11 +38,17 @@ class TestVideoInput(Input):
             'height': {
                 'type': 'int',
                 'default': 360
+            },
+            'timestamp_marker': {
+                'type': 'bool',
+                'default': False,
+                'updatable': False
             }
         }
 
     def create_elements(self):
-        pipeline_string = ('videotestsrc is-live=true name=videotestsrc'
+        timestamp_marker = ' ! simplevideomark name=timestamp_marker' if self.timestamp_marker else ''
+        pipeline_string = ('videotestsrc is-live=true name=videotestsrc' + timestamp_marker +
                            ' ! videoconvert ! videoscale ! capsfilter name=capsfilter ! ' +
                            self.default_video_pipeline_string_end())
         # FOR TESTING TO VIEW LOCALLY, APPEND: + ' final_video_tee. ! queue ! glimagesink ')
@@ -33,6 +58,24 @@ class TestVideoInput(Input):
         self.video_output_queue = self.pipeline.get_by_name('video_output_queue')
         self.videotestsrc = self.pipeline.get_by_name('videotestsrc')
         self.capsfilter = self.pipeline.get_by_name('capsfilter')
+        if self.timestamp_marker:
+            self._setup_timestamp_marker()
+
+    def _setup_timestamp_marker(self):
+        '''
+        Draws the time that each frame is created into the frame, so that latency can be measured
+        wherever it ends up (see benchmarks/latency.py).
+        '''
+        marker = self.pipeline.get_by_name('timestamp_marker')
+        for name, value in TIMESTAMP_MARKER_PROPERTIES.items():
+            marker.set_property(name, value)
+
+        # Called on the streaming thread just before each frame is marked:
+        def _on_frame(pad, info):
+            marker.set_property('pattern-data', timestamp_marker_now())
+            return Gst.PadProbeReturn.OK
+
+        marker.get_static_pad('sink').add_probe(Gst.PadProbeType.BUFFER, _on_frame)
 
     def handle_updated_props(self):
         super().handle_updated_props()
@@ -0,0 +1,260 @@
+'''
+Inputs that run in a separate (worker) process.
+
+An input with 'separate_process' set does not create its own pipeline in this process. Instead, a worker
+process is started that creates the input as normal, and sends its audio and/or video back via shared
+memory (shmsink/shmsrc, wrapped in GDP so that caps and timestamps are carried too). This means a slow
+decode, or a crash, of one input does not affect the rest of Brave, and that inputs can use other CPU cores.
+
+The parent sends updates (e.g. a new volume) to the worker, and the worker sends a summary of the input back.
+See brave/workers.py for how worker processes are run.
+'''
+import json
+import os
+import sys
+import tempfile
+from gi.repository import Gst, GLib
+from brave.inputs.input import Input
+from brave.workers import WorkerProcess, config_for_worker, init_worker_process, read_messages, add_shmsink
+import brave.exceptions
+
+# The worker is started with this Python code. (It is not run as a module, to avoid importing this one twice.)
+WORKER_COMMAND = 'import brave.inputs.worker; brave.inputs.worker.run_worker()'
+
+# How often the worker sends a summary, even when nothing has changed (so that e.g. the position is current):
+SUMMARY_FREQUENCY = 1
+
+# These are only known by the worker, so are taken from its summary:
+WORKER_SUMMARY_PROPS = ['position', 'duration', 'buffering_percent', 'buffer_size', 'buffer_duration',
+                        'connection_speed']
+
+
+class WorkerInput(Input):
+    '''
+    Represents, in this process, an input that runs in a worker process.
+    Its pipeline simply receives the audio/video from the worker, so that it can be connected to mixers and
+    outputs like any other input.
+    '''
+
+    def __init__(self, input_class, **args):
+        # An uninitialised instance of the input's own class, to provide its properties and whether it has
+        # audio and video. (Those do not depend on the instance's state.)
+        self.prototype = input_class.__new__(input_class)
+        super().__init__(**args)
+        self.worker = InputWorker(self)
+
+        # The state to return to if the worker is restarted:
+        self._resume_state = self.desired_state if self.desired_state is not None else Gst.State.PLAYING
+
+    def permitted_props(self):
+        return self.prototype.permitted_props()
+
+    def has_audio(self):
+        return self.prototype.has_audio()
+
+    def has_video(self):
+        return self.prototype.has_video()
+
+    def setup(self):
+        '''
+        Creates this input's pipeline, and starts the worker.
+        The shmsrc fails if it starts before the worker has created the shmsink, so setup is only
+        complete (allowing the pipeline to start) once the worker is ready.
+        '''
+        self.create_elements()
+        self.add_level_meter()
+        self.handle_updated_props()
+        self.worker.start()
+
+        # Seeking is done by the worker, and only once, so the position is not kept:
+        if hasattr(self, 'position'):
+            delattr(self, 'position')
+
+    def create_elements(self):
+        pipeline_string = ''
+        if self.has_video():
+            pipeline_string += ('shmsrc name=video_shmsrc is-live=true ! gdpdepay name=video_gdpdepay ! ' +
+                                self.default_video_pipeline_string_end())
+        if self.has_audio():
+            pipeline_string += (' shmsrc name=audio_shmsrc is-live=true ! gdpdepay name=audio_gdpdepay' +
+                                self.default_audio_pipeline_string_end())
+
+        self.create_pipeline_from_string(pipeline_string)
+        for audio_or_video in self._audio_and_or_video():
+            shmsrc = self.pipeline.get_by_name(audio_or_video + '_shmsrc')
+            shmsrc.set_property('socket-path', self.worker.socket_paths[audio_or_video])
+            setattr(self, 'final_%s_tee' % audio_or_video, self.pipeline.get_by_name('final_%s_tee' % audio_or_video))
+
+    def worker_props(self):
+        '''
+        The properties the worker should create the input with - its current ones, so that
+        any updates are kept when it is restarted. (The level meter is in this process.)
+        '''
+        props = {key: getattr(self, key) for key in self.permitted_props()
+                 if key not in ['state', 'separate_process', 'level_meter'] and hasattr(self, key)}
+        return {**props, 'type': self.type, 'state': self._resume_state.value_nick.upper()}
+
+    def update(self, updates):
+        super().update(updates)
+        self.worker.send({'update': updates})
+        if 'state' in updates and self.desired_state is not None:
+            self._resume_state = self.desired_state
+
+        # Seeking is done by the worker, and only once, so the position is not kept:
+        if hasattr(self, 'position'):
+            delattr(self, 'position')
+
+    def summarise(self, for_config_file=False):
+        s = super().summarise(for_config_file)
+        if not for_config_file:
+            s.pop('position', None)
+            s.pop('duration', None)
+            for key in WORKER_SUMMARY_PROPS:
+                if key in self.worker.summary:
+                    s[key] = self.worker.summary[key]
+            if 'error_message' not in s and 'error_message' in self.worker.summary:
+                s['error_message'] = self.worker.summary['error_message']
+            s['worker'] = {
+                'pid': self.worker.process.pid if self.worker.process else None,
+                'state': self.worker.summary.get('state'),
+                'restarts': self.worker.restarts
+            }
+        return s
+
+    def on_state_change(self, old_state, new_state, pending_state):
+        super().on_state_change(old_state, new_state, pending_state)
+        if new_state is Gst.State.PLAYING:
+            self.update_timing()
+
+    def update_timing(self):
+        '''
+        The timestamps from the worker are relative to the base time of its pipeline. As with the 'shm'
+        transport, the pad offset makes them relative to this pipeline's base time instead.
+        (The system clock of both processes is the same monotonic clock.)
+        '''
+        if self.worker.base_time is None or self.state is not Gst.State.PLAYING:
+            return
+        offset = self.worker.base_time - self.pipeline.get_base_time()
+        for audio_or_video in self._audio_and_or_video():
+            gdpdepay = self.pipeline.get_by_name(audio_or_video + '_gdpdepay')
+            gdpdepay.get_static_pad('src').set_offset(offset)
+
+    def on_worker_ready(self):
+        self.logger.info('Worker process %d is ready' % self.worker.process.pid)
+        self.desired_state = self._resume_state
+        self.setup_complete = True
+        self._consider_changing_state()
+
+    def on_worker_exit(self):
+        self.setup_complete = False
+        self.set_pipeline_state(Gst.State.NULL)
+        self.report_update_to_user()
+
+    def _delete_with_no_connections(self):
+        self.worker.stop()
+        super()._delete_with_no_connections()
+
+    def _audio_and_or_video(self):
+        return (['video'] if self.has_video() else []) + (['audio'] if self.has_audio() else [])
+
+
+class InputWorker(WorkerProcess):
+    '''
+    Starts, stops and talks to the worker process of a WorkerInput.
+    '''
+
+    def __init__(self, input):
+        super().__init__(WORKER_COMMAND, input.logger)
+        self.input = input
+        self.summary = {}
+        self.base_time = None
+        self.socket_paths = {audio_or_video: os.path.join(tempfile.gettempdir(), 'brave-%d-%s-%s' %
+                                                          (os.getpid(), input.uid, audio_or_video))
+                             for audio_or_video in ['video', 'audio']}
+        self._ready = False
+
+    def spec(self):
+        return {
+            'config': config_for_worker(),
+            'input': {**self.input.worker_props(), 'id': self.input.id},
+            'socket_paths': self.socket_paths
+        }
+
+    def start(self):
+        self._ready = False
+        super().start()
+
+    def on_exit(self):
+        self.summary, self.base_time = {}, None
+        self.input.on_worker_exit()
+
+    def on_message(self, message):
+        if 'base_time' in message and message['base_time'] != self.base_time:
+            self.base_time = message['base_time']
+            self.input.update_timing()
+
+        if 'summary' in message:
+            previous_summary, self.summary = self.summary, message['summary']
+            if not self._ready and self.summary.get('state') in ['PAUSED', 'PLAYING']:
+                self._ready = True
+                self.input.on_worker_ready()
+
+            # The position changes all the time, so only other changes are reported:
+            if _without_position(previous_summary) != _without_position(self.summary):
+                self.input.report_update_to_user()
+
+
+def _without_position(summary):
+    return {key: value for key, value in summary.items() if key != 'position'}
+
+
+def run_worker():
+    '''
+    The worker process. Creates the input, with a shmsink after each tee, and runs until its stdin closes.
+    '''
+    spec, messages_out = init_worker_process()
+    from brave.session import init as init_session
+    session = init_session()
+    input = session.inputs.add(**spec['input'])
+    input.setup()
+
+    for audio_or_video, socket_path in spec['socket_paths'].items():
+        if hasattr(input, 'final_%s_tee' % audio_or_video):
+            add_shmsink(getattr(input, 'final_%s_tee' % audio_or_video), socket_path)
+
+    def send_summary():
+        # There's no API in the worker, so updates to report are not kept:
+        session.items_recently_updated.clear()
+        message = {'summary': input.summarise()}
+        if hasattr(input, 'pipeline'):
+            message['base_time'] = input.pipeline.get_base_time()
+        try:
+            messages_out.write(json.dumps(message, default=str) + '\n')
+            messages_out.flush()
+        except OSError:
+            session.end()
+
+    def send_summary_periodically():
+        send_summary()
+        return True
+
+    def on_input(fd, condition, pending):
+        messages = read_messages(fd, pending)
+        if messages is None:
+            input.logger.debug('Worker process is ending')
+            session.end()
+            return False
+        for message in messages:
+            if 'update' in message:
+                try:
+                    input.update(message['update'])
+                except brave.exceptions.InvalidConfiguration as e:
+                    input.logger.warning('Invalid update %s: %s' % (message['update'], e))
+        return True
+
+    session.items_updated_listeners.append(send_summary)
+    GLib.io_add_watch(sys.stdin.fileno(), GLib.PRIORITY_DEFAULT, GLib.IOCondition.IN | GLib.IOCondition.HUP,
+                      on_input, bytearray())
+    GLib.timeout_add(SUMMARY_FREQUENCY * 1000, send_summary_periodically)
+    session.mainloop = GLib.MainLoop()
+    session.mainloop.run()
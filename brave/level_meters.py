@@ -0,0 +1,75 @@
+'''
+Audio level meters. An input, mixer or output with 'level_meter' set measures its audio with a 'level'
+element, which reports the peak, RMS and decay (in dB) of each channel, level_meter_rate times a second.
+
+Rather than a websocket message per block per measurement, the latest levels of every block are collected
+on the master thread, and sent to websocket clients together, as one 'levels' message, at the same rate.
+So a client can show every meter at once, with one small message at a time.
+'''
+from gi.repository import Gst
+import brave.config as config
+
+# Silence is reported as a very low level (or -infinity, which JSON cannot hold), so levels are limited to this:
+MIN_DB = -100
+
+LEVEL_NAMES = ['peak', 'rms', 'decay']
+
+
+class LevelMeters():
+    '''
+    Collects the latest levels of each block, and passes them to the listeners (i.e. the websocket handler)
+    at most level_meter_rate times a second.
+    '''
+
+    def __init__(self, session):
+        self.session = session
+        self.listeners = []
+        self._latest = {}
+
+    def on_level(self, block, structure):
+        '''
+        Called on the master thread with the 'level' message from a block's level meter.
+        '''
+        self._latest[block.uid] = {name: [round(max(MIN_DB, value), 1) for value in structure.get_value(name)]
+                                   for name in LEVEL_NAMES}
+
+    def send_levels(self):
+        '''
+        Called periodically (on the master thread) to pass on the levels that have been measured since last time.
+        '''
+        if self._latest:
+            levels, self._latest = self._latest, {}
+            for listener in self.listeners:
+                listener(levels)
+        return True
+
+
+def level_meter_string():
+    '''
+    The 'level' element, measuring at the configured rate, as a pipeline string.
+    '''
+    return 'level name=level_meter post-messages=true interval=%d' % int(Gst.SECOND / config.level_meter_rate())
+
+
+def add_level_meter_to_tee(tee):
+    '''
+    Measures the audio leaving the tee, on a branch of its own (so that it cannot hold up the tee's other branches).
+    '''
+    bin = Gst.parse_bin_from_description('queue leaky=downstream max-size-buffers=5 ! %s ! fakesink async=false '
+                                         'sync=false' % level_meter_string(), True)
+    tee.parent.add(bin)
+    tee.link(bin)
+    bin.sync_state_with_parent()
+
+
+def add_level_meter_after_pad(pad):
+    '''
+    Measures the audio leaving the (linked) pad, by putting a level meter between it and its peer.
+    '''
+    bin = Gst.parse_bin_from_description(level_meter_string(), True)
+    peer = pad.get_peer()
+    pad.unlink(peer)
+    pad.get_parent_element().get_parent().add(bin)
+    pad.link(bin.get_static_pad('sink'))
+    bin.get_static_pad('src').link(peer)
+    bin.sync_state_with_parent()
@@ -0,0 +1,206 @@
+'''
+Metrics about each block's pipeline, provided in the Prometheus text format at /metrics.
+'''
+import time
+import psutil
+from gi.repository import Gst, GLib
+
+# How often the CPU usage of each block is worked out:
+CPU_SAMPLE_PERIOD = 5
+
+
+class BlockMetrics():
+    '''
+    Counters and gauges about one block (input, output or mixer).
+    Updated on the master thread as messages arrive from the pipeline, and by pad probes.
+    '''
+
+    def __init__(self):
+        self.state_changes = 0
+        self.buffering_percent = None
+        # QoS messages report running totals, so the latest values from each element are kept:
+        self.qos = {}
+        self.encoded_bytes = {}
+        self.video_frames = None
+        # The IDs of the streaming threads that the pipeline has started, and the CPU usage of them:
+        self.thread_ids = set()
+        self.cpu_percent = None
+
+    def thread_started(self, thread_id):
+        if thread_id is not None:
+            self.thread_ids.add(thread_id)
+
+    def thread_stopped(self, thread_id):
+        self.thread_ids.discard(thread_id)
+
+    def on_qos(self, element_name, processed, dropped):
+        self.qos[element_name] = (processed, dropped)
+
+    def count_bytes_from_pad(self, pad, audio_or_video):
+        '''
+        Count the bytes of every buffer leaving the pad (e.g. an encoder's src pad).
+        '''
+        self.encoded_bytes[audio_or_video] = 0
+
+        def _on_buffer(pad, info):
+            if info.type & Gst.PadProbeType.BUFFER_LIST:
+                buffer_list = info.get_buffer_list()
+                size = sum(buffer_list.get(i).get_size() for i in range(buffer_list.length()))
+            else:
+                size = info.get_buffer().get_size()
+            self.encoded_bytes[audio_or_video] += size
+            return Gst.PadProbeReturn.OK
+
+        pad.add_probe(Gst.PadProbeType.BUFFER | Gst.PadProbeType.BUFFER_LIST, _on_buffer)
+
+    def count_frames_from_pad(self, pad):
+        '''
+        Count the video frames leaving the pad (e.g. a mixer's compositor).
+        '''
+        self.video_frames = 0
+
+        def _on_buffer(pad, info):
+            self.video_frames += 1
+            return Gst.PadProbeReturn.OK
+
+        pad.add_probe(Gst.PadProbeType.BUFFER, _on_buffer)
+
+
+class CpuSampler():
+    '''
+    Periodically works out the CPU usage of each block, from the CPU time (as reported by /proc)
+    of the streaming threads that its pipeline has started. Runs on the master thread.
+    '''
+
+    def __init__(self, session):
+        self.session = session
+        self._process = psutil.Process()
+        self._previous_cpu_times = {}
+        self._previous_time = time.monotonic()
+        GLib.timeout_add(CPU_SAMPLE_PERIOD * 1000, self.sample)
+
+    def sample(self):
+        now = time.monotonic()
+        cpu_times = {thread.id: thread.user_time + thread.system_time for thread in self._process.threads()}
+        elapsed = now - self._previous_time
+
+        for collection in [self.session.inputs, self.session.mixers, self.session.outputs]:
+            for block in list(collection.values()):
+                # The set is copied, as streaming threads can change it at any time:
+                thread_ids = [id for id in block.metrics.thread_ids.copy() if id in cpu_times]
+                used = sum(cpu_times[id] - self._previous_cpu_times.get(id, cpu_times[id]) for id in thread_ids)
+                block.metrics.cpu_percent = round(100 * used / elapsed, 1) if elapsed > 0 else None
+
+        self._previous_cpu_times = cpu_times
+        self._previous_time = now
+        return True
+
+
+class MetricsWriter():
+    '''
+    Builds the Prometheus text exposition format.
+    '''
+
+    def __init__(self):
+        self._metrics = {}
+
+    def add(self, name, metric_type, help, value, labels={}):
+        if value is None:
+            return
+        if name not in self._metrics:
+            self._metrics[name] = {'type': metric_type, 'help': help, 'samples': []}
+        self._metrics[name]['samples'].append((labels, value))
+
+    def to_text(self):
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append('# HELP %s %s' % (name, metric['help']))
+            lines.append('# TYPE %s %s' % (name, metric['type']))
+            for labels, value in metric['samples']:
+                label_string = ','.join('%s="%s"' % (k, _escape(v)) for k, v in labels.items())
+                lines.append('%s{%s} %s' % (name, label_string, value) if label_string else '%s %s' % (name, value))
+        return '\n'.join(lines) + '\n'
+
+
+def collect(session):
+    '''
+    Returns all metrics, as text in the Prometheus format. Should be called on the master thread.
+    '''
+    writer = MetricsWriter()
+    for collection in [session.inputs, session.mixers, session.outputs]:
+        for block in list(collection.values()):
+            _collect_for_block(writer, block)
+
+    if hasattr(session, 'rest_api'):
+        websockets = session.rest_api.webockets_handler.summarise()
+        writer.add('brave_websocket_clients', 'gauge', 'Number of connected websocket clients',
+                   len(websockets['clients']))
+        writer.add('brave_websocket_superseded_messages_dropped_total', 'counter',
+                   'Websocket updates not sent because a newer update for the same block replaced them',
+                   websockets['superseded_messages_dropped'])
+        writer.add('brave_websocket_queue_overflows_total', 'counter',
+                   'Times a websocket client fell so far behind that it was sent everything again',
+                   websockets['queue_overflows'])
+    return writer.to_text()
+
+
+def _collect_for_block(writer, block):
+    labels = {'block': block.uid, 'type': block.type}
+    writer.add('brave_block_playing', 'gauge', '1 if the block is in the PLAYING state, otherwise 0',
+               1 if block.state == Gst.State.PLAYING else 0, labels)
+    writer.add('brave_block_state_changes_total', 'counter', 'Number of state changes of the block\'s pipeline',
+               block.metrics.state_changes, labels)
+    writer.add('brave_block_buffering_percent', 'gauge', 'The most recently reported buffering level',
+               block.metrics.buffering_percent, labels)
+
+    writer.add('brave_block_cpu_percent', 'gauge', 'CPU usage of the block\'s streaming threads',
+               block.metrics.cpu_percent, labels)
+    writer.add('brave_block_threads', 'gauge', 'Number of streaming threads running for the block',
+               len(block.metrics.thread_ids), labels)
+
+    writer.add('brave_video_frames_total', 'counter', 'Video frames produced (by a mixer)',
+               block.metrics.video_frames, labels)
+
+    if hasattr(block, 'peers_joined'):
+        writer.add('brave_webrtc_peers', 'gauge', 'Number of peers connected to the WebRTC output',
+                   len(block.peers), labels)
+        writer.add('brave_webrtc_peers_joined_total', 'counter', 'Number of peers that have connected',
+                   block.peers_joined, labels)
+        writer.add('brave_webrtc_last_peer_join_seconds', 'gauge',
+                   'Time for the most recent peer to connect, from its request to the connection being made',
+                   block.last_peer_join_time, labels)
+
+    for element_name, (processed, dropped) in block.metrics.qos.items():
+        element_labels = {**labels, 'element': element_name}
+        writer.add('brave_qos_processed_total', 'counter', 'Buffers processed, as reported by QoS messages',
+                   processed, element_labels)
+        writer.add('brave_qos_dropped_total', 'counter', 'Buffers dropped, as reported by QoS messages',
+                   dropped, element_labels)
+
+    for audio_or_video, num_bytes in block.metrics.encoded_bytes.items():
+        writer.add('brave_encoded_bytes_total', 'counter', 'Bytes of encoded audio or video',
+                   num_bytes, {**labels, 'media': audio_or_video})
+
+    if hasattr(block, 'pipeline'):
+        for queue in _queues(block.pipeline):
+            queue_labels = {**labels, 'element': queue.get_name()}
+            writer.add('brave_queue_level_seconds', 'gauge', 'Amount of data in the queue, in seconds',
+                       queue.get_property('current-level-time') / Gst.SECOND, queue_labels)
+            writer.add('brave_queue_level_buffers', 'gauge', 'Number of buffers in the queue',
+                       queue.get_property('current-level-buffers'), queue_labels)
+
+
+def _queues(pipeline):
+    queues = []
+
+    def handle_element(element):
+        factory = element.get_factory()
+        if factory is not None and factory.get_name() == 'queue':
+            queues.append(element)
+
+    pipeline.iterate_recurse().foreach(handle_element)
+    return queues
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -18,6 +18,7 @@ class Mixer(InputOutputOverlay):
         self.mixer_element = {}
         self.request_pad_count = {'video': 0, 'audio': 0}
         self.create_elements()
+        self.add_level_meter()
 
         self.setup_complete = True
         self._consider_changing_state()
@@ -39,6 +40,11 @@ class Mixer(InputOutputOverlay):
             },
             'sources': {
             },
+            'level_meter': {
+                'type': 'bool',
+                'default': False,
+                'updatable': False
+            }
         }
 
     def input_output_overlay_or_mixer(self):
@@ -156,6 +162,7 @@ class Mixer(InputOutputOverlay):
             self.video_output_queue = self.pipeline.get_by_name('video_output_queue')
             self.final_video_tee = self.pipeline.get_by_name('final_video_tee')
             self.capsfilter = self.pipeline.get_by_name('capsfilter')
+            self.metrics.count_frames_from_pad(self.video_output_queue.get_static_pad('sink'))
             self._set_dimensions()
             self.handle_updated_props()
             self.session().overlays.ensure_overlays_are_correctly_connected(self)
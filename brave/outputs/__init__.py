@@ -5,9 +5,20 @@ from brave.outputs.image import ImageOutput
 from brave.outputs.file import FileOutput
 from brave.outputs.webrtc import WebRTCOutput
 from brave.outputs.kvs import KvsOutput
+from brave.outputs.remote import RemoteOutput
 from brave.abstract_collection import AbstractCollection
 import brave.exceptions
 
+OUTPUT_TYPES = {
+    'local': LocalOutput,
+    'rtmp': RTMPOutput,
+    'tcp': TCPOutput,
+    'image': ImageOutput,
+    'file': FileOutput,
+    'webrtc': WebRTCOutput,
+    'kvs': KvsOutput
+}
+
 
 class OutputCollection(AbstractCollection):
     def add(self, **args):
@@ -16,22 +27,14 @@ class OutputCollection(AbstractCollection):
 
         if 'type' not in args:
             raise brave.exceptions.InvalidConfiguration("Invalid output, no 'type'")
-        elif args['type'] == 'local':
-            output = LocalOutput(**args, collection=self)
-        elif args['type'] == 'rtmp':
-            output = RTMPOutput(**args, collection=self)
-        elif args['type'] == 'tcp':
-            output = TCPOutput(**args, collection=self)
-        elif args['type'] == 'image':
-            output = ImageOutput(**args, collection=self)
-        elif args['type'] == 'file':
-            output = FileOutput(**args, collection=self)
-        elif args['type'] == 'webrtc':
-            output = WebRTCOutput(**args, collection=self)
-        elif args['type'] == 'kvs':
-            output = KvsOutput(**args, collection=self)
-        else:
+        elif args['type'] not in OUTPUT_TYPES:
             raise brave.exceptions.InvalidConfiguration("Invalid output type '%s'" % args['type'])
 
+        output_class = OUTPUT_TYPES[args['type']]
+        if args.get('node'):
+            output = RemoteOutput(output_class, **args, collection=self)
+        else:
+            output = output_class(**args, collection=self)
+
         self._items[args['id']] = output
         return output
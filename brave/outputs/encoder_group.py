@@ -0,0 +1,201 @@
+from gi.repository import Gst
+from brave.abstract_collection import AbstractCollection
+import gi
+gi.require_version('GstVideo', '1.0')
+from gi.repository import GstVideo
+
+# A member that has this much encoded content waiting (in seconds) is falling behind, so drops content
+# rather than holding up the encoder for the other members. Its queue can hold twice this, so never blocks.
+DROP_WHEN_QUEUED = 1
+
+
+class EncoderGroupCollection(AbstractCollection):
+    '''
+    A collection of all encoder groups.
+    Outputs that want identically-encoded content from the same source share one group.
+    '''
+
+    def get_or_add_for_output(self, output):
+        '''
+        Returns the encoder group that the provided output should be a member of, creating it if needed.
+        '''
+        key = output.encoder_group_key()
+        group = next((g for g in self._items.values() if g.key == key), None)
+        if group is None:
+            id = self.get_new_id()
+            group = EncoderGroup(id=id, key=key, source=output.source(), collection=self,
+                                 caps_string=output.create_caps_string(),
+                                 video_encoder_string=output.video_encoder_string(),
+                                 audio_encoder_string=output.audio_encoder_string())
+            self._items[id] = group
+        return group
+
+
+class EncoderGroup():
+    '''
+    An encoder group allows multiple outputs to share one encoder (e.g. x264enc).
+    The encoders live on the source's pipeline, branching off its final tee.
+    Each member output then receives the encoded content via a proxysink/proxysrc pair,
+    meaning only the muxer and sink are per-output.
+    '''
+
+    def __init__(self, **args):
+        for a in args:
+            setattr(self, a, args[a])
+        self.logger = self.source.logger
+        self.members = {}
+        self._bin = {}
+        self._source_tee_pad = {}
+
+        if self.video_encoder_string and self.source.has_video():
+            self._create_encoder_bin('video', 'queue ! videoconvert ! videoscale ! videorate ! '
+                                     'capsfilter name=capsfilter ! %s ! '
+                                     'tee name=encoded_tee allow-not-linked=true' % self.video_encoder_string,
+                                     caps_string=self.caps_string)
+
+        if self.audio_encoder_string and self.source.has_audio():
+            self._create_encoder_bin('audio', 'queue ! audioconvert ! audioresample ! %s ! '
+                                     'tee name=encoded_tee allow-not-linked=true' % self.audio_encoder_string)
+
+        self.logger.info('Created encoder group %d (%s)' %
+                         (self.id, ', '.join(filter(None, [self.video_encoder_string, self.audio_encoder_string]))))
+
+    def has_video(self):
+        return 'video' in self._bin
+
+    def has_audio(self):
+        return 'audio' in self._bin
+
+    def add_member(self, output):
+        '''
+        Connect an output to this group, so that it receives the encoded audio and/or video.
+        '''
+        if output in self.members:
+            return
+        self.members[output] = {}
+
+        for audio_or_video, bin in self._bin.items():
+            proxysrc = output.pipeline.get_by_name(audio_or_video + '_proxysrc')
+            if not proxysrc:
+                self.logger.error('Output %s has no %s proxysrc to connect to' % (output.uid, audio_or_video))
+                continue
+
+            queue = Gst.ElementFactory.make('queue')
+            queue.set_property('max-size-buffers', 0)
+            queue.set_property('max-size-bytes', 0)
+            queue.set_property('max-size-time', 2 * DROP_WHEN_QUEUED * Gst.SECOND)
+            proxysink = Gst.ElementFactory.make('proxysink')
+            bin.add(queue)
+            bin.add(proxysink)
+            if not queue.link(proxysink):
+                self.logger.error('Cannot link queue to proxysink')
+            proxysrc.set_property('proxysink', proxysink)
+            queue.sync_state_with_parent()
+            proxysink.sync_state_with_parent()
+
+            tee = bin.get_by_name('encoded_tee')
+            tee_pad = tee.request_pad(tee.get_pad_template('src_%u'), None, None)
+            if tee_pad.link(queue.get_static_pad('sink')) != Gst.PadLinkReturn.OK:
+                self.logger.error('Cannot link encoded %s to output %s' % (audio_or_video, output.uid))
+
+            # The member starts at a keyframe, which is asked for now, so that it does not wait for the next one:
+            member = {'queue': queue, 'proxysink': proxysink, 'tee_pad': tee_pad, 'dropping': True}
+            queue.get_static_pad('sink').add_probe(Gst.PadProbeType.BUFFER, self._drop_if_behind, member)
+            self.members[output][audio_or_video] = member
+            if audio_or_video == 'video':
+                self._request_key_frame(queue)
+
+        self.logger.debug('%s has joined encoder group %d, which now has %d member(s)' %
+                          (output.uid, self.id, len(self.members)))
+
+    def remove_member(self, output):
+        '''
+        Disconnect an output from this group. If it was the last member, the group is deleted.
+        '''
+        if output not in self.members:
+            return
+
+        for audio_or_video, elements in self.members[output].items():
+            bin = self._bin[audio_or_video]
+            tee_pad = elements['tee_pad']
+            tee_pad.unlink(elements['queue'].get_static_pad('sink'))
+            tee_pad.get_parent().release_request_pad(tee_pad)
+            for element in [elements['queue'], elements['proxysink']]:
+                element.set_state(Gst.State.NULL)
+                if not bin.remove(element):
+                    self.logger.warning('Unable to remove %s from encoder group' % element.name)
+
+            proxysrc = output.pipeline.get_by_name(audio_or_video + '_proxysrc') if hasattr(output, 'pipeline') \
+                else None
+            if proxysrc:
+                proxysrc.set_property('proxysink', None)
+
+        del self.members[output]
+        self.logger.debug('%s has left encoder group %d' % (output.uid, self.id))
+
+        if len(self.members) == 0:
+            self.delete()
+
+    def delete(self):
+        '''
+        Remove the encoders from the source's pipeline.
+        '''
+        for audio_or_video, bin in self._bin.items():
+            tee_pad = self._source_tee_pad[audio_or_video]
+            tee_pad.unlink(bin.get_static_pad('sink'))
+            tee_pad.get_parent().release_request_pad(tee_pad)
+            bin.set_state(Gst.State.NULL)
+            if not bin.get_parent().remove(bin):
+                self.logger.warning('Unable to remove %s encoder group bin' % audio_or_video)
+        self._bin = {}
+        self.collection.pop(self.id)
+        self.logger.info('Deleted encoder group %d' % self.id)
+
+    def _drop_if_behind(self, pad, info, member):
+        '''
+        Called (on the streaming thread) with each encoded buffer for a member. If the member has fallen behind,
+        buffers are dropped, so that one slow output cannot hold up the encoder for the others. Dropping part of
+        an encoded stream would corrupt it until the next keyframe, so once dropping starts it continues until
+        then (and a keyframe is asked for).
+        '''
+        queue = member['queue']
+        if queue.get_property('current-level-time') >= DROP_WHEN_QUEUED * Gst.SECOND:
+            if not member['dropping']:
+                self.logger.warning('Output is falling behind encoder group %d, so dropping until the next keyframe'
+                                    % self.id)
+                member['dropping'] = True
+                self._request_key_frame(queue)
+            return Gst.PadProbeReturn.DROP
+
+        if member['dropping']:
+            if info.get_buffer().has_flags(Gst.BufferFlags.DELTA_UNIT):
+                return Gst.PadProbeReturn.DROP
+            member['dropping'] = False
+        return Gst.PadProbeReturn.OK
+
+    def _request_key_frame(self, queue):
+        '''
+        Asks the encoder (upstream of the member's queue) for a keyframe now.
+        '''
+        event = GstVideo.video_event_new_upstream_force_key_unit(Gst.CLOCK_TIME_NONE, True, 0)
+        queue.get_static_pad('sink').push_event(event)
+
+    def _create_encoder_bin(self, audio_or_video, bin_as_string, caps_string=None):
+        '''
+        Create a bin (containing the encoder) on the source pipeline, and connect it to the source's tee.
+        '''
+        source_tee = getattr(self.source, 'final_%s_tee' % audio_or_video)
+        bin = Gst.parse_bin_from_description(bin_as_string, True)
+        if caps_string:
+            bin.get_by_name('capsfilter').set_property('caps', Gst.Caps.from_string(caps_string))
+        if not source_tee.parent.add(bin):
+            self.logger.error('Unable to add %s encoder group to pipeline' % audio_or_video)
+            return
+        self._bin[audio_or_video] = bin
+
+        # As with connections, the state is synced before linking, so that the existing pipeline is not disrupted.
+        bin.sync_state_with_parent()
+        self._source_tee_pad[audio_or_video] = source_tee.request_pad(source_tee.get_pad_template('src_%u'),
+                                                                      None, None)
+        if self._source_tee_pad[audio_or_video].link(bin.get_static_pad('sink')) != Gst.PadLinkReturn.OK:
+            self.logger.error('Cannot link %s tee to encoder group' % audio_or_video)
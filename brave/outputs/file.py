@@ -28,14 +28,11 @@ class FileOutput(Output):
         pipeline_string = 'mp4mux name=mux ! filesink name=sink'
 
         if config.enable_video():
-            pipeline_string += ' ' + self._video_pipeline_start() + 'x264enc name=video_encoder ! queue ! mux.'
+            pipeline_string += ' ' + self._video_encoded_pipeline_start() + 'h264parse ! queue ! mux.'
 
         if config.enable_audio():
-            audio_pipeline_string = ('interaudiosrc name=interaudiosrc ! '
-                                     'audioconvert ! audioresample ! avenc_aac name=audio_encoder')
-
             # A larger queue size enables the video encoder to take longer
-            audio_pipeline_string += f' ! queue max-size-bytes={10*(3 ** 20)} ! mux.'
+            audio_pipeline_string = self._audio_encoded_pipeline_start() + f'queue max-size-bytes={10*(3 ** 20)} ! mux.'
 
             pipeline_string = pipeline_string + ' ' + audio_pipeline_string
 
@@ -44,11 +41,15 @@ class FileOutput(Output):
         sink = self.pipeline.get_by_name('sink')
         sink.set_property('location', self.location)
 
+        # The EOS (end of stream) is sent into the encoder, or, if the encoder is shared with
+        # other outputs, the first element after it, so that other outputs are not ended too.
         if config.enable_video():
-            self.video_encoder = self.pipeline.get_by_name('video_encoder')
+            self.video_encoder = self.pipeline.get_by_name(
+                'video_encoded_queue' if self.uses_shared_encoder() else 'video_encoder')
 
         if config.enable_audio():
-            self.audio_encoder = self.pipeline.get_by_name('audio_encoder')
+            self.audio_encoder = self.pipeline.get_by_name(
+                'audio_encoded_queue' if self.uses_shared_encoder() else 'audio_encoder')
 
     def set_pipeline_state(self, new_state):
         sent_eos = False
@@ -75,6 +76,12 @@ class FileOutput(Output):
 
         return super().set_pipeline_state(new_state)
 
+    def video_encoder_string(self):
+        return 'x264enc'
+
+    def audio_encoder_string(self):
+        return 'avenc_aac'
+
     def create_caps_string(self):
         # format=I420 ensures the mp4 is playable with QuickTime.
         return super().create_caps_string(format='I420')
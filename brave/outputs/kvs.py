@@ -36,8 +36,8 @@ class KvsOutput(Output):
         if not secret_key:
             raise brave.exceptions.InvalidConfiguration('Missing AWS_SECRET_ACCESS_KEY environment variable')
 
-        pipeline_string = (self._video_pipeline_start() + 'x264enc bframes=0 key-int-max=45 bitrate=500 ! '
-                           'video/x-h264,stream-format=avc,alignment=au ! kvssink name=kvssink')
+        pipeline_string = (self._video_encoded_pipeline_start() +
+                           'h264parse ! video/x-h264,stream-format=avc,alignment=au ! kvssink name=kvssink')
 
         self.create_pipeline_from_string(pipeline_string)
 
@@ -46,5 +46,8 @@ class KvsOutput(Output):
         kvssink.set_property('secret-key', secret_key)
         kvssink.set_property('stream-name', self.stream_name)
 
+    def video_encoder_string(self):
+        return 'x264enc bframes=0 key-int-max=45 bitrate=500'
+
     def create_caps_string(self):
         return super().create_caps_string(format='I420') + ',framerate=30/1'
@@ -1,7 +1,10 @@
 from gi.repository import Gst
 from brave.helpers import round_down
+import brave.config as config
 import brave.exceptions
 from brave.inputoutputoverlay import InputOutputOverlay
+from brave.level_meters import add_level_meter_after_pad
+from brave.transports import TRANSPORTS, get_transport_class
 
 
 class Output(InputOutputOverlay):
@@ -19,16 +22,19 @@ class Output(InputOutputOverlay):
         super().__init__(**args)
         self.create_elements()
 
-        if self.has_video():
+        # Outputs using a shared encoder receive encoded content, so have no intervideosrc or interaudiosrc:
+        if self.has_video() and not self.uses_shared_encoder():
             self.pipeline.get_by_name('capsfilter')\
                 .set_property('caps', Gst.Caps.from_string(self.create_caps_string()))
             self.intervideosrc = self.pipeline.get_by_name('intervideosrc')
             self.intervideosrc_src_pad = self.intervideosrc.get_static_pad('src')
 
-        if self.has_audio():
+        if self.has_audio() and not self.uses_shared_encoder():
             self.interaudiosrc = self.pipeline.get_by_name('interaudiosrc')
             self.interaudiosrc_src_pad = self.interaudiosrc.get_static_pad('src')
 
+        self.add_level_meter()
+        self._count_encoded_bytes()
         self._set_source(source_uid)
         self.setup_complete = True
         self._consider_changing_state()
@@ -36,9 +42,40 @@ class Output(InputOutputOverlay):
     def input_output_overlay_or_mixer(self):
         return 'output'
 
+    def add_level_meter(self):
+        '''
+        Outputs measure the audio that they receive from their source.
+        (Outputs using a shared encoder receive it already encoded, so cannot.)
+        '''
+        if getattr(self, 'level_meter', False) and hasattr(self, 'interaudiosrc_src_pad') and \
+                self.interaudiosrc_src_pad.is_linked():
+            add_level_meter_after_pad(self.interaudiosrc_src_pad)
+
+    def permitted_props(self):
+        return {
+            **super().permitted_props(),
+            'transport': {
+                'type': 'str',
+                'default': config.default_transport(),
+                'updatable': False,
+                'permitted_values': {name: name for name in TRANSPORTS}
+            },
+            'node': {
+                'type': 'str',
+                'updatable': False
+            },
+            'level_meter': {
+                'type': 'bool',
+                'default': False,
+                'updatable': False
+            }
+        }
+
     def summarise(self, for_config_file=False):
         s = super().summarise(for_config_file)
         s['source'] = self.source().uid if self.source() else None
+        if not for_config_file and self.encoder_group():
+            s['encoder_group'] = self.encoder_group().id
         return s
 
     def source(self):
@@ -62,7 +99,7 @@ class Output(InputOutputOverlay):
         '''
         As source_connection() but returns an array of the 1 connected source, or an empty array if no attached source.
         '''
-        return self.session().connections.get_all_for_source(self)
+        return self.session().connections.get_all_for_dest(self)
 
     def connection_for_source(self, input_or_mixer, create_if_not_made=False):
         '''
@@ -74,6 +111,41 @@ class Output(InputOutputOverlay):
         else:
             return self.session().connections.get_connection_between_source_and_dest(input_or_mixer, self)
 
+    def video_encoder_string(self):
+        '''
+        The video encoder (as a pipeline string) that this output uses, or None if it does not encode video.
+        Overridden by outputs that encode.
+        '''
+        return None
+
+    def audio_encoder_string(self):
+        '''
+        The audio encoder (as a pipeline string) that this output uses, or None if it does not encode audio.
+        Overridden by outputs that encode.
+        '''
+        return None
+
+    def uses_shared_encoder(self):
+        '''
+        True iff this output receives content from an encoder shared with other outputs (an encoder group)
+        rather than encoding for itself.
+        '''
+        return config.share_encoders() and \
+            (self.video_encoder_string() is not None or self.audio_encoder_string() is not None)
+
+    def encoder_group_key(self):
+        '''
+        Outputs with the same key can share the same encoders.
+        '''
+        return (self.source().uid, self.create_caps_string(), self.video_encoder_string(), self.audio_encoder_string())
+
+    def encoder_group(self):
+        '''
+        Returns the EncoderGroup this output is a member of, or None.
+        '''
+        connection = self.source_connection()
+        return connection.encoder_group if connection else None
+
     def update(self, updates):
         '''
         Overridden update() method to handle an update the source of this output.
@@ -130,6 +202,29 @@ class Output(InputOutputOverlay):
         if self.source_connection():
             self.source_connection().unblock_intersrc_if_ready()
 
+    def sync_clock_with_source(self):
+        '''
+        Content from a shared encoder is timestamped by the source's pipeline.
+        So, to play it at the right time, this pipeline must have the same clock and base time.
+        '''
+        source_pipeline = self.encoder_group().source.pipeline
+        self.pipeline.use_clock(source_pipeline.get_clock())
+        self.pipeline.set_start_time(Gst.CLOCK_TIME_NONE)
+        self.pipeline.set_base_time(source_pipeline.get_base_time())
+
+    def _can_move_to_playing_state(self):
+        '''
+        An output using a shared encoder must wait for its source to be PLAYING,
+        so that the source's clock and base time can be adopted.
+        '''
+        if not self.encoder_group():
+            return True
+        if self.encoder_group().source.state != Gst.State.PLAYING:
+            self.logger.debug('Waiting for source to be PLAYING before moving to PLAYING')
+            return False
+        self.sync_clock_with_source()
+        return True
+
     def _set_source(self, new_src_uid):
         '''
         Ensure the source of this output (either an input or mixer) is correctly set up.
@@ -155,20 +250,51 @@ class Output(InputOutputOverlay):
         self.session().connections.get_or_add_connection_between_source_and_dest(new_src, self)
         self.source_connection().setup()
 
+    def _count_encoded_bytes(self):
+        '''
+        For outputs that encode, count the bytes of encoded audio and video, for the metrics.
+        '''
+        for audio_or_video in ['video', 'audio']:
+            name = '%s_encoded_queue' % audio_or_video if self.uses_shared_encoder() else '%s_encoder' % audio_or_video
+            element = self.pipeline.get_by_name(name)
+            if element:
+                self.metrics.count_bytes_from_pad(element.get_static_pad('src'), audio_or_video)
+
+    def _intersrc_string(self, audio_or_video):
+        '''
+        The pipeline string of the element(s) that accept content from the source.
+        This depends on the transport, e.g. 'intervideosrc name=intervideosrc'.
+        '''
+        return get_transport_class(self.transport).intersrc_string(audio_or_video)
+
     def _video_pipeline_start(self):
         '''
         The standard start to the pipeline string for video.
-        It starts with intervideosrc, which accepts video from the source.
+        It starts with intervideosrc (or equivalent), which accepts video from the source.
         '''
-        # The large timeout holds any stuck frame for 24 hours (basically, a very long time)
-        # This is optional, but prevents it from going black when it's better to show the last frame.
-        timeout = Gst.SECOND * 60 * 60 * 24
-        return ('intervideosrc name=intervideosrc timeout=%d ! videoconvert ! videoscale ! '
-                'videorate ! capsfilter name=capsfilter ! ' % timeout)
+        return self._intersrc_string('video') + \
+            ' ! videoconvert ! videoscale ! videorate ! capsfilter name=capsfilter ! '
 
     def _audio_pipeline_start(self):
         '''
         The standard start to the pipeline string for audio.
-        It starts with interaudiosrc, which accepts audio from the source.
+        It starts with interaudiosrc (or equivalent), which accepts audio from the source.
+        '''
+        return self._intersrc_string('audio') + ' ! audioconvert ! audioresample ! '
+
+    def _video_encoded_pipeline_start(self):
+        '''
+        The start of the pipeline string for outputs that want encoded video.
+        The video is either encoded here, or received already encoded from a shared encoder group.
+        '''
+        if self.uses_shared_encoder():
+            return 'proxysrc name=video_proxysrc ! queue name=video_encoded_queue ! '
+        return self._video_pipeline_start() + self.video_encoder_string() + ' name=video_encoder ! '
+
+    def _audio_encoded_pipeline_start(self):
+        '''
+        The audio equivalent of _video_encoded_pipeline_start()
         '''
-        return 'interaudiosrc name=interaudiosrc ! audioconvert ! audioresample ! '
+        if self.uses_shared_encoder():
+            return 'proxysrc name=audio_proxysrc ! queue name=audio_encoded_queue ! '
+        return self._audio_pipeline_start() + self.audio_encoder_string() + ' name=audio_encoder ! '
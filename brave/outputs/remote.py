@@ -0,0 +1,150 @@
+from gi.repository import Gst
+from brave.inputoutputoverlay import InputOutputOverlay
+from brave.helpers import state_string_to_constant
+import brave.exceptions
+
+
+class RemoteOutput(InputOutputOverlay):
+    '''
+    An output that runs on another Brave instance (a 'peer', named by the 'node' property).
+
+    Its source's content is sent to the peer by a cluster Link, and the output is created on the peer by
+    the Cluster (see brave/cluster.py), which also keeps this object's state up to date.
+    This object therefore has no pipeline of its own; it represents the output on the peer.
+    '''
+
+    def __init__(self, output_class, **args):
+        # An uninitialised instance of the output's own class, to provide its properties and whether it has
+        # audio and video. (Those do not depend on the instance's state.)
+        self.prototype = output_class.__new__(output_class)
+        source_uid = args.pop('source', 'default')
+        self.remote_id = None
+        self.remote_summary = {}
+        self.link = None
+        self.deleted = False
+
+        super().__init__(**args)
+
+        # The state requested by the user, which the output is created with on the peer:
+        self._requested_state = self.desired_state if self.desired_state is not None else Gst.State.PLAYING
+
+        cluster = self.session().cluster
+        if cluster is None:
+            raise brave.exceptions.InvalidConfiguration(
+                'Cannot create an output on node "%s", as no peers are configured' % self.node)
+        self.peer = cluster.get_peer(self.node)
+        self._set_source(source_uid)
+        cluster.submit(cluster.place, remote_output=self)
+
+    def input_output_overlay_or_mixer(self):
+        return 'output'
+
+    def permitted_props(self):
+        return self.prototype.permitted_props()
+
+    def has_audio(self):
+        return self.prototype.has_audio()
+
+    def has_video(self):
+        return self.prototype.has_video()
+
+    def source(self):
+        return self.link.source if self.link else None
+
+    def remote_props(self):
+        '''
+        The properties to create the output on the peer with - its current ones, so that any updates are kept
+        if it has to be created again.
+        '''
+        props = {key: getattr(self, key) for key in self.permitted_props()
+                 if key not in ['id', 'node', 'state'] and hasattr(self, key)}
+        return {**props, 'type': self.type, 'state': self._requested_state.value_nick.upper()}
+
+    def summarise(self, for_config_file=False):
+        s = super().summarise(for_config_file)
+        s['source'] = self.source().uid if self.source() else None
+        if not for_config_file:
+            s['state'] = self.state.value_nick.upper()
+            s['remote'] = {
+                'node': self.node,
+                'id': self.remote_id,
+                'uid': 'output%d' % self.remote_id if self.remote_id is not None else None
+            }
+        return s
+
+    def update(self, updates):
+        if 'source' in updates:
+            if not self.source() or updates['source'] != self.source().uid:
+                raise brave.exceptions.InvalidConfiguration(
+                    'Cannot change the source of an output on another node; delete and create it instead')
+            updates = {key: value for key, value in updates.items() if key != 'source'}
+        self._set_props(updates, updating=True)
+        if 'state' in updates and self.desired_state is not None:
+            self._requested_state = self.desired_state
+        cluster = self.session().cluster
+        cluster.submit(cluster.update_on_peer, remote_output=self, updates=updates)
+
+    def set_pipeline_state(self, state):
+        cluster = self.session().cluster
+        cluster.submit(cluster.update_on_peer, remote_output=self, updates={'state': state.value_nick.upper()})
+        return True
+
+    def delete(self):
+        self.logger.info('Being deleted')
+        self.deleted = True
+        cluster = self.session().cluster
+        cluster.submit(cluster.delete_from_peer, remote_output=self)
+        cluster.release_link(self.link, self)
+        self.collection.pop(self.id)
+        self.session().report_deleted_item(self)
+
+    def on_remote_summary(self, summary):
+        '''
+        Called (on the master thread) with the summary of the output on the peer.
+        '''
+        previous_summary, self.remote_summary = self.remote_summary, summary
+        if self.desired_state == self.state:
+            self.desired_state = None
+
+        if 'error_message' in summary:
+            self.error_message = summary['error_message']
+        elif hasattr(self, 'error_message'):
+            delattr(self, 'error_message')
+
+        if summary != previous_summary:
+            self.report_update_to_user()
+
+    def on_remote_error(self, message):
+        '''
+        Called (on the master thread) when the output cannot be created on, or updated on, the peer.
+        '''
+        self.remote_summary = {}
+        if getattr(self, 'error_message', None) != message:
+            self.error_message = message
+            self.report_update_to_user()
+
+    def _set_source(self, source_uid):
+        if source_uid == 'default':
+            source = self.session().mixers.get_entry_with_lowest_id()
+        else:
+            source = self.session().uid_to_block(source_uid, error_if_not_exists=True)
+        if source is None:
+            raise brave.exceptions.InvalidConfiguration('An output on another node must have a source')
+        self.link = self.session().cluster.get_link(source, self.peer)
+        self.link.users.add(self)
+
+    @property
+    def state(self):
+        if 'state' not in self.remote_summary:
+            return Gst.State.NULL
+        return state_string_to_constant(self.remote_summary['state']) or Gst.State.NULL
+
+    @state.setter
+    def state(self, new_state):
+        # As setup is never 'complete' (there is no pipeline here), this only records the desired state.
+        # It is sent to the peer by update().
+        InputOutputOverlay.state.fset(self, new_state)
+
+    @state.deleter
+    def state(self):
+        pass
@@ -30,19 +30,24 @@ class RTMPOutput(Output):
         pipeline_string = 'flvmux name=mux streamable=true ! rtmpsink name=sink'
 
         if config.enable_video():
-            # key-int-max=60 puts a keyframe every 2 seconds (60 as 2*framerate)
-            pipeline_string += ' ' + self._video_pipeline_start() + \
-                'x264enc name=video_encoder key-int-max=60 ! h264parse ! queue ! mux.'
+            pipeline_string += ' ' + self._video_encoded_pipeline_start() + 'h264parse ! queue ! mux.'
 
         if config.enable_audio():
-            pipeline_string += ' ' + self._audio_pipeline_start() + \
-                'avenc_aac name=audio_encoder ! aacparse ! audio/mpeg, mpegversion=4 ! queue ! mux.'
+            pipeline_string += ' ' + self._audio_encoded_pipeline_start() + \
+                'aacparse ! audio/mpeg, mpegversion=4 ! queue ! mux.'
 
         self.create_pipeline_from_string(pipeline_string)
         self.pipeline.get_by_name('sink').set_property('location', self.uri + ' live=1')
 
         self.logger.info('RTMP output now configured to send to ' + self.uri)
 
+    def video_encoder_string(self):
+        # key-int-max=60 puts a keyframe every 2 seconds (60 as 2*framerate)
+        return 'x264enc key-int-max=60'
+
+    def audio_encoder_string(self):
+        return 'avenc_aac'
+
     def create_caps_string(self):
         # framerate=30/1 because Facebook Live and YouTube live want this framerate.
         # profile=baseline may be superflous but some have recommended it for Facebook
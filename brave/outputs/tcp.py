@@ -36,6 +36,11 @@ class TCPOutput(Output):
                     'mpeg': 'MPEG',
                     'ogg': 'OGG'
                 }
+            },
+            'low_latency': {
+                'type': 'bool',
+                'default': False,
+                'updatable': False
             }
         }
 
@@ -44,9 +49,6 @@ class TCPOutput(Output):
         Create the elements needed whether this is audio, video, or both
         '''
         mux_type = 'oggmux' if self.container == 'ogg' else 'mpegtsmux'
-        video_encoder_type = 'theoraenc' if self.container == 'ogg' else 'x264enc'
-        audio_encoder_type = 'vorbisenc' if self.container == 'ogg' else 'avenc_ac3'
-
         pipeline_string = 'queue name=queue ! tcpserversink name=sink'
 
         # We only want a mux if there's video:
@@ -55,33 +57,19 @@ class TCPOutput(Output):
             pipeline_string = f'{mux_type} name=mux ! {pipeline_string}'
 
         if config.enable_video():
-            pipeline_string += ' ' + self._video_pipeline_start() + video_encoder_type + ' name=encoder ! queue ! mux.'
+            pipeline_string += ' ' + self._video_encoded_pipeline_start() + 'queue ! mux.'
 
         if config.enable_audio():
-            audio_bitrate = self.audio_bitrate
-
-            # Having default_audio_caps() in the pipeline stops them from changing and interrupting the encoder.
-            audio_pipeline_string = ('interaudiosrc name=interaudiosrc ! ' + config.default_audio_caps() +
-                                     ' ! audioconvert ! audioresample ! %s name=audio_encoder bitrate=%d') % \
-                (audio_encoder_type, audio_bitrate)
+            audio_pipeline_string = self._audio_encoded_pipeline_start()
             if has_mux:
-                audio_pipeline_string += f' ! queue ! mux.'
+                audio_pipeline_string += f'queue ! mux.'
             else:
-                audio_pipeline_string += ' ! queue.'
+                audio_pipeline_string += 'queue.'
 
             pipeline_string = pipeline_string + ' ' + audio_pipeline_string
 
         self.create_pipeline_from_string(pipeline_string)
 
-        if config.enable_video():
-            # pass
-            if self.container == 'mpeg':
-                # Testing has shown 60 (i.e. once every 2s at 30 fps) works best
-                self.pipeline.get_by_name('encoder').set_property('key-int-max', 60)
-
-            # tune=zerolatency reduces the delay of TCP output
-            # self.pipeline.get_by_name('encoder').set_property('tune', 'zerolatency')
-
         if not hasattr(self, 'host'):
             self.host = socket.gethostbyname(socket.gethostname())
         if not hasattr(self, 'port'):
@@ -95,6 +83,25 @@ class TCPOutput(Output):
 
         self.logger.info('TCP output created at tcp://%s:%s' % (self.host, self.port))
 
+    def video_encoder_string(self):
+        if self.container == 'ogg':
+            return 'theoraenc'
+
+        # Testing has shown key-int-max=60 (i.e. once every 2s at 30 fps) works best
+        if self.low_latency:
+            # Reduces the delay, at the expense of quality per bit:
+            return 'x264enc key-int-max=60 tune=zerolatency speed-preset=ultrafast'
+        return 'x264enc key-int-max=60'
+
+    def audio_encoder_string(self):
+        audio_encoder_type = 'vorbisenc' if self.container == 'ogg' else 'avenc_ac3'
+        return '%s bitrate=%d' % (audio_encoder_type, self.audio_bitrate)
+
+    def _audio_pipeline_start(self):
+        # Having default_audio_caps() in the pipeline stops them from changing and interrupting the encoder.
+        return self._intersrc_string('audio') + ' ! ' + config.default_audio_caps() + \
+            ' ! audioconvert ! audioresample ! '
+
     def _get_next_available_port(self):
         ports_in_use = self.get_ports_in_use()
         PORT_RANGE_START = 7000
@@ -107,7 +114,7 @@ class TCPOutput(Output):
     def get_ports_in_use(self):
         ports_in_use = []
         for name, output in self.session().outputs.items():
-            if hasattr(self, 'port'):
+            if hasattr(output, 'port'):
                 ports_in_use.append(int(output.port))
         return ports_in_use
 
@@ -1,25 +1,52 @@
 from brave.outputs.output import Output
 from gi.repository import Gst
+from brave.helpers import run_on_master_thread_and_wait, run_on_master_thread_when_idle
+from brave.outputs.webrtc_sessions import PeerSessions
+from brave.outputs.webrtc_worker import EgressWorker
+from brave.workers import add_shmsink
+from brave.level_meters import level_meter_string
 import brave.config as config
+import brave.exceptions
 import json
 import asyncio
+import os
+import tempfile
+import time
 import gi
 import websockets
-gi.require_version('GstWebRTC', '1.0')
-from gi.repository import GstWebRTC
-gi.require_version('GstSdp', '1.0')
-from gi.repository import GstSdp
+gi.require_version('GstVideo', '1.0')
+from gi.repository import GstVideo
+
+# The bitrate of the VP8 encoding of each layer is in proportion to its number of pixels, this being
+# the rate for the default size (480x270):
+VIDEO_BITRATE_PER_PIXEL = 256000 / (480 * 270)
+MAX_EGRESS_WORKERS = 16
 
 
 class WebRTCOutput(Output):
     '''
     For sending to a client (peer) audio/video as WebRTC.
+
+    The video can be encoded as several 'layers', each half the width and height of the one before.
+    Each peer is sent one layer, which is chosen (and changed) according to how well the peer is receiving
+    it, as reported by RTCP. So however many peers there are, each layer is only encoded once.
+
+    The session with each peer (its webrtcbin) is run by PeerSessions; either in this process, or in
+    an egress worker process (see brave/outputs/webrtc_worker.py).
     '''
 
     def __init__(self, **args):
+        self.workers = []
+        self.workers_started = False
         super().__init__(**args)
         self.overall_peer_count = 0
+        # The peers, by websocket. Each peer also has a numeric ID, used by PeerSessions and egress workers:
         self.peers = {}
+        self.peer_websockets = {}
+        # The API's event loop, through which all messages to peers are sent:
+        self.event_loop = None
+        self.peers_joined = 0
+        self.last_peer_join_time = None
 
     def permitted_props(self):
         return {
@@ -31,52 +58,171 @@ class WebRTCOutput(Output):
             'height': {
                 'type': 'int',
                 'default': 270
+            },
+            'layers': {
+                'type': 'int',
+                'default': 1,
+                'updatable': False,
+                'permitted_values': {
+                    1: 'One layer, at the width and height',
+                    2: 'Two layers: the width and height, and half that',
+                    3: 'Three layers: the width and height, half that, and a quarter'
+                }
+            },
+            'egress_workers': {
+                'type': 'int',
+                'default': 0,
+                'updatable': False
+            },
+            # On by default, as the level of a webrtc output is shown alongside its preview:
+            'level_meter': {
+                'type': 'bool',
+                'default': True,
+                'updatable': False
             }
         }
 
+    def summarise(self, for_config_file=False):
+        s = super().summarise(for_config_file)
+        if not for_config_file and config.enable_video():
+            peers = list(self.peers.values())
+            s['video_layers'] = [{
+                'width': width,
+                'height': height,
+                'peers': len([peer for peer in peers if peer.get('layer') == layer])
+            } for layer, (width, height) in enumerate(self._layer_dimensions())]
+        if not for_config_file and self.workers:
+            peers = list(self.peers.values())
+            s['workers'] = [{
+                'pid': worker.process.pid if worker.process else None,
+                'peers': len([peer for peer in peers if peer.get('worker') is worker]),
+                'restarts': worker.restarts
+            } for worker in self.workers]
+        return s
+
     def create_elements(self):
+        if self.egress_workers < 0 or self.egress_workers > MAX_EGRESS_WORKERS:
+            raise brave.exceptions.InvalidConfiguration(
+                'egress_workers must be between 0 and %d' % MAX_EGRESS_WORKERS)
+
         self._create_pipeline()
 
-        if config.enable_video():
-            self.webrtc_video_tee = self.pipeline.get_by_name('webrtc_video_tee')
+        video_tees = [self.pipeline.get_by_name('webrtc_video_tee_%d' % layer)
+                      for layer in range(self.layers)] if config.enable_video() else []
+        audio_tee = self.pipeline.get_by_name('webrtc_audio_tee') if config.enable_audio() else None
 
-        if config.enable_audio():
-            self.webrtc_audio_tee = self.pipeline.get_by_name('webrtc_audio_tee')
+        # Peers are handled in this process if there are no egress workers (or none is running):
+        self.sessions = PeerSessions(self.pipeline, video_tees, audio_tee, self, self.logger,
+                                     config.stun_server(), config.turn_server())
+
+        if self.egress_workers > 0:
+            self.socket_paths = {
+                'video': [self._socket_path('video%d' % layer) for layer in range(len(video_tees))],
+                'audio': self._socket_path('audio') if audio_tee else None
+            }
+            for tee, socket_path in zip(video_tees, self.socket_paths['video']):
+                add_shmsink(tee, socket_path)
+            if audio_tee:
+                add_shmsink(audio_tee, self.socket_paths['audio'])
+            self.workers = [EgressWorker(self, index) for index in range(self.egress_workers)]
+
+    def _socket_path(self, name):
+        return os.path.join(tempfile.gettempdir(), 'brave-%d-%s-webrtc-%s' % (os.getpid(), self.uid, name))
 
     def _create_pipeline(self):
         '''
         Create the pipeline. This will not have the webrtcbin element in it.
         That is added when a user tries to connect, via new_peer_request().
         Instead, a 'fakesink' destination allows the pipeline to work even with 0 clients.
+
+        Whilst there are no clients, a 'valve' straight after the source drops everything, so that
+        nothing is converted or encoded for nobody. (See _set_encoding().) Each video layer also has a
+        valve, so that only the layers that peers are receiving are encoded.
+
+        Each video layer ends in a tee of VP8 (not yet RTP), so that a peer can be moved between layers.
         '''
         pipeline_string = ''
         if config.enable_video():
+            pipeline_string += (self._intersrc_string('video') + ' ! valve name=video_valve drop=true ! '
+                                'videoconvert ! videorate ! capsfilter name=capsfilter ! tee name=video_raw_tee')
 
-            video_caps = 'application/x-rtp,format=RGB,media=video,encoding-name=VP8,payload=97,width=%d,height=%d' % \
-                (self.width, self.height)
-
-            # vp8enc has 'target-bitrate' which can be reduced from its default (256000)
             # Setting keyframe-max-dist lower reduces impact of packet loss on dodgy networks
-            pipeline_string += (self._video_pipeline_start() +
-                                'vp8enc deadline=1 keyframe-max-dist=30 ! rtpvp8pay ! ' + video_caps +
-                                ' ! tee name=webrtc_video_tee webrtc_video_tee. ! fakesink')
+            for layer, (width, height) in enumerate(self._layer_dimensions()):
+                encoder_name = 'video_encoder' if layer == 0 else 'video_encoder_%d' % layer
+                pipeline_string += (' video_raw_tee. ! queue leaky=downstream max-size-buffers=2 ! '
+                                    'valve name=video_valve_%d drop=true ! videoscale ! '
+                                    'video/x-raw,width=%d,height=%d,pixel-aspect-ratio=1/1 ! '
+                                    'vp8enc name=%s deadline=1 keyframe-max-dist=30 target-bitrate=%d ! '
+                                    'tee name=webrtc_video_tee_%d webrtc_video_tee_%d. ! fakesink async=false' %
+                                    (layer, width, height, encoder_name, self._layer_bitrate(width, height),
+                                     layer, layer))
 
         if config.enable_audio():
             # bandwidth=superwideband allows the encoder to focus a little more on the important audio
             # (Basic testing showed 'wideband' to be quite poor poor)
-            pipeline_string += (' interaudiosrc name=interaudiosrc ! audioconvert ! level message=true ! '
-                                'audioresample name=webrtc-audioresample ! opusenc bandwidth=superwideband  ! '
+            # The level meter is after the valve, so that it too only runs whilst there are peers:
+            level_meter = level_meter_string() + ' ! ' if self.level_meter else ''
+            pipeline_string += (' ' + self._intersrc_string('audio') + ' ! valve name=audio_valve drop=true ! '
+                                'audioconvert ! ' + level_meter +
+                                'audioresample name=webrtc-audioresample ! opusenc name=audio_encoder '
+                                'bandwidth=superwideband ! '
                                 'rtpopuspay ! application/x-rtp,media=audio,encoding-name=OPUS,payload=96 ! '
-                                'tee name=webrtc_audio_tee webrtc_audio_tee. ! fakesink')
+                                'tee name=webrtc_audio_tee webrtc_audio_tee. ! fakesink async=false')
 
         self.create_pipeline_from_string(pipeline_string)
 
-        self.pipeline.get_bus().add_signal_watch()
-        self.pipeline.get_bus().connect('message::element', self._on_element_message)
+    def add_level_meter(self):
+        # The level meter is already in the pipeline (see _create_pipeline)
+        pass
+
+    def _layer_dimensions(self):
+        '''
+        The width and height of each video layer, largest first.
+        '''
+        # Dimensions are kept even, as some video formats require it:
+        return [((self.width >> layer) & ~1, (self.height >> layer) & ~1) for layer in range(self.layers)]
+
+    def _layer_bitrate(self, width, height):
+        return int(VIDEO_BITRATE_PER_PIXEL * width * height)
 
     def _update_current_num_peers(self):
         self.current_num_peers = len(self.peers)
         self.logger.info('I now have %d peers', self.current_num_peers)
+        self._set_encoding(self.current_num_peers > 0)
+
+    def _set_encoding(self, enabled):
+        '''
+        Opens (or closes) the valves in front of the encoders, so that encoding only happens when there are peers.
+        '''
+        for audio_or_video in ['video', 'audio']:
+            self._open_valve('%s_valve' % audio_or_video, enabled)
+        self._update_layer_valves()
+
+    def _update_layer_valves(self):
+        '''
+        Opens the valve of each video layer that a peer is receiving (or about to), and closes the others.
+        '''
+        peers = list(self.peers.values())
+        layers_in_use = set(peer.get('layer') for peer in peers) | set(peer.get('pending_layer') for peer in peers)
+        for layer in range(self.layers):
+            self._open_valve('video_valve_%d' % layer, layer in layers_in_use)
+
+    def _open_valve(self, name, open):
+        valve = self.pipeline.get_by_name(name) if hasattr(self, 'pipeline') else None
+        if valve and valve.get_property('drop') == open:
+            valve.set_property('drop', not open)
+            self.logger.debug('%s encoding after %s' % ('Started' if open else 'Stopped', name))
+
+    def force_key_frame(self, layer=0):
+        '''
+        Asks the video encoder of the layer for a keyframe now, so that a peer that has just connected
+        (or moved to the layer) need not wait for the next one before it can show any video.
+        '''
+        encoder_name = 'video_encoder' if layer == 0 else 'video_encoder_%d' % layer
+        encoder = self.pipeline.get_by_name(encoder_name) if hasattr(self, 'pipeline') else None
+        if encoder:
+            event = GstVideo.video_event_new_upstream_force_key_unit(Gst.CLOCK_TIME_NONE, True, 0)
+            encoder.get_static_pad('src').send_event(event)
 
     def _ice_servers(self):
         servers = []
@@ -87,54 +233,47 @@ class WebRTCOutput(Output):
 
     async def new_peer_request(self, ws):
         '''
-        Called when a peer (client) would like to connect via webrtc
+        Called (on the API's event loop) when a peer (client) would like to connect via webrtc
         '''
-
-        # We make an event loop here to ensure it's in the API thread, not the master thread:
-        if not hasattr(self, 'event_loop'):
-            self.event_loop = asyncio.get_event_loop()
+        self.event_loop = asyncio.get_event_loop()
 
         if ws in self.peers:
             self.logger.debug('Existing user requesting webrtc again, so removing old one')
             await self.remove_peer_request(ws)
 
-        self.peers[ws] = {}
+        # The valves are opened as soon as possible, so that the encoders have started by the time the peer connects.
+        # Peers start with the smallest layer, moving to larger ones if they receive it well:
+        self.overall_peer_count += 1
+        peer_id = self.overall_peer_count
+        peer = {'id': peer_id, 'join_requested_at': time.monotonic(), 'layer': self.layers - 1,
+                'worker': self._choose_worker()}
+        self.peers[ws] = peer
+        self.peer_websockets[peer_id] = ws
         self._update_current_num_peers()
         await ws.send(json.dumps({'msg_type': 'webrtc-initialising', 'ice_servers': self._ice_servers()}))
 
-        self._create_webrtc_element_for_new_connection(ws)
-
-        self.peers[ws]['webrtcbin'].connect('on-negotiation-needed', self._on_negotiation_needed, ws)
-        self.peers[ws]['webrtcbin'].connect('on-ice-candidate', self._send_ice_candidate_message, ws)
-        # In the future, use connect('pad-added' here if the client's return video is wanted
-
+        # The pipeline is changed on the master thread, so that the API's event loop is not held up meanwhile:
+        if peer['worker']:
+            await run_on_master_thread_and_wait(peer['worker'].send, message={'add_peer': peer_id,
+                                                                              'layer': peer['layer']})
+        else:
+            await run_on_master_thread_and_wait(self._add_peer_to_sessions, peer_id=peer_id, layer=peer['layer'])
         self.logger.debug('Successfully added a peer request')
 
-    def _on_element_message(self, bus, message):
-        if len(self.peers) == 0:
-            return
-        t = message.type
-        if t == Gst.MessageType.ELEMENT:
-            if message.get_structure().get_name() == 'level':
-                channels = len(message.get_structure().get_value('peak'))
-                data = []
-
-                for i in range(0, channels):
-                    data.append(json.dumps({
-                        'peak': int(message.get_structure().get_value('peak')[i]),
-                        'rms': int(message.get_structure().get_value('rms')[i]),
-                        'decay': int(message.get_structure().get_value('decay')[i])
-                    }))
-
-                jsonData = json.dumps({'msg_type': 'volume', 'channels': channels, 'data': data})
-                self.event_loop.create_task(self._send_data_to_all_peers(jsonData))
-
-    async def _send_data_to_all_peers(self, jsonData):
-        for ws in self.peers:
-            try:
-                await ws.send(jsonData)
-            except websockets.ConnectionClosed:
-                pass
+    def _choose_worker(self):
+        '''
+        Returns the running egress worker with the fewest peers, or None if the peer is to be handled by this process.
+        '''
+        workers = [worker for worker in self.workers if worker.process is not None]
+        if not workers:
+            return None
+        peers = list(self.peers.values())
+        return min(workers, key=lambda worker: len([peer for peer in peers if peer.get('worker') is worker]))
+
+    def _add_peer_to_sessions(self, peer_id, layer):
+        # The peer may have gone whilst waiting for this to be called:
+        if peer_id in self.peer_websockets:
+            self.sessions.add_peer(peer_id, layer)
 
     async def remove_peer_request(self, ws):
         '''
@@ -144,133 +283,123 @@ class WebRTCOutput(Output):
             self.logger.warning('remove_peer_request called but this is not a peer')
             return
 
-        self._remove_no_longer_needed_tee_pads(ws)
-        self._remove_webrtc_element(ws)
-        del self.peers[ws]
+        peer = self.peers.pop(ws)
+        self.peer_websockets.pop(peer['id'], None)
         self._update_current_num_peers()
+        if peer['worker']:
+            await run_on_master_thread_and_wait(peer['worker'].send, message={'remove_peer': peer['id']})
+        else:
+            await run_on_master_thread_and_wait(self.sessions.remove_peer, peer_id=peer['id'])
 
-    def _create_webrtc_element_for_new_connection(self, ws):
+    async def sdp_message_from_peer(self, ws, sdp):
         '''
-        We make a new webrtc element, and queue to feed into it, for every new peer (client).
-        That way, multiple clients can connect at once.
+        Called when the peer (client) has sent (via websocket) an SDP message
         '''
+        self._message_from_peer(ws, 'sdp', sdp)
 
-        self.peers[ws]['webrtcbin'] = Gst.ElementFactory.make('webrtcbin')
-        self.pipeline.add(self.peers[ws]['webrtcbin'])
-        self.peers[ws]['webrtcbin'].set_property('bundle-policy', 'max-bundle')
-        self.peers[ws]['webrtcbin'].add_property_notify_watch(None, True)
-        self.peers[ws]['webrtcbin'].set_state(Gst.State.READY)
-
-        if config.stun_server():
-            self.peers[ws]['webrtcbin'].set_property('stun-server', 'stun://' + config.stun_server())
-        if config.turn_server():
-            self.peers[ws]['webrtcbin'].set_property('turn-server', 'turn://' + config.turn_server())
-
-        if config.enable_video():
-            self.peers[ws]['video_queue'] = Gst.ElementFactory.make('queue')
-            self.peers[ws]['video_queue'].set_property('leaky', 'upstream')
-            self.pipeline.add(self.peers[ws]['video_queue'])
-            self.webrtc_video_tee.link(self.peers[ws]['video_queue'])
-            self.peers[ws]['video_queue'].link(self.peers[ws]['webrtcbin'])
-            self.peers[ws]['video_queue'].set_state(Gst.State.READY)
-
-        if config.enable_audio():
-            self.peers[ws]['audio_queue'] = Gst.ElementFactory.make('queue')
-            self.peers[ws]['audio_queue'].set_property('leaky', 'upstream')
-            self.pipeline.add(self.peers[ws]['audio_queue'])
-            self.webrtc_audio_tee.link(self.peers[ws]['audio_queue'])
-            self.peers[ws]['audio_queue'].link(self.peers[ws]['webrtcbin'])
-            self.peers[ws]['audio_queue'].set_state(Gst.State.READY)
-
-        # We set the three elements above to READY first.
-        # We now move them to PLAYING
-        # This appears to prevent a race-condition that can
-        # intermittently cause _on_negotiation_needed to not be called.
-        self.peers[ws]['webrtcbin'].set_state(Gst.State.PLAYING)
-
-        if config.enable_video():
-            self.peers[ws]['video_queue'].set_state(Gst.State.PLAYING)
+    async def ice_message_from_peer(self, ws, ice):
+        '''
+        Called when the peer (client) has sent (via websocket) an ICE message
+        '''
+        self._message_from_peer(ws, 'ice', ice)
 
-        if config.enable_audio():
-            self.peers[ws]['audio_queue'].set_state(Gst.State.PLAYING)
+    def _message_from_peer(self, ws, sdp_or_ice, content):
+        if ws not in self.peers:
+            self.logger.warning('%s message from a client that is not a peer' % sdp_or_ice.upper())
+            return
+        peer = self.peers[ws]
+        if peer['worker']:
+            run_on_master_thread_when_idle(peer['worker'].send, message={'peer': peer['id'], sdp_or_ice: content})
+        else:
+            getattr(self.sessions, '%s_message_from_peer' % sdp_or_ice)(peer['id'], content)
 
-    def _remove_webrtc_element(self, ws):
+    def _send_to_peer(self, ws, message):
         '''
-        When deleting a connection, delete the webrtc element and the queue before it.
-        (If the user reconnects, we'll create a new one.)
+        Sends a message to the peer via the API's event loop, without waiting for it to be sent.
+        Can be called from any thread (e.g. the GStreamer thread that created an SDP offer).
         '''
-        for element_name in ['webrtcbin', 'video_queue', 'audio_queue']:
-            if element_name in self.peers[ws]:
-                element = self.peers[ws][element_name]
-                if not element.set_state(Gst.State.NULL):
-                    self.logger.warning('Cannot remove %s: in the %s state' % (element_name, element.get_state(0)))
-                elif not hasattr(self, 'pipeline'):
-                    self.logger.warning('Cannot remove %s: no pipeline' % element_name)
-                elif not self.pipeline.remove(element):
-                    self.logger.warning('Cannot remove %s: remove request failed' % element_name)
-
-    def _remove_no_longer_needed_tee_pads(self, ws):
+        if self.event_loop is None or self.event_loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self._send(ws, message), self.event_loop)
+
+    async def _send(self, ws, message):
+        try:
+            await ws.send(message)
+        except websockets.ConnectionClosed:
+            pass
+
+    def send_to_peer(self, peer_id, message):
         '''
-        When deleting a connection, the audio and tees will have src (output) pads
-        that are no longer required. This deletes them.
+        Called (from any thread) by PeerSessions, or an egress worker, with a message for the peer.
         '''
-        for av in ['video', 'audio']:
-            element_name = av + '_queue'
-            if element_name in self.peers[ws]:
-                element = self.peers[ws][element_name]
-                sink_pad = element.get_static_pad('sink')
-                tee_pad_to_remove = sink_pad.get_peer()
-                if tee_pad_to_remove:
-                    tee = getattr(self, 'webrtc_%s_tee' % av)
-                    if not tee.remove_pad(tee_pad_to_remove):
-                        self.logger.warning('Unable to remove pad from %s tee' % av)
+        ws = self.peer_websockets.get(peer_id)
+        if ws is not None:
+            self._send_to_peer(ws, message)
 
-    async def sdp_message_from_peer(self, ws, sdp):
+    def on_peer_connected(self, peer_id):
         '''
-        Called when the peer (client) has sent (via websocket) an SDP message
+        Called (from any thread) once a peer has connected. It is sent a keyframe, and the time it took
+        to join is recorded.
         '''
-        assert(sdp['type'] == 'answer')
-        sdp = sdp['sdp']
-        res, sdpmsg = GstSdp.SDPMessage.new()
-        GstSdp.sdp_message_parse_buffer(bytes(sdp.encode()), sdpmsg)
-        answer = GstWebRTC.WebRTCSessionDescription.new(GstWebRTC.WebRTCSDPType.ANSWER, sdpmsg)
-        promise = Gst.Promise.new()
-        self.peers[ws]['webrtcbin'].emit('set-remote-description', answer, promise)
-        promise.interrupt()
+        peer = self.peers.get(self.peer_websockets.get(peer_id))
+        if peer is None or 'join_requested_at' not in peer:
+            return
+        self.force_key_frame(peer['layer'])
+        self.last_peer_join_time = time.monotonic() - peer.pop('join_requested_at')
+        self.peers_joined += 1
+        self.logger.info('Peer connected, %.0fms after requesting to' % (self.last_peer_join_time * 1000))
 
-    async def ice_message_from_peer(self, ws, ice):
+    def on_peer_layer_change(self, peer_id, layer, pending_layer):
         '''
-        Called when the peer (client) has sent (via websocket) an ICE message
+        Called (from any thread) when a peer is moving to another layer (pending_layer), or has moved.
         '''
-        self.peers[ws]['webrtcbin'].emit('add-ice-candidate', ice['sdpMLineIndex'], ice['candidate'])
-
-    def _send_sdp_offer(self, offer, ws):
-        text = offer.sdp.as_text()
-        self.logger.debug('Sending SDP offer to client (%d chars in length)' % len(text))
-        msg = json.dumps({'sdp': {'type': 'offer', 'sdp': text}})
-        loop = asyncio.new_event_loop()
-        loop.run_until_complete(ws.send(msg))
-
-    def _on_offer_created(self, promise, webrtcbin, ws):
-        promise.wait()
-        reply = promise.get_reply()
-        offer = reply.get_value('offer')
-        promise = Gst.Promise.new()
-        webrtcbin.emit('set-local-description', offer, promise)
-        promise.interrupt()
-        self._send_sdp_offer(offer, ws)
-
-    def _on_negotiation_needed(self, element, ws):
-        promise = Gst.Promise.new_with_change_func(self._on_offer_created, element, ws)
-        element.emit('create-offer', None, promise)
-
-    def _send_ice_candidate_message(self, _, mlineindex, candidate, ws):
+        peer = self.peers.get(self.peer_websockets.get(peer_id))
+        if peer is None:
+            return
+        peer['layer'], peer['pending_layer'] = layer, pending_layer
+        run_on_master_thread_when_idle(self._update_layer_valves)
+        if pending_layer is None:
+            run_on_master_thread_when_idle(self.report_update_to_user)
+
+    def base_time(self):
+        if not hasattr(self, 'pipeline') or self.state != Gst.State.PLAYING:
+            return None
+        return self.pipeline.get_base_time()
+
+    def on_state_change(self, old_state, new_state, pending_state):
+        super().on_state_change(old_state, new_state, pending_state)
+        if new_state is not Gst.State.PLAYING:
+            return
+
+        # The egress workers are started once the shmsinks exist (as they fail if they start first).
+        # If the output is PLAYING again later, its base time may have changed:
+        for worker in self.workers:
+            if self.workers_started:
+                worker.send({'base_time': self.base_time()})
+            else:
+                worker.start()
+        self.workers_started = True
+
+    def on_egress_worker_exit(self, worker):
         '''
-        Called when this server wishes to propose an ICE candidate to the client.
+        Called (on the master thread) when an egress worker has exited. Its peers have lost their connection,
+        so are removed. (They can connect again, to another worker.)
         '''
-        icemsg = json.dumps({'ice': {'candidate': candidate, 'sdpMLineIndex': mlineindex}})
-        loop = asyncio.new_event_loop()
-        loop.run_until_complete(ws.send(icemsg))
+        for ws, peer in list(self.peers.items()):
+            if peer['worker'] is worker:
+                self.logger.warning('Peer %d has been disconnected, as its egress worker exited' % peer['id'])
+                self.peers.pop(ws)
+                self.peer_websockets.pop(peer['id'], None)
+                self._send_to_peer(ws, json.dumps({'msg_type': 'webrtc-closed'}))
+        self._update_current_num_peers()
+        self.report_update_to_user()
+
+    def _delete_with_no_connections(self):
+        if hasattr(self, 'sessions'):
+            self.sessions.end()
+        for worker in self.workers:
+            worker.stop()
+        super()._delete_with_no_connections()
 
     def create_caps_string(self):
         # Only basic caps set here as we set it more later in the pipeline
@@ -0,0 +1,322 @@
+'''
+The WebRTC sessions of the peers (clients) of a WebRTCOutput.
+
+Each peer has a webrtcbin (which does ICE, DTLS and SRTP), fed from tees of encoded video (one per layer)
+and RTP audio. The sessions are run by the WebRTCOutput itself, or (if it has 'egress_workers') by worker
+processes, which receive the encoded audio and video from the output via shared memory.
+See brave/outputs/webrtc_worker.py.
+'''
+import json
+import gi
+from gi.repository import Gst, GLib
+from brave.helpers import run_on_master_thread_when_idle
+gi.require_version('GstWebRTC', '1.0')
+from gi.repository import GstWebRTC
+gi.require_version('GstSdp', '1.0')
+from gi.repository import GstSdp
+
+VIDEO_RTP_CAPS = 'application/x-rtp,media=video,encoding-name=VP8,payload=97'
+# The elements that each peer has for video, in the order they are linked (before its webrtcbin):
+VIDEO_PEER_ELEMENTS = ['video_selector', 'video_payloader', 'video_capsfilter', 'video_queue']
+
+# How often (in seconds) the stats of each peer are checked, to choose which layer it should receive:
+STATS_PERIOD = 2
+# A peer moves to a smaller layer if it loses more than this fraction of packets, or its round-trip time is longer:
+LOSS_TO_STEP_DOWN = 0.05
+RTT_TO_STEP_DOWN = 0.5
+# ...and moves to a larger layer once its packet loss has been below this for this many periods in a row:
+LOSS_TO_STEP_UP = 0.01
+GOOD_PERIODS_TO_STEP_UP = 3
+
+
+class PeerSessions():
+    '''
+    Creates, and removes, the elements for each peer, and handles the signalling with it.
+    Peers are identified by a number. What the peer needs to be sent, and what the owner (the WebRTCOutput)
+    needs to know, is passed to the 'listener', which has these methods (called from any thread):
+
+        send_to_peer(peer_id, message)
+        on_peer_connected(peer_id)
+        on_peer_layer_change(peer_id, layer, pending_layer)
+        force_key_frame(layer)
+    '''
+
+    def __init__(self, pipeline, video_tees, audio_tee, listener, logger, stun_server=None, turn_server=None):
+        self.pipeline = pipeline
+        self.video_tees = video_tees
+        self.audio_tee = audio_tee
+        self.listener = listener
+        self.logger = logger
+        self.stun_server = stun_server
+        self.turn_server = turn_server
+        self.peers = {}
+        self._ended = False
+        if len(video_tees) > 1:
+            GLib.timeout_add(STATS_PERIOD * 1000, self._request_peer_stats)
+
+    def end(self):
+        self._ended = True
+
+    def add_peer(self, peer_id, layer):
+        '''
+        We make a new webrtc element, and queue to feed into it, for every new peer (client).
+        That way, multiple clients can connect at once.
+        Called on the master thread.
+        '''
+        peer = self.peers[peer_id] = {'layer': layer, 'good_periods': 0}
+        peer['webrtcbin'] = Gst.ElementFactory.make('webrtcbin')
+        self.pipeline.add(peer['webrtcbin'])
+        peer['webrtcbin'].connect('on-negotiation-needed', self._on_negotiation_needed, peer_id)
+        peer['webrtcbin'].connect('on-ice-candidate', self._send_ice_candidate_message, peer_id)
+        peer['webrtcbin'].connect('notify::connection-state', self._on_connection_state_change, peer_id)
+        # In the future, use connect('pad-added' here if the client's return video is wanted
+        peer['webrtcbin'].set_property('bundle-policy', 'max-bundle')
+        peer['webrtcbin'].add_property_notify_watch(None, True)
+        peer['webrtcbin'].set_state(Gst.State.READY)
+
+        if self.stun_server:
+            peer['webrtcbin'].set_property('stun-server', 'stun://' + self.stun_server)
+        if self.turn_server:
+            peer['webrtcbin'].set_property('turn-server', 'turn://' + self.turn_server)
+
+        if self.video_tees:
+            self._create_video_elements(peer)
+
+        if self.audio_tee:
+            peer['audio_queue'] = Gst.ElementFactory.make('queue')
+            peer['audio_queue'].set_property('leaky', 'upstream')
+            self.pipeline.add(peer['audio_queue'])
+            self.audio_tee.link(peer['audio_queue'])
+            peer['audio_queue'].link(peer['webrtcbin'])
+            peer['audio_queue'].set_state(Gst.State.READY)
+
+        # We set the elements above to READY first.
+        # We now move them to PLAYING
+        # This appears to prevent a race-condition that can
+        # intermittently cause _on_negotiation_needed to not be called.
+        peer['webrtcbin'].set_state(Gst.State.PLAYING)
+
+        if self.video_tees:
+            for element_name in VIDEO_PEER_ELEMENTS:
+                peer[element_name].set_state(Gst.State.PLAYING)
+
+        if self.audio_tee:
+            peer['audio_queue'].set_state(Gst.State.PLAYING)
+
+    def _create_video_elements(self, peer):
+        '''
+        Each peer has an input-selector, fed by every video layer, to choose which layer the peer receives.
+        (Inactive layers are dropped by the selector.) It is followed by the peer's own RTP payloader, so that
+        the RTP stream continues uninterrupted when the peer moves between layers.
+        '''
+        peer['video_selector'] = Gst.ElementFactory.make('input-selector')
+        peer['video_selector'].set_property('sync-streams', False)
+        peer['video_payloader'] = Gst.ElementFactory.make('rtpvp8pay')
+        peer['video_capsfilter'] = Gst.ElementFactory.make('capsfilter')
+        peer['video_capsfilter'].set_property('caps', Gst.Caps.from_string(VIDEO_RTP_CAPS))
+        peer['video_queue'] = Gst.ElementFactory.make('queue')
+        peer['video_queue'].set_property('leaky', 'upstream')
+        for element_name in VIDEO_PEER_ELEMENTS:
+            self.pipeline.add(peer[element_name])
+
+        peer['video_selector_pads'] = []
+        for tee in self.video_tees:
+            selector_pad = peer['video_selector'].get_request_pad('sink_%u')
+            tee.get_request_pad('src_%u').link(selector_pad)
+            peer['video_selector_pads'].append(selector_pad)
+        peer['video_selector'].set_property('active-pad', peer['video_selector_pads'][peer['layer']])
+
+        peer['video_selector'].link(peer['video_payloader'])
+        peer['video_payloader'].link(peer['video_capsfilter'])
+        peer['video_capsfilter'].link(peer['video_queue'])
+        peer['video_queue'].link(peer['webrtcbin'])
+        for element_name in VIDEO_PEER_ELEMENTS:
+            peer[element_name].set_state(Gst.State.READY)
+
+    def remove_peer(self, peer_id):
+        '''
+        Removes the elements of a peer that has gone. Called on the master thread.
+        '''
+        peer = self.peers.pop(peer_id, None)
+        if peer is not None:
+            self._remove_no_longer_needed_tee_pads(peer)
+            self._remove_webrtc_element(peer)
+
+    def _remove_webrtc_element(self, peer):
+        '''
+        When deleting a connection, delete the webrtc element and the queue before it.
+        (If the user reconnects, we'll create a new one.)
+        '''
+        for element_name in ['webrtcbin', *VIDEO_PEER_ELEMENTS, 'audio_queue']:
+            if element_name in peer:
+                element = peer[element_name]
+                if not element.set_state(Gst.State.NULL):
+                    self.logger.warning('Cannot remove %s: in the %s state' % (element_name, element.get_state(0)))
+                elif not self.pipeline.remove(element):
+                    self.logger.warning('Cannot remove %s: remove request failed' % element_name)
+
+    def _remove_no_longer_needed_tee_pads(self, peer):
+        '''
+        When deleting a connection, the audio and video tees will have src (output) pads
+        that are no longer required. This deletes them.
+        '''
+        sink_pads = list(peer.get('video_selector_pads', []))
+        if 'audio_queue' in peer:
+            sink_pads.append(peer['audio_queue'].get_static_pad('sink'))
+        for sink_pad in sink_pads:
+            tee_pad_to_remove = sink_pad.get_peer()
+            if tee_pad_to_remove:
+                tee = tee_pad_to_remove.get_parent_element()
+                if not tee.remove_pad(tee_pad_to_remove):
+                    self.logger.warning('Unable to remove pad from %s' % tee.get_name())
+
+    def sdp_message_from_peer(self, peer_id, sdp):
+        '''
+        Called when the peer (client) has sent (via websocket) an SDP message
+        '''
+        if peer_id not in self.peers:
+            self.logger.warning('SDP message from a client that is not a peer')
+            return
+        assert sdp['type'] == 'answer'
+        sdp = sdp['sdp']
+        res, sdpmsg = GstSdp.SDPMessage.new()
+        GstSdp.sdp_message_parse_buffer(bytes(sdp.encode()), sdpmsg)
+        answer = GstWebRTC.WebRTCSessionDescription.new(GstWebRTC.WebRTCSDPType.ANSWER, sdpmsg)
+        promise = Gst.Promise.new()
+        self.peers[peer_id]['webrtcbin'].emit('set-remote-description', answer, promise)
+        promise.interrupt()
+
+    def ice_message_from_peer(self, peer_id, ice):
+        '''
+        Called when the peer (client) has sent (via websocket) an ICE message
+        '''
+        if peer_id not in self.peers:
+            self.logger.warning('ICE message from a client that is not a peer')
+            return
+        self.peers[peer_id]['webrtcbin'].emit('add-ice-candidate', ice['sdpMLineIndex'], ice['candidate'])
+
+    def _on_negotiation_needed(self, element, peer_id):
+        promise = Gst.Promise.new_with_change_func(self._on_offer_created, element, peer_id)
+        element.emit('create-offer', None, promise)
+
+    def _on_offer_created(self, promise, webrtcbin, peer_id):
+        promise.wait()
+        reply = promise.get_reply()
+        offer = reply.get_value('offer')
+        promise = Gst.Promise.new()
+        webrtcbin.emit('set-local-description', offer, promise)
+        promise.interrupt()
+        self._send_sdp_offer(offer, peer_id)
+
+    def _send_sdp_offer(self, offer, peer_id):
+        text = offer.sdp.as_text()
+        self.logger.debug('Sending SDP offer to client (%d chars in length)' % len(text))
+        self.listener.send_to_peer(peer_id, json.dumps({'sdp': {'type': 'offer', 'sdp': text}}))
+
+    def _send_ice_candidate_message(self, _, mlineindex, candidate, peer_id):
+        '''
+        Called when this server wishes to propose an ICE candidate to the client.
+        '''
+        self.listener.send_to_peer(peer_id, json.dumps({'ice': {'candidate': candidate, 'sdpMLineIndex': mlineindex}}))
+
+    def _on_connection_state_change(self, webrtcbin, pspec, peer_id):
+        '''
+        Called (on a GStreamer thread) when the state of a peer's connection changes.
+        '''
+        if webrtcbin.get_property('connection-state') != GstWebRTC.WebRTCPeerConnectionState.CONNECTED:
+            return
+        peer = self.peers.get(peer_id)
+        if peer is None or peer.get('connected'):
+            return
+        peer['connected'] = True
+        self.listener.on_peer_connected(peer_id)
+
+    def _request_peer_stats(self):
+        '''
+        Called periodically (on the master thread) to get the stats of every peer, from its webrtcbin.
+        '''
+        if self._ended:
+            return False
+        for peer_id, peer in list(self.peers.items()):
+            if peer.get('connected') and peer.get('pending_layer') is None:
+                promise = Gst.Promise.new_with_change_func(self._on_peer_stats, peer_id)
+                peer['webrtcbin'].emit('get-stats', None, promise)
+        return True
+
+    def _on_peer_stats(self, promise, peer_id):
+        '''
+        Called (on a GStreamer thread) with a peer's stats. Works out the packet loss since the last time,
+        from the RTCP receiver reports of the peer, and so which layer the peer should receive.
+        '''
+        peer = self.peers.get(peer_id)
+        reply = promise.get_reply()
+        if peer is None or reply is None:
+            return
+
+        packets_lost, packets_sent, round_trip_time = 0, 0, 0
+        for i in range(reply.n_fields()):
+            stats = reply.get_value(reply.nth_field_name(i))
+            if not isinstance(stats, Gst.Structure):
+                continue
+            stats_type = stats.get_value('type')
+            if stats_type == GstWebRTC.WebRTCStatsType.REMOTE_INBOUND_RTP:
+                packets_lost += stats.get_value('packets-lost') or 0
+                round_trip_time = max(round_trip_time, stats.get_value('round-trip-time') or 0)
+            elif stats_type == GstWebRTC.WebRTCStatsType.OUTBOUND_RTP:
+                packets_sent += stats.get_value('packets-sent') or 0
+
+        previous = peer.get('packets')
+        peer['packets'] = (packets_lost, packets_sent)
+        if previous is None or packets_sent <= previous[1]:
+            return
+        loss = max(0, packets_lost - previous[0]) / (packets_sent - previous[1])
+
+        layer = self._choose_layer(peer, loss, round_trip_time)
+        if layer != peer['layer']:
+            self.logger.info('Moving peer from layer %d to %d (packet loss %.1f%%, round-trip time %.0fms)' %
+                             (peer['layer'], layer, loss * 100, round_trip_time * 1000))
+            run_on_master_thread_when_idle(self._move_peer_to_layer, peer_id=peer_id, layer=layer)
+
+    def _choose_layer(self, peer, loss, round_trip_time):
+        '''
+        Returns the layer that the peer should receive: a smaller one at the first sign of trouble,
+        and a larger one only after it has been receiving well for a while.
+        '''
+        if loss > LOSS_TO_STEP_DOWN or round_trip_time > RTT_TO_STEP_DOWN:
+            peer['good_periods'] = 0
+            return min(peer['layer'] + 1, len(self.video_tees) - 1)
+        if loss >= LOSS_TO_STEP_UP:
+            peer['good_periods'] = 0
+            return peer['layer']
+        peer['good_periods'] += 1
+        if peer['good_periods'] >= GOOD_PERIODS_TO_STEP_UP:
+            peer['good_periods'] = 0
+            return max(peer['layer'] - 1, 0)
+        return peer['layer']
+
+    def _move_peer_to_layer(self, peer_id, layer):
+        '''
+        Moves the peer to a different video layer. Called on the master thread.
+        The peer's selector is switched when the layer's next keyframe arrives (which is requested now),
+        so that the peer never receives part of a layer that it cannot decode.
+        '''
+        peer = self.peers.get(peer_id)
+        if peer is None or 'video_selector' not in peer:
+            return
+        peer['pending_layer'] = layer
+        self.listener.on_peer_layer_change(peer_id, peer['layer'], layer)
+        self.listener.force_key_frame(layer)
+
+        def _on_buffer(pad, info):
+            if peer.get('pending_layer') != layer:
+                return Gst.PadProbeReturn.REMOVE
+            if info.get_buffer().has_flags(Gst.BufferFlags.DELTA_UNIT):
+                return Gst.PadProbeReturn.DROP
+            peer['video_selector'].set_property('active-pad', pad)
+            peer['layer'] = layer
+            peer['pending_layer'] = None
+            peer['packets'] = None
+            self.listener.on_peer_layer_change(peer_id, layer, None)
+            return Gst.PadProbeReturn.REMOVE
+
+        peer['video_selector_pads'][layer].add_probe(Gst.PadProbeType.BUFFER, _on_buffer)
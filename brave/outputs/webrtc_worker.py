@@ -0,0 +1,163 @@
+'''
+Egress workers: processes that run the WebRTC sessions of some of the peers of a WebRTCOutput.
+
+A webrtc output with 'egress_workers' set still encodes its audio and video (once, in this process), but
+sends the encoded video (VP8, one stream per layer) and audio (RTP) to shared memory. Each worker reads
+these, and runs the webrtcbin (ICE, DTLS and SRTP) of each of its peers, so that many peers do not compete
+with mixing for CPU or the GIL. Peers stay connected to this process's websocket, and signalling is passed
+to and from the worker that has the peer.
+
+The output sends the worker: {'add_peer': id, 'layer': n}, {'remove_peer': id}, {'peer': id, 'sdp': ...},
+{'peer': id, 'ice': ...} and {'base_time': t}. The worker sends the output: {'peer': id, 'send': message},
+{'peer': id, 'connected': true}, {'peer': id, 'layer': n, 'pending_layer': n} and {'key_frame': layer}.
+'''
+import json
+import sys
+from gi.repository import Gst, GLib
+import brave.config as config
+from brave.helpers import get_logger, run_on_master_thread_when_idle
+from brave.outputs.webrtc_sessions import PeerSessions
+from brave.workers import WorkerProcess, config_for_worker, init_worker_process, read_messages
+
+# The worker is started with this Python code. (It is not run as a module, to avoid importing this one twice.)
+WORKER_COMMAND = 'import brave.outputs.webrtc_worker; brave.outputs.webrtc_worker.run_worker()'
+
+
+class EgressWorker(WorkerProcess):
+    '''
+    Starts, stops and talks to an egress worker of a WebRTCOutput.
+    '''
+
+    def __init__(self, output, index):
+        super().__init__(WORKER_COMMAND, output.logger)
+        self.output = output
+        self.index = index
+
+    def spec(self):
+        return {
+            'config': config_for_worker(),
+            'name': '%s-egress%d' % (self.output.uid, self.index),
+            'socket_paths': self.output.socket_paths,
+            'base_time': self.output.base_time()
+        }
+
+    def on_message(self, message):
+        if 'peer' in message:
+            peer_id = message['peer']
+            if 'send' in message:
+                self.output.send_to_peer(peer_id, message['send'])
+            if message.get('connected'):
+                self.output.on_peer_connected(peer_id)
+            if 'layer' in message:
+                self.output.on_peer_layer_change(peer_id, message['layer'], message.get('pending_layer'))
+        if 'key_frame' in message:
+            self.output.force_key_frame(message['key_frame'])
+
+    def on_exit(self):
+        self.output.on_egress_worker_exit(self)
+
+
+class MainProcessListener():
+    '''
+    Passes what the peer sessions report (from any thread) to the main process, via stdout.
+    '''
+
+    def __init__(self, messages_out, mainloop):
+        self.messages_out = messages_out
+        self.mainloop = mainloop
+
+    def send_to_peer(self, peer_id, message):
+        self._send({'peer': peer_id, 'send': message})
+
+    def on_peer_connected(self, peer_id):
+        self._send({'peer': peer_id, 'connected': True})
+
+    def on_peer_layer_change(self, peer_id, layer, pending_layer):
+        self._send({'peer': peer_id, 'layer': layer, 'pending_layer': pending_layer})
+
+    def force_key_frame(self, layer):
+        self._send({'key_frame': layer})
+
+    def _send(self, message):
+        # Messages are written on the master thread, so that they are not interleaved:
+        run_on_master_thread_when_idle(self._write, message=message)
+
+    def _write(self, message):
+        try:
+            self.messages_out.write(json.dumps(message) + '\n')
+            self.messages_out.flush()
+        except OSError:
+            self.mainloop.quit()
+
+
+def run_worker():
+    '''
+    The worker process. Receives the output's encoded audio and video, and runs the sessions of the peers
+    that it is given, until its stdin closes.
+    '''
+    spec, messages_out = init_worker_process()
+    Gst.init(None)
+    logger = get_logger(spec['name'])
+    mainloop = GLib.MainLoop()
+
+    pipeline_string = ''
+    for layer, socket_path in enumerate(spec['socket_paths']['video']):
+        pipeline_string += (' shmsrc name=video_shmsrc_%d is-live=true ! gdpdepay ! '
+                            'tee name=video_tee_%d video_tee_%d. ! fakesink async=false' % (layer, layer, layer))
+    if spec['socket_paths']['audio']:
+        pipeline_string += (' shmsrc name=audio_shmsrc is-live=true ! gdpdepay ! '
+                            'tee name=audio_tee audio_tee. ! fakesink async=false')
+    pipeline = Gst.parse_launch(pipeline_string)
+
+    for layer, socket_path in enumerate(spec['socket_paths']['video']):
+        pipeline.get_by_name('video_shmsrc_%d' % layer).set_property('socket-path', socket_path)
+    if spec['socket_paths']['audio']:
+        pipeline.get_by_name('audio_shmsrc').set_property('socket-path', spec['socket_paths']['audio'])
+
+    # The timestamps from the main process are relative to the base time of the output's pipeline, so this
+    # pipeline uses the same base time. (The system clock of both processes is the same monotonic clock.)
+    def set_base_time(base_time):
+        if base_time is not None:
+            pipeline.set_start_time(Gst.CLOCK_TIME_NONE)
+            pipeline.set_base_time(base_time)
+
+    pipeline.use_clock(Gst.SystemClock.obtain())
+    set_base_time(spec['base_time'])
+
+    video_tees = [pipeline.get_by_name('video_tee_%d' % layer) for layer in range(len(spec['socket_paths']['video']))]
+    audio_tee = pipeline.get_by_name('audio_tee')
+    sessions = PeerSessions(pipeline, video_tees, audio_tee, MainProcessListener(messages_out, mainloop), logger,
+                            config.stun_server(), config.turn_server())
+
+    def on_error(bus, message):
+        # The main process restarts the worker:
+        logger.error('Ending, after error from pipeline: %s' % message.parse_error()[0].message)
+        mainloop.quit()
+
+    def on_input(fd, condition, pending):
+        messages = read_messages(fd, pending)
+        if messages is None:
+            logger.debug('Worker process is ending')
+            mainloop.quit()
+            return False
+        for message in messages:
+            if 'add_peer' in message:
+                sessions.add_peer(message['add_peer'], message['layer'])
+            elif 'remove_peer' in message:
+                sessions.remove_peer(message['remove_peer'])
+            elif 'sdp' in message:
+                sessions.sdp_message_from_peer(message['peer'], message['sdp'])
+            elif 'ice' in message:
+                sessions.ice_message_from_peer(message['peer'], message['ice'])
+            elif 'base_time' in message:
+                set_base_time(message['base_time'])
+        return True
+
+    pipeline.get_bus().add_signal_watch()
+    pipeline.get_bus().connect('message::error', on_error)
+    GLib.io_add_watch(sys.stdin.fileno(), GLib.PRIORITY_DEFAULT, GLib.IOCondition.IN | GLib.IOCondition.HUP,
+                      on_input, bytearray())
+    pipeline.set_state(Gst.State.PLAYING)
+    mainloop.run()
+    sessions.end()
+    pipeline.set_state(Gst.State.NULL)
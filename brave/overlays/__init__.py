@@ -6,6 +6,12 @@ import brave.exceptions
 import brave.helpers
 logger = brave.helpers.get_logger('overlays')
 
+OVERLAY_TYPES = {
+    'text': TextOverlay,
+    'effect': EffectOverlay,
+    'clock': ClockOverlay
+}
+
 
 class OverlayCollection(AbstractCollection):
     '''
@@ -19,14 +25,9 @@ class OverlayCollection(AbstractCollection):
 
         if 'type' not in args:
             raise brave.exceptions.InvalidConfiguration("Invalid output missing 'type'")
-        elif args['type'] == 'text':
-            overlay = TextOverlay(**args, collection=self)
-        elif args['type'] == 'effect':
-            overlay = EffectOverlay(**args, collection=self)
-        elif args['type'] == 'clock':
-            overlay = ClockOverlay(**args, collection=self)
-        else:
+        elif args['type'] not in OVERLAY_TYPES:
             raise brave.exceptions.InvalidConfiguration("Invalid overlay type '%s'" % args['type'])
+        overlay = OVERLAY_TYPES[args['type']](**args, collection=self)
 
         self._items[args['id']] = overlay
 
@@ -2,6 +2,7 @@
 Standard handling of the 'bus' that each pipeline has.
 '''
 from gi.repository import Gst
+from brave.helpers import native_thread_id
 
 
 def setup_messaging(pipe, parent_object):
@@ -49,10 +50,12 @@ def setup_messaging(pipe, parent_object):
             # logger.info(f"Message full:{str(message.src.message_full())}")
             # logger.info('MESSAGE PARSED:' + message.get_structure().to_string())
         elif t == Gst.MessageType.STREAM_STATUS:
-            pass
+            pass  # Handled by _on_stream_status()
         elif t == Gst.MessageType.ELEMENT:
             # Omit audio from 'level' element as it is very noisy:
-            if message.src.get_factory().name != 'level':
+            if message.src.get_name() == 'level_meter' and hasattr(parent_object, 'on_level_meter'):
+                parent_object.on_level_meter(message.get_structure())
+            elif message.src.get_factory().name != 'level':
                 logger.debug(f'{str(message.src.get_name())} has a message:' + str(message.get_structure().to_string()))
         elif t == Gst.MessageType.DURATION_CHANGED:
             logger.debug(f'Duration changed to ' + str(pipe.query_duration(Gst.Format.TIME).duration) + 'ns')
@@ -74,15 +77,15 @@ def setup_messaging(pipe, parent_object):
             logger.debug(f'Message from GStreamer: {str(message.src.get_name())} has context')
         elif t == Gst.MessageType.BUFFERING:
             buffering_percent = message.parse_buffering()
+            parent_object.metrics.buffering_percent = buffering_percent
             logger.debug('%s has reported %s%% buffering: %s' %
                          (message.src.get_name(), buffering_percent, message.parse_buffering_stats()))
             if hasattr(parent_object, 'on_buffering'):
                 parent_object.on_buffering(buffering_percent)
         elif t == Gst.MessageType.QOS:
-            pass
-            # Also can consider parse_qos_stats() and parse_qos_values()
-            # logger.debug(f'Message from GStreamer: {str(message.src.get_name())} '
-            #               'has sent QOS: {str(message.parse_qos())}')
+            # The stats are running totals of buffers processed and dropped by the element:
+            format, processed, dropped = message.parse_qos_stats()
+            parent_object.metrics.on_qos(message.src.get_name(), processed, dropped)
         elif t == Gst.MessageType.PROPERTY_NOTIFY:
             parsed = message.parse_property_notify()
             logger.debug('Property notify: object="%s", property_name="%s", property_value="%s"' %
@@ -97,6 +100,16 @@ def setup_messaging(pipe, parent_object):
         else:
             logger.info(f'GST UNHANDLED MESSAGE: {str(t)}: {str(message.src)}')
 
+    # Called on the streaming thread that is starting or stopping, so that it can be identified:
+    def _on_stream_status(bus, message):
+        status_type, owner = message.parse_stream_status()
+        if status_type == Gst.StreamStatusType.ENTER:
+            parent_object.metrics.thread_started(native_thread_id())
+        elif status_type == Gst.StreamStatusType.LEAVE:
+            parent_object.metrics.thread_stopped(native_thread_id())
+
     bus = pipe.get_bus()
     bus.add_signal_watch()
     bus.connect('message', _on_message)
+    bus.enable_sync_message_emission()
+    bus.connect('sync-message::stream-status', _on_stream_status)
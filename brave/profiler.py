@@ -0,0 +1,162 @@
+'''
+Optional profiling of each block's pipeline, using GStreamer's 'latency' tracer.
+
+The tracer measures how long each element takes to pass on each buffer (its processing time), and
+how long each buffer takes to travel from the source of a pipeline to its sink. The measurements
+are aggregated over a rolling window, and reported by /api/profile, keyed by block and element.
+
+The tracer logs a record for every buffer passing every element, and each record logged is a call into
+Python. So records are only logged (and measured) for SAMPLE_DURATION seconds in every SAMPLE_INTERVAL;
+the rest of the time, GStreamer discards them itself, as the GST_TRACER category's threshold is NONE.
+'''
+import os
+import re
+import threading
+import time
+from gi.repository import Gst, GObject
+import brave.config as config
+
+# element-latency is measured per element, and latency from the source to the sink of each pipeline:
+TRACERS = 'latency(flags=pipeline+element)'
+
+# How long, in seconds, each sample of the tracer's records lasts, and how often one is taken:
+SAMPLE_DURATION = 1
+SAMPLE_INTERVAL = 5
+
+FIELD_REGEX = re.compile(r'([\w-]+)=\([\w]+\)"?([^,;"]*)"?')
+
+
+def enable_tracers():
+    '''
+    GStreamer reads which tracers to enable when it is initialised, so this must be called before Gst.init().
+    '''
+    if config.profile():
+        os.environ['GST_TRACERS'] = TRACERS
+
+
+class Profiler():
+    '''
+    Collects the output of the GStreamer tracers, as it is logged, while sampling.
+
+    Measurements are kept in buckets of one second, by the ID (address) of the element, so that the
+    work done on the streaming threads is minimal. They are matched to blocks and element names when
+    a report is requested.
+    '''
+
+    def __init__(self, session):
+        self.session = session
+        self._lock = threading.Lock()
+        self._element_latency = {}
+        self._pipeline_latency = {}
+
+        # The category's threshold is set directly, as each call to Gst.debug_set_threshold_for_name()
+        # adds to a list of name patterns that GStreamer keeps (and checks) for as long as it runs:
+        self._tracer_category = next(c for c in Gst.debug_get_all_categories() if c.get_name() == 'GST_TRACER')
+        self._tracer_category.set_threshold(Gst.DebugLevel.NONE)
+
+        # Replace the default log function, so that tracer messages are not also printed:
+        Gst.debug_remove_log_function(None)
+        Gst.debug_add_log_function(self._on_log, None)
+        GObject.timeout_add(SAMPLE_INTERVAL * 1000, self._start_sample)
+
+    def _start_sample(self):
+        self._tracer_category.set_threshold(Gst.DebugLevel.TRACE)
+        GObject.timeout_add(SAMPLE_DURATION * 1000, self._end_sample)
+        return True
+
+    def _end_sample(self):
+        self._tracer_category.set_threshold(Gst.DebugLevel.NONE)
+        return False
+
+    def _on_log(self, category, level, file, function, line, object, message, *user_data):
+        if category.get_name() != 'GST_TRACER':
+            Gst.debug_log_default(category, level, file, function, line, object, message, None)
+            return
+
+        text = message.get()
+        if text.startswith('element-latency,'):
+            fields = dict(FIELD_REGEX.findall(text))
+            self._record(self._element_latency, fields['element-id'], int(fields['time']))
+        elif text.startswith('latency,'):
+            fields = dict(FIELD_REGEX.findall(text))
+            self._record(self._pipeline_latency, fields['sink-element-id'], int(fields['time']))
+
+    def _record(self, measurements, element_id, duration):
+        bucket = int(time.monotonic())
+        with self._lock:
+            buckets = measurements.setdefault(element_id, {})
+            if bucket in buckets:
+                stats = buckets[bucket]
+                stats[0] += 1
+                stats[1] += duration
+                stats[2] = max(stats[2], duration)
+            else:
+                buckets[bucket] = [1, duration, duration]
+                # Forget buckets that have left the window:
+                for old_bucket in [b for b in buckets if b <= bucket - config.profile_window()]:
+                    del buckets[old_bucket]
+
+    def report(self, top=10):
+        '''
+        Returns the measurements within the window, per block and per element, plus the 'top' elements
+        that have spent the most time processing. Must be called on the master thread.
+        '''
+        oldest_bucket = int(time.monotonic()) - config.profile_window()
+        elements = self._elements_by_id()
+        blocks = {}
+        hot_elements = []
+
+        with self._lock:
+            element_latency = self._summarise(self._element_latency, oldest_bucket)
+            pipeline_latency = self._summarise(self._pipeline_latency, oldest_bucket)
+
+        for element_id, stats in element_latency.items():
+            if element_id in elements:
+                block_uid, element_name = elements[element_id]
+                blocks.setdefault(block_uid, {'elements': {}})['elements'][element_name] = stats
+                hot_elements.append({'block': block_uid, 'element': element_name, **stats})
+
+        for element_id, stats in pipeline_latency.items():
+            if element_id in elements:
+                block_uid, element_name = elements[element_id]
+                blocks.setdefault(block_uid, {'elements': {}})['latency'] = {'sink': element_name, **stats}
+
+        hot_elements.sort(key=lambda e: e['total_ms'], reverse=True)
+        return {
+            'window': config.profile_window(),
+            'sampled': '%ds every %ds' % (SAMPLE_DURATION, SAMPLE_INTERVAL),
+            'blocks': blocks,
+            'top': hot_elements[:top]
+        }
+
+    def _summarise(self, measurements, oldest_bucket):
+        summary = {}
+        for element_id, buckets in measurements.items():
+            recent = [stats for bucket, stats in buckets.items() if bucket > oldest_bucket]
+            count = sum(stats[0] for stats in recent)
+            if count > 0:
+                total = sum(stats[1] for stats in recent)
+                summary[element_id] = {
+                    'count': count,
+                    'total_ms': total / Gst.MSECOND,
+                    'mean_ms': total / count / Gst.MSECOND,
+                    'max_ms': max(stats[2] for stats in recent) / Gst.MSECOND
+                }
+        return summary
+
+    def _elements_by_id(self):
+        '''
+        Returns a dictionary of every element's ID (as the tracer logs it) to its block's uid and its name.
+        '''
+        elements = {}
+        for collection in [self.session.inputs, self.session.mixers, self.session.outputs]:
+            for block in list(collection.values()):
+                if not hasattr(block, 'pipeline'):
+                    continue
+
+                def handle_element(element, block_uid):
+                    # PyGObject hashes an object by its address, which is what the tracer logs as the ID:
+                    elements['0x%x' % hash(element)] = (block_uid, element.get_name())
+
+                block.pipeline.iterate_recurse().foreach(handle_element, block.uid)
+        return elements
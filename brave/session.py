@@ -1,6 +1,8 @@
 import os
 import sys
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 import brave.exceptions
 import brave.config_file
 from brave.helpers import get_logger
@@ -10,9 +12,15 @@ from brave.outputs import OutputCollection
 from brave.overlays import OverlayCollection
 from brave.mixers import MixerCollection
 from brave.connections import ConnectionCollection
+from brave.outputs.encoder_group import EncoderGroupCollection
+from brave.profiler import Profiler
+from brave.metrics import CpuSampler
+from brave.cluster import Cluster
+from brave.level_meters import LevelMeters
 import brave.config as config
 assert Gst.VERSION_MINOR > 13, f'GStreamer is version 1.{Gst.VERSION_MINOR}, must be 1.14 or higher'
 PERIODIC_MESSAGE_FREQUENCY = 60
+WORKER_CHECK_FREQUENCY = 1
 singleton = None
 
 
@@ -26,16 +34,26 @@ class Session(object):
         self.items_recently_updated = []
         self.items_recently_deleted = []
 
+        # Functions called (on the thread that made the change) whenever there are updates to tell the user about:
+        self.items_updated_listeners = []
+
         self.inputs = InputCollection(self)
         self.outputs = OutputCollection(self)
         self.overlays = OverlayCollection(self)
         self.mixers = MixerCollection(self)
         self.connections = ConnectionCollection(self)
+        self.encoder_groups = EncoderGroupCollection(self)
+        self.profiler = Profiler(self) if config.profile() else None
+        self.cluster = Cluster(self) if config.peers() else None
+        self.level_meters = LevelMeters(self)
 
     def start(self):
         self._setup_initial_inputs_outputs_mixers_and_overlays()
+        self.cpu_sampler = CpuSampler(self)
         self.mainloop = GObject.MainLoop()
         GObject.timeout_add(PERIODIC_MESSAGE_FREQUENCY * 1000, self.periodic_message)
+        GObject.timeout_add(WORKER_CHECK_FREQUENCY * 1000, self.check_workers)
+        GObject.timeout_add(int(1000 / config.level_meter_rate()), self.level_meters.send_levels)
         self.mainloop.run()
         self.logger.debug('Mainloop has ended')
 
@@ -52,6 +70,14 @@ class Session(object):
         for block_collection in [self.inputs, self.mixers, self.outputs]:
             for name, block in block_collection.items():
                 block.set_pipeline_state(Gst.State.NULL)
+        for name, input in self.inputs.items():
+            if hasattr(input, 'worker'):
+                input.worker.stop(wait=True)
+        for name, output in self.outputs.items():
+            for worker in getattr(output, 'workers', []):
+                worker.stop(wait=True)
+        if self.cluster is not None:
+            self.cluster.end()
         if hasattr(self, 'mainloop'):
             self.mainloop.quit()
 
@@ -75,15 +101,24 @@ class Session(object):
         '''
         Create the inputs/outputs/mixers/overlays declared in the config file.
         '''
-        for mixer_config in config.mixers():
-            self.mixers.add(**mixer_config)
+        start = time.monotonic()
+
+        # Mixers and inputs do not depend on anything else, so can be created in parallel:
+        timings = self._create_blocks_in_parallel(self.mixers, config.mixers(),
+                                                  lambda mixer_config: self.mixers.add(**mixer_config))
 
-        for input_config in config.inputs():
+        def create_input(input_config):
             input = self.inputs.add(**input_config)
             input.setup()
+            return input
+
+        timings.update(self._create_blocks_in_parallel(self.inputs, config.inputs(), create_input))
 
+        # Outputs connect to their source, and may share an encoder, as they are created, so are created in turn:
         for output_config in config.outputs():
-            self.outputs.add(**output_config)
+            output_start = time.monotonic()
+            output = self.outputs.add(**output_config)
+            timings[output.uid] = time.monotonic() - output_start
 
         for id, mixer in self.mixers.items():
             mixer.setup_sources()
@@ -92,6 +127,41 @@ class Session(object):
             for overlay_config in config.overlays():
                 self.overlays.add(**overlay_config)
 
+        for uid, seconds in timings.items():
+            self.logger.info('Startup: created %s in %.3fs' % (uid, seconds))
+        self.logger.info('Startup: created %d blocks in %.3fs' % (len(timings), time.monotonic() - start))
+
+    def _create_blocks_in_parallel(self, collection, configs, create):
+        '''
+        Creates blocks from their config, using up to 'startup_threads' worker threads, as creating each
+        block's pipeline can be slow. The threads only construct the blocks; each is then started (i.e. its
+        state changed) on the master thread. Returns a dictionary of the time taken to create each block, by uid.
+        '''
+        configs = collection.assign_ids(configs)
+        timings = {}
+
+        def create_and_time(block_config):
+            block_start = time.monotonic()
+            block = create(block_config)
+            timings[block.uid] = time.monotonic() - block_start
+
+        collection.state_changes_deferred = True
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, config.startup_threads())) as executor:
+                futures = [executor.submit(create_and_time, block_config) for block_config in configs]
+            for future in futures:
+                # Raises any error from creating the block:
+                future.result()
+        finally:
+            collection.state_changes_deferred = False
+
+        # Blocks are added as they are completed, so are put back in the order of the config file:
+        ids = [block_config['id'] for block_config in configs]
+        collection.put_in_order(ids)
+        for id in ids:
+            collection[id]._consider_changing_state()
+        return {collection[id].uid: timings[collection[id].uid] for id in ids}
+
     def print_state_summary(self):
         '''
         Prints the state of all elements to STDOUT.
@@ -106,6 +176,19 @@ class Session(object):
         self.logger.debug('...state will print out every %d seconds...' % PERIODIC_MESSAGE_FREQUENCY)
         GObject.timeout_add(PERIODIC_MESSAGE_FREQUENCY * 1000, self.periodic_message)
 
+    def check_workers(self):
+        '''
+        Supervises the worker processes (of inputs that run separately, and the egress workers of outputs),
+        restarting any that have exited.
+        '''
+        for name, input in list(self.inputs.items()):
+            if hasattr(input, 'worker'):
+                input.worker.check()
+        for name, output in list(self.outputs.items()):
+            for worker in getattr(output, 'workers', []):
+                worker.check()
+        return True
+
     def uid_to_block(self, uid, error_if_not_exists=False):
         '''
         Given a UID (e.g. 'input2') returns the instance of the relevant block.
@@ -138,8 +221,17 @@ class Session(object):
 
         return collection[id] if id in collection else None
 
+    def report_updated_item(self, item):
+        self.items_recently_updated.append(item)
+        self._notify_items_updated()
+
     def report_deleted_item(self, item):
         self.items_recently_deleted.append({'id': item.id, 'block_type': item.input_output_overlay_or_mixer()})
+        self._notify_items_updated()
+
+    def _notify_items_updated(self):
+        for listener in self.items_updated_listeners:
+            listener()
 
 
 def init():
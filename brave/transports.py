@@ -0,0 +1,233 @@
+'''
+A transport carries audio or video from one pipeline to another (e.g. from an input to a mixer).
+Every Connection has one transport.
+
+On the source pipeline, the transport provides the 'intersink'; on the destination pipeline
+it provides the 'intersrc'. (The names come from the intervideosink/intervideosrc elements,
+which are the default transport.)
+'''
+import os
+import tempfile
+from gi.repository import Gst
+from brave.helpers import create_intersink_channel_name
+import brave.exceptions
+
+
+class Transport():
+    '''
+    An abstract superclass representing a transport.
+    '''
+
+    # True if the buffers keep the timestamps they were given on the source pipeline:
+    preserves_timestamps = False
+
+    @classmethod
+    def intersrc_string(cls, audio_or_video):
+        '''
+        The intersrc as a pipeline string, for destinations (outputs) that create it themselves.
+        The final element must be named 'intervideosrc' or 'interaudiosrc'.
+        '''
+        pass  # overwritten by subclass
+
+    def create_intersrc(self, audio_or_video, add_element):
+        '''
+        Create the intersrc, using the provided add_element(factory_name, name=None) function
+        to add each element to the destination pipeline. Returns the final element.
+        '''
+        pass  # overwritten by subclass
+
+    def create_intersink(self, audio_or_video, add_element):
+        '''
+        Create the intersink, using the provided add_element(factory_name, name=None) function
+        to add each element to the source pipeline. Returns the first and final elements.
+        '''
+        pass  # overwritten by subclass
+
+    def pair(self, audio_or_video, intersink, intersrc):
+        '''
+        Pair an intersink with an intersrc so that content flows from one to the other.
+        '''
+        pass  # overwritten by subclass
+
+    def start(self, audio_or_video, intersink, intersrc):
+        '''
+        Called when both the source and destination pipelines have started.
+        '''
+        self.update_timing(audio_or_video, intersink, intersrc)
+
+    def update_timing(self, audio_or_video, intersink, intersrc):
+        '''
+        If timestamps are preserved, they are relative to the source pipeline's base time.
+        The intersrc's pad offset adjusts them to be relative to the destination's base time instead.
+        (This assumes both pipelines use the same clock, which is the system clock by default.)
+        '''
+        if not self.preserves_timestamps:
+            return
+        source_base_time, dest_base_time = intersink.get_base_time(), intersrc.get_base_time()
+        intersrc.get_static_pad('src').set_offset(source_base_time - dest_base_time)
+
+
+class InterTransport(Transport):
+    '''
+    Uses intervideosink/intervideosrc and interaudiosink/interaudiosrc.
+    These re-timestamp the content, and the intervideosrc duplicates or drops frames as needed,
+    which makes them very tolerant of the source stopping, starting or changing framerate.
+    '''
+
+    name = 'inter'
+
+    # The intervideosrc is asked to hold the frame for 24 hours (basically, a very long time)
+    # This is optional, but prevents it from going black when it's better to show the last frame.
+    VIDEO_TIMEOUT = Gst.SECOND * 60 * 60 * 24
+
+    @classmethod
+    def intersrc_string(cls, audio_or_video):
+        if audio_or_video == 'video':
+            return 'intervideosrc name=intervideosrc timeout=%d' % cls.VIDEO_TIMEOUT
+        return 'interaudiosrc name=interaudiosrc'
+
+    def create_intersrc(self, audio_or_video, add_element):
+        element = add_element('inter%ssrc' % audio_or_video)
+        if audio_or_video == 'video':
+            element.set_property('timeout', self.VIDEO_TIMEOUT)
+        return element
+
+    def create_intersink(self, audio_or_video, add_element):
+        element = add_element('inter%ssink' % audio_or_video)
+        return element, element
+
+    def pair(self, audio_or_video, intersink, intersrc):
+        # Give the 'inter' elements a channel name. It doesn't matter what, so long as they're unique.
+        channel_name = create_intersink_channel_name()
+        intersink.set_property('channel', channel_name)
+        intersrc.set_property('channel', channel_name)
+
+
+class ProxyTransport(Transport):
+    '''
+    Uses proxysink/proxysrc, which pass buffers, events and queries directly to the other pipeline.
+    '''
+
+    name = 'proxy'
+    preserves_timestamps = True
+
+    @classmethod
+    def intersrc_string(cls, audio_or_video):
+        return 'proxysrc name=inter%ssrc' % audio_or_video
+
+    def create_intersrc(self, audio_or_video, add_element):
+        return add_element('proxysrc')
+
+    def create_intersink(self, audio_or_video, add_element):
+        element = add_element('proxysink')
+        return element, element
+
+    def pair(self, audio_or_video, intersink, intersrc):
+        intersrc.set_property('proxysink', intersink)
+
+
+class AppTransport(Transport):
+    '''
+    Uses appsink/appsrc. Each sample is handed from one to the other without being copied.
+    '''
+
+    name = 'app'
+    preserves_timestamps = True
+
+    @classmethod
+    def intersrc_string(cls, audio_or_video):
+        return 'appsrc name=inter%ssrc format=time is-live=true' % audio_or_video
+
+    def create_intersrc(self, audio_or_video, add_element):
+        element = add_element('appsrc')
+        element.set_property('format', Gst.Format.TIME)
+        element.set_property('is-live', True)
+        return element
+
+    def create_intersink(self, audio_or_video, add_element):
+        element = add_element('appsink')
+        element.set_property('emit-signals', True)
+        element.set_property('sync', False)
+        # If the destination cannot keep up, it should get the latest sample, not an old one:
+        element.set_property('max-buffers', 1)
+        element.set_property('drop', True)
+        return element, element
+
+    def pair(self, audio_or_video, intersink, intersrc):
+        intersink.connect('new-sample', self._on_new_sample, intersrc)
+
+    def _on_new_sample(self, appsink, appsrc):
+        sample = appsink.emit('pull-sample')
+        if sample:
+            appsrc.emit('push-sample', sample)
+
+        # Always OK, so that a destination that is not running does not cause the source to fail:
+        return Gst.FlowReturn.OK
+
+
+class ShmTransport(Transport):
+    '''
+    Uses shmsink/shmsrc, passing the content via shared memory.
+    The content is wrapped in GDP (gdppay/gdpdepay) so that caps and timestamps are carried too.
+    '''
+
+    name = 'shm'
+    preserves_timestamps = True
+
+    @classmethod
+    def intersrc_string(cls, audio_or_video):
+        return 'shmsrc name=inter%ssrc_shmsrc is-live=true ! gdpdepay name=inter%ssrc' % \
+            (audio_or_video, audio_or_video)
+
+    def create_intersrc(self, audio_or_video, add_element):
+        shmsrc = add_element('shmsrc')
+        shmsrc.set_property('is-live', True)
+        gdpdepay = add_element('gdpdepay')
+        shmsrc.link(gdpdepay)
+        return gdpdepay
+
+    def create_intersink(self, audio_or_video, add_element):
+        gdppay = add_element('gdppay')
+        shmsink = add_element('shmsink')
+        shmsink.set_property('wait-for-connection', False)
+        shmsink.set_property('sync', False)
+        gdppay.link(shmsink)
+        return gdppay, shmsink
+
+    def pair(self, audio_or_video, intersink, intersrc):
+        socket_path = os.path.join(tempfile.gettempdir(),
+                                   'brave-%d-%s' % (os.getpid(), create_intersink_channel_name()))
+        intersink.set_property('socket-path', socket_path)
+        shmsrc = self._shmsrc(intersrc)
+        shmsrc.set_property('socket-path', socket_path)
+
+        # The shmsrc fails if it starts before the shmsink has created the socket.
+        # So it is kept stopped until start() is called.
+        shmsrc.set_locked_state(True)
+
+    def start(self, audio_or_video, intersink, intersrc):
+        shmsrc = self._shmsrc(intersrc)
+        if shmsrc.is_locked_state():
+            shmsrc.set_locked_state(False)
+            shmsrc.sync_state_with_parent()
+        super().start(audio_or_video, intersink, intersrc)
+
+    def _shmsrc(self, gdpdepay):
+        return gdpdepay.get_static_pad('sink').get_peer().get_parent_element()
+
+
+TRANSPORTS = {t.name: t for t in [InterTransport, ProxyTransport, AppTransport, ShmTransport]}
+
+
+def get_transport_class(name):
+    '''
+    Given a transport name (e.g. 'inter'), returns the Transport class.
+    '''
+    if name not in TRANSPORTS:
+        raise brave.exceptions.InvalidConfiguration(
+            'Invalid transport "%s", must be one of: %s' % (name, ', '.join(TRANSPORTS.keys())))
+    return TRANSPORTS[name]
+
+
+def create_transport(name):
+    return get_transport_class(name)()
@@ -0,0 +1,208 @@
+'''
+Worker processes: parts of Brave that run in a separate process, so that they can use other CPU cores
+(without competing for the GIL), and so that a crash does not affect the rest of Brave.
+
+A worker is started with some Python code, and passed a JSON 'spec' saying what to do. The two processes
+talk over the worker's stdin and stdout, with one JSON message per line. Audio and video are passed between
+them via shared memory (shmsink/shmsrc, wrapped in GDP so that caps and timestamps are carried too).
+If a worker exits, the Session restarts it.
+
+See brave/inputs/worker.py and brave/outputs/webrtc_worker.py.
+'''
+import json
+import os
+import subprocess
+import sys
+import time
+from gi.repository import Gst, GLib
+import brave.config as config
+import brave.helpers
+
+BRAVE_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# A worker that exits is restarted after a delay, which doubles (up to a maximum) each time it fails quickly:
+RESTART_DELAY = 1
+MAX_RESTART_DELAY = 30
+STABLE_PERIOD = 60
+
+STOP_TIMEOUT = 5
+READ_SIZE = 65536
+
+
+class WorkerProcess():
+    '''
+    Starts, stops and talks to a worker process. Subclasses provide the spec to start it with,
+    and handle the messages that it sends.
+    '''
+
+    def __init__(self, command, logger):
+        self.command = command
+        self.logger = logger
+        self.process = None
+        self.restarts = 0
+        self._stopping = False
+        self._restart_at = None
+        self._quick_failures = 0
+
+    def spec(self):
+        '''
+        The spec (a dictionary, sent as JSON) that the worker is started with.
+        '''
+        pass  # overwritten by subclass
+
+    def on_message(self, message):
+        '''
+        Called (on the master thread) with each message from the worker.
+        '''
+        pass
+
+    def on_exit(self):
+        '''
+        Called (on the master thread) when the worker has exited unexpectedly. It will be restarted.
+        '''
+        pass
+
+    def start(self):
+        python_path = [BRAVE_DIRECTORY] + ([os.environ['PYTHONPATH']] if 'PYTHONPATH' in os.environ else [])
+        self.process = subprocess.Popen([sys.executable, '-c', self.command, json.dumps(self.spec())],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        env={**os.environ, 'PYTHONPATH': os.pathsep.join(python_path)})
+        self.started_at = time.monotonic()
+        GLib.io_add_watch(self.process.stdout.fileno(), GLib.PRIORITY_DEFAULT,
+                          GLib.IOCondition.IN | GLib.IOCondition.HUP, self._on_output, self.process, bytearray())
+        self.logger.info('Started worker process %d' % self.process.pid)
+
+    def stop(self, wait=False):
+        '''
+        Stops the worker. Closing its stdin asks it to end; it is killed if it has not after STOP_TIMEOUT seconds.
+        This does not block the master thread, unless 'wait' is set (for when Brave is ending, and so the main
+        loop will not run again).
+        '''
+        self._stopping = True
+        if self.process is None:
+            return
+        process, self.process = self.process, None
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+        if wait:
+            try:
+                process.wait(timeout=STOP_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                pass
+            self._kill_if_running(process)
+        else:
+            GLib.timeout_add(STOP_TIMEOUT * 1000, self._kill_if_running, process)
+
+    def _kill_if_running(self, process):
+        if process.poll() is None:
+            self.logger.warning('Worker process %d did not end, so killing it' % process.pid)
+            process.kill()
+            process.wait()
+        return False
+
+    def check(self):
+        '''
+        Called periodically by the Session, to restart the worker if it has exited.
+        '''
+        if self._stopping:
+            return
+
+        if self.process is not None and self.process.poll() is not None:
+            self.logger.warning('Worker process %d exited with code %d' % (self.process.pid, self.process.returncode))
+            ran_for = time.monotonic() - self.started_at
+            self._quick_failures = 0 if ran_for > STABLE_PERIOD else self._quick_failures + 1
+            delay = min(MAX_RESTART_DELAY, RESTART_DELAY * 2 ** max(0, self._quick_failures - 1))
+            self._restart_at = time.monotonic() + delay
+            self.process = None
+            self.on_exit()
+
+        if self.process is None and self._restart_at is not None and time.monotonic() >= self._restart_at:
+            self._restart_at = None
+            self.restarts += 1
+            self.start()
+
+    def send(self, message):
+        '''
+        Sends a message to the worker. Must be called on the master thread.
+        '''
+        if self.process is None or self.process.poll() is not None:
+            return
+        try:
+            self.process.stdin.write((json.dumps(message) + '\n').encode())
+            self.process.stdin.flush()
+        except OSError as e:
+            # It will be restarted by check():
+            self.logger.warning('Unable to send to worker process %d: %s' % (self.process.pid, e))
+
+    def _on_output(self, fd, condition, process, pending):
+        if process is not self.process:
+            return False
+        messages = read_messages(fd, pending)
+        if messages is None:
+            return False
+        for message in messages:
+            self.on_message(message)
+        return True
+
+
+def config_for_worker():
+    '''
+    The config that a worker is started with. Blocks are not created from the config in a worker,
+    and profiling and clustering are only done by the main process.
+    '''
+    return {key: value for key, value in config.raw().items()
+            if key not in ['inputs', 'outputs', 'overlays', 'mixers', 'profile', 'peers']}
+
+
+def init_worker_process():
+    '''
+    Called at the start of a worker process. Returns the spec it was started with, and the file
+    to send messages to the main process on.
+    '''
+    spec = json.loads(sys.argv[1])
+
+    # Messages are sent on stdout, so anything else that is written there (e.g. by GStreamer) goes to stderr:
+    messages_out = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    config.init_from_dict(spec['config'])
+    return spec, messages_out
+
+
+def read_messages(fd, pending):
+    '''
+    Reads what is available from the file descriptor, returning the JSON messages (one per line) within it,
+    or None if it has closed. 'pending' holds any partial line until the rest of it is read.
+    '''
+    data = os.read(fd, READ_SIZE)
+    if not data:
+        return None
+    pending.extend(data)
+    *lines, remainder = pending.split(b'\n')
+    pending[:] = remainder
+
+    messages = []
+    for line in lines:
+        try:
+            messages.append(json.loads(line.decode()))
+        except ValueError:
+            brave.helpers.get_logger('worker').warning('Invalid message from other process: %s' % line)
+    return messages
+
+
+def add_shmsink(tee, socket_path):
+    '''
+    Sends what leaves the tee to shared memory, for another process to read with shmsrc.
+    '''
+    # A process that did not end cleanly may have left its socket behind, which would stop the shmsink starting:
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    bin = Gst.parse_bin_from_description('queue ! gdppay ! shmsink name=shmsink wait-for-connection=false sync=false',
+                                         True)
+    bin.get_by_name('shmsink').set_property('socket-path', socket_path)
+    tee.parent.add(bin)
+    tee.link(bin)
+    bin.sync_state_with_parent()
@@ -147,7 +147,8 @@ preview.updateAudioLevels = function() {
     var audioLevels = document.getElementById("audio_levels");
     if (audioLevels === null) return;
     var context = audioLevels.getContext("2d");
-    var channels = websocket.volume.channels;
+    var levels = websocket.levels['output' + preview.outputId];
+    var channels = levels ? levels.peak.length : 0;
     var channel;
     var margin = 2;
     var width = 80;
@@ -164,11 +165,9 @@ preview.updateAudioLevels = function() {
     context.clearRect(0,0, width, height);
 
     for (channel = 0; channel < channels; channel++) {
-        var audioData = JSON.parse(websocket.volume.data[channel]);
-
-        var rms = preview._normaliseDb(audioData.rms) * height;
-        peak = preview._normaliseDb(audioData.peak) * height;
-        var decay = preview._normaliseDb(audioData.decay) * height;
+        var rms = preview._normaliseDb(levels.rms[channel]) * height;
+        peak = preview._normaliseDb(levels.peak[channel]) * height;
+        var decay = preview._normaliseDb(levels.decay[channel]) * height;
 
         var x = (channel * channelWidth) + (channel * margin);
 
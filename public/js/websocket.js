@@ -4,7 +4,7 @@
 
 websocket = {
     setupErrorCount: 0,
-    volume: {channels: 0, data: [] },
+    levels: {},
 }
 
 websocket.setup = function() {
@@ -20,6 +20,7 @@ websocket.setup = function() {
 
 websocket._onSocketOpen = event => {
     websocket.setupErrorCount = 0
+    websocket.lastSeq = null
 }
 
 websocket._onSocketError = event => {
@@ -42,6 +43,15 @@ websocket._onSocketClose = event => {
 
 websocket._onMessageReceived = event => {
     dataParsed = JSON.parse(event.data)
+    if (dataParsed.seq !== undefined) {
+        // A gap in the sequence numbers means a message was missed, so ask for everything again:
+        var missedMessage = websocket.lastSeq !== null && dataParsed.seq !== websocket.lastSeq + 1
+        websocket.lastSeq = dataParsed.seq
+        if (missedMessage) {
+            websocket.requestResync()
+            return
+        }
+    }
     if (dataParsed.msg_type === 'ping') {
         if (dataParsed.cpu_percent) {
             websocket._setCpuPercent(dataParsed.cpu_percent)
@@ -51,15 +61,18 @@ websocket._onMessageReceived = event => {
     else if (dataParsed.msg_type === 'update') {
         websocket._handleUpdate(dataParsed)
     }
+    else if (dataParsed.msg_type === 'patch') {
+        websocket._handlePatch(dataParsed)
+    }
     else if (dataParsed.msg_type === 'delete') {
         websocket._handleDelete(dataParsed)
     }
     else if (dataParsed.msg_type === 'webrtc-initialising') {
         if (dataParsed.ice_servers) webrtc.setIceServers(dataParsed.ice_servers)
     }
-    else if (dataParsed.msg_type === 'volume') {
-        websocket.volume.channels = dataParsed.channels;
-        websocket.volume.data = dataParsed.data;
+    else if (dataParsed.msg_type === 'levels') {
+        // Only blocks that have been measured since the last message are included:
+        Object.assign(websocket.levels, dataParsed.levels);
     }
     else if (dataParsed.sdp != null) {
         webrtc.onIncomingSDP(dataParsed.sdp);
@@ -95,7 +108,36 @@ websocket._handleUpdate = function(item) {
     }
 }
 
+websocket._handlePatch = function(item) {
+    var handler = websocket._getHandlerForBlockType(item.block_type)
+    if (!handler) return
+    var block = handler.items.find(x => x.id == item.id)
+    if (!block) {
+        websocket.requestResync()
+        return
+    }
+    item.patch.forEach(operation => websocket._applyPatchOperation(block, operation))
+    drawAllItems()
+}
+
+websocket._applyPatchOperation = function(obj, operation) {
+    var keys = operation.path.split('/').slice(1).map(k => k.replace(/~1/g, '/').replace(/~0/g, '~'))
+    var lastKey = keys.pop()
+    keys.forEach(k => { obj = obj[k] })
+    if (operation.op === 'remove') {
+        delete obj[lastKey]
+    }
+    else {
+        obj[lastKey] = operation.value
+    }
+}
+
+websocket.requestResync = function() {
+    websocket.socket.send(JSON.stringify({msg_type: 'resync'}))
+}
+
 websocket._handleDelete = function(item) {
+    delete websocket.levels[item.block_type + item.id]
     var handler = websocket._getHandlerForBlockType(item.block_type)
     if (handler) {
         handler.items = handler.items.filter(x => x.id != item.id)
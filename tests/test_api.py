@@ -28,3 +28,153 @@ def test_missing_type(run_brave):
     assert response.status_code == 400
     print('text=', response.text)
     assert "input missing 'type'" in response.json()['error']
+
+
+def test_etag(run_brave):
+    run_brave()
+    response = api_get('/api/all')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    # Nothing has changed, so the client's copy is up to date:
+    response = api_get('/api/all', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    # After a change, the new version is returned straightaway:
+    add_input({'type': 'test_video'})
+    response = api_get('/api/all', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert len(response.json()['inputs']) == 1
+
+
+def test_batch(run_brave):
+    run_brave()
+    response = api_post('/api/batch', {'operations': [
+        {'method': 'PUT', 'path': '/api/inputs', 'body': {'type': 'test_video', 'pattern': 4}},
+        {'method': 'PUT', 'path': '/api/mixers', 'body': {}},
+        {'method': 'POST', 'path': '/api/mixers/1/overlay_source', 'body': {'uid': 'input1', 'zorder': 2}},
+        {'method': 'POST', 'path': '/api/mixers/1', 'body': {'pattern': 1}}
+    ]})
+    assert response.status_code == 200, response.text
+    results = response.json()['results']
+    assert [r['status'] for r in results] == [200, 200, 200, 200]
+    assert results[0]['response']['uid'] == 'input1'
+    time.sleep(1)
+    assert_mixers([{'pattern': 1, 'sources': [{'uid': 'input1', 'in_mix': True, 'zorder': 2}]}])
+
+
+def test_invalid_batch_makes_no_changes(run_brave):
+    run_brave()
+    response = api_post('/api/batch', {'operations': [
+        {'method': 'PUT', 'path': '/api/inputs', 'body': {'type': 'test_video'}},
+        {'method': 'POST', 'path': '/api/outputs/99', 'body': {}}
+    ]})
+    assert response.status_code == 400
+    assert 'Operation 1 is invalid' in response.json()['error']
+    assert len(api_get('/api/inputs').json()) == 0
+
+
+def test_batch_with_invalid_props_makes_no_changes(run_brave):
+    run_brave()
+    add_input({'type': 'test_video'})
+    for bad_operation in [
+        {'method': 'PUT', 'path': '/api/outputs', 'body': {'type': 'image', 'not_a_prop': 1}},
+        {'method': 'POST', 'path': '/api/inputs/1', 'body': {'pattern': 'not a number'}},
+        {'method': 'POST', 'path': '/api/inputs/1', 'body': {'state': 'NOT_A_STATE'}},
+        {'method': 'POST', 'path': '/api/inputs/1', 'body': {'separate_process': True}}
+    ]:
+        response = api_post('/api/batch', {'operations': [
+            {'method': 'POST', 'path': '/api/inputs/1', 'body': {'pattern': 4}},
+            bad_operation
+        ]})
+        assert response.status_code == 400, bad_operation
+        assert 'Operation 1 is invalid' in response.json()['error']
+    assert_inputs([{'type': 'test_video', 'id': 1, 'pattern': 0}])
+    assert len(api_get('/api/outputs').json()) == 0
+
+
+def test_metrics(run_brave):
+    run_brave()
+    add_input({'type': 'test_video'})
+    time.sleep(1)
+    response = api_get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['Content-Type'].startswith('text/plain')
+    assert 'brave_block_playing{block="input1",type="test_video"} 1' in response.text
+    assert '# TYPE brave_block_state_changes_total counter' in response.text
+
+
+def test_profile(run_brave, create_config_file):
+    config = {'profile': True, 'mixers': [{}], 'inputs': [{'type': 'test_video'}]}
+    run_brave(create_config_file(config).name)
+    # Long enough for the first sample to have been taken:
+    time.sleep(7)
+    response = api_get('/api/profile?top=2')
+    assert response.status_code == 200, response.text
+    profile = response.json()
+    assert len(profile['top']) == 2
+    assert 'input1' in profile['blocks']
+    assert len(profile['blocks']['input1']['elements']) > 0
+
+
+def test_profile_when_not_enabled(run_brave):
+    run_brave()
+    response = api_get('/api/profile')
+    assert response.status_code == 400
+    assert 'Profiling is not enabled' in response.json()['error']
+
+
+def test_cpu_usage_per_block(run_brave):
+    run_brave()
+    add_input({'type': 'test_video'})
+    time.sleep(6)
+    input = api_get('/api/inputs').json()[0]
+    assert input['threads'] > 0
+    assert input['cpu_percent'] is not None
+
+
+def test_update_config(run_brave):
+    run_brave()
+    add_input({'type': 'test_video'})
+    time.sleep(1)
+    response = api_put('/api/config', {
+        'mixers': [{'pattern': 4, 'sources': [{'uid': 'input1'}]}],
+        'inputs': [{'type': 'test_video', 'pattern': 5}, {'type': 'test_video'}]
+    })
+    assert response.status_code == 200, response.text
+    assert all(r['status'] == 200 for r in response.json()['results'])
+    time.sleep(2)
+    assert_inputs([{'type': 'test_video', 'id': 1, 'pattern': 5}, {'type': 'test_video', 'id': 2}])
+    assert_mixers([{'id': 1, 'pattern': 4, 'sources': [{'uid': 'input1', 'in_mix': True}]}])
+
+    # Applying the same config again changes nothing:
+    response = api_put('/api/config', {
+        'mixers': [{'pattern': 4, 'sources': [{'uid': 'input1'}]}],
+        'inputs': [{'type': 'test_video', 'pattern': 5}, {'type': 'test_video'}]
+    })
+    assert response.json()['operations'] == []
+
+
+def test_update_config_recreating_a_mixer_reconnects_what_uses_it(run_brave):
+    run_brave()
+    config = {
+        'inputs': [{'type': 'test_video'}],
+        'mixers': [{'sources': [{'uid': 'input1'}]}],
+        'outputs': [{'type': 'image', 'source': 'mixer1'}],
+        'overlays': [{'type': 'text', 'text': 'Hello', 'source': 'mixer1', 'visible': True}]
+    }
+    response = api_put('/api/config', config)
+    assert response.status_code == 200, response.text
+    time.sleep(2)
+
+    # 'level_meter' cannot be updated, so the mixer is deleted and created again:
+    config['mixers'][0]['level_meter'] = True
+    response = api_put('/api/config', config)
+    assert response.status_code == 200, response.text
+    assert all(r['status'] == 200 for r in response.json()['results'])
+    time.sleep(2)
+
+    assert_mixers([{'id': 1, 'level_meter': True, 'sources': [{'uid': 'input1', 'in_mix': True}]}])
+    assert_outputs([{'type': 'image', 'id': 1, 'source': 'mixer1'}])
+    assert_overlays([{'type': 'text', 'id': 1, 'source': 'mixer1', 'visible': True}])
@@ -0,0 +1,59 @@
+import time, pytest, inspect
+from utils import *
+
+PEER_PORT = 5001
+
+
+def test_output_on_another_node(run_brave, create_config_file):
+    peer_config_file = create_config_file({'api_port': PEER_PORT, 'enable_audio': False})
+    run_brave(peer_config_file.name)
+
+    config = {
+        'enable_audio': False,
+        'peers': {'peer1': 'http://127.0.0.1:%d' % PEER_PORT},
+        'cluster_host': '127.0.0.1',
+        'inputs': [{'type': 'test_video'}],
+        'mixers': [{'sources': [{'uid': 'input1'}]}]
+    }
+    config_file = create_config_file(config)
+    run_brave(config_file.name)
+    time.sleep(2)
+    check_brave_is_running()
+
+    add_output({'type': 'image', 'source': 'mixer1', 'node': 'peer1'})
+    time.sleep(6)
+
+    # The output is shown by this Brave, in the state that it has on the peer:
+    outputs = api_get('/api/outputs').json()
+    remote_output = [o for o in outputs if o['id'] == 1][0]
+    assert remote_output['node'] == 'peer1'
+    assert remote_output['source'] == 'mixer1'
+    assert remote_output['state'] == 'PLAYING'
+    assert remote_output['remote']['uid'] == 'output1'
+
+    # The content is sent to the peer via a TCP output:
+    link_outputs = [o for o in outputs if o['id'] >= 10000]
+    assert len(link_outputs) == 1
+    assert link_outputs[0]['type'] == 'tcp'
+    assert link_outputs[0]['source'] == 'mixer1'
+
+    peer_inputs = api_get('/api/inputs', port=PEER_PORT).json()
+    peer_outputs = api_get('/api/outputs', port=PEER_PORT).json()
+    assert len(peer_inputs) == 1 and peer_inputs[0]['type'] == 'tcp_client'
+    assert len(peer_outputs) == 1 and peer_outputs[0]['type'] == 'image'
+    assert peer_outputs[0]['source'] == peer_inputs[0]['uid']
+    assert_everything_in_playing_state(port=PEER_PORT)
+
+    # The link is not part of the config:
+    config_response = yaml.load(api_get('/api/config/current.yaml').text)
+    assert [o['type'] for o in config_response['outputs']] == ['image']
+
+    # Unknown nodes are rejected:
+    add_output({'type': 'image', 'source': 'mixer1', 'node': 'not_a_peer'}, 400)
+
+    # Deleting the output deletes it, and the link, from the peer:
+    delete_output(1)
+    time.sleep(2)
+    assert api_get('/api/outputs').json() == []
+    assert api_get('/api/outputs', port=PEER_PORT).json() == []
+    assert api_get('/api/inputs', port=PEER_PORT).json() == []
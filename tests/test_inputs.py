@@ -55,3 +55,50 @@ def test_inputs(run_brave):
     # Removing a non-existant input causes a user error
     delete_input(55, expected_status_code=400) # Does not exist
     assert_inputs([{'type': 'test_audio', 'id': 1}])
+
+
+def test_test_video_with_timestamp_marker(run_brave):
+    run_brave()
+    add_input({'type': 'test_video', 'timestamp_marker': True})
+    time.sleep(2)
+    assert_inputs([{'type': 'test_video', 'id': 1, 'timestamp_marker': True}])
+
+    # The marker cannot be added or removed once created:
+    update_input(1, {'timestamp_marker': False}, 400)
+
+
+def test_input_in_separate_process(run_brave):
+    run_brave()
+    add_input({'type': 'test_video', 'pattern': 4, 'separate_process': True})
+    time.sleep(3)
+    assert_inputs([{'type': 'test_video', 'id': 1, 'pattern': 4, 'separate_process': True}])
+    worker = api_get('/api/inputs').json()[0]['worker']
+    assert worker['state'] == 'PLAYING'
+    assert worker['restarts'] == 0
+
+    # It can be mixed like any other input:
+    add_mixer({'sources': [{'uid': 'input1'}]})
+    time.sleep(1)
+    assert_everything_in_playing_state()
+
+    # Updates are passed on to the worker:
+    update_input(1, {'pattern': 5})
+    time.sleep(1)
+    assert_inputs([{'type': 'test_video', 'id': 1, 'pattern': 5}])
+
+    # It cannot be moved into (or out of) a separate process once created:
+    update_input(1, {'separate_process': False}, 400)
+
+    # If the worker process dies, it is restarted:
+    os.kill(worker['pid'], signal.SIGKILL)
+    time.sleep(5)
+    assert_inputs([{'type': 'test_video', 'id': 1, 'pattern': 5}])
+    worker_after_restart = api_get('/api/inputs').json()[0]['worker']
+    assert worker_after_restart['pid'] != worker['pid']
+    assert worker_after_restart['restarts'] == 1
+
+    # Deleting the input ends the worker:
+    delete_input(1)
+    time.sleep(1)
+    with pytest.raises(ProcessLookupError):
+        os.kill(worker_after_restart['pid'], 0)
@@ -0,0 +1,55 @@
+import time
+import pytest
+import inspect
+from utils import *
+
+
+def test_outputs_with_same_settings_share_an_encoder(run_brave, create_config_file):
+    output_video_location1 = get_temp_directory() + '/shared1.mp4'
+    output_video_location2 = get_temp_directory() + '/shared2.mp4'
+    output_video_location3 = get_temp_directory() + '/shared3.mp4'
+    config = {
+        'share_encoders': True,
+        'inputs': [
+            {'type': 'test_video', 'pattern': 4},  # pattern 4 is red
+        ],
+        'outputs': [
+            {'type': 'file', 'source': 'input1', 'location': output_video_location1},
+            {'type': 'file', 'source': 'input1', 'location': output_video_location2},
+            {'type': 'file', 'source': 'input1', 'location': output_video_location3, 'width': 320, 'height': 180}
+        ]
+    }
+    config_file = create_config_file(config)
+    run_brave(config_file.name)
+    time.sleep(4)
+    check_brave_is_running()
+    assert_everything_in_playing_state()
+
+    response = api_get('/api/outputs')
+    assert response.status_code == 200
+    outputs = response.json()
+    assert outputs[0]['encoder_group'] == outputs[1]['encoder_group']
+    assert outputs[2]['encoder_group'] != outputs[0]['encoder_group']
+
+    # Two encoder groups means two video encoders, not three:
+    assert count_elements_of_type_on_input(1, 'x264enc') == 2
+    assert os.path.exists(output_video_location1)
+    assert os.path.exists(output_video_location2)
+
+    # Deleting one output must not affect the other in the same group:
+    delete_output(1)
+    time.sleep(1)
+    assert_everything_in_playing_state()
+    assert count_elements_of_type_on_input(1, 'x264enc') == 2
+
+    # Deleting the final output in a group removes the encoder:
+    delete_output(2)
+    time.sleep(1)
+    assert count_elements_of_type_on_input(1, 'x264enc') == 1
+
+
+def count_elements_of_type_on_input(input_id, element_type):
+    response = api_get('/api/elements?show_inside_bin_elements=yes')
+    assert response.status_code == 200
+    elements = response.json()['inputs'][str(input_id)]['elements']
+    return len([e for e in elements if 'type' in e and e['type'] == element_type])
@@ -0,0 +1,34 @@
+import time
+import pytest
+import inspect
+from utils import *
+from PIL import Image
+
+RED = [255, 0, 0]
+
+
+@pytest.mark.parametrize('transport', ['inter', 'proxy', 'app', 'shm'])
+def test_transport_from_input_to_mixer_to_output(run_brave, create_config_file, transport):
+    '''Ensure content passes through each type of transport'''
+    config = {
+        'default_transport': transport,
+        'mixers': [{'sources': [{'uid': 'input1'}]}],
+        'inputs': [{'type': 'test_video', 'pattern': 4}],  # pattern 4 is red
+        'outputs': [{'type': 'image', 'source': 'mixer1'}]
+    }
+    config_file = create_config_file(config)
+    run_brave(config_file.name)
+    time.sleep(4)
+    check_brave_is_running()
+    assert_everything_in_playing_state()
+    assert api_get('/api/outputs').json()[0]['transport'] == transport
+    assert_image_output_color(1, RED)
+
+
+def test_invalid_transport_is_rejected(run_brave):
+    run_brave()
+    time.sleep(1)
+    add_input({'type': 'test_video'})
+    add_mixer({})
+    overlay_source('input1', 1, details={'transport': 'not-a-transport'}, status_code=400)
+    check_brave_is_running()
@@ -0,0 +1,53 @@
+import time, pytest, inspect
+from utils import *
+
+
+def test_webrtc_output_with_layers(run_brave, create_config_file):
+    config = {
+        'enable_audio': False,
+        'inputs': [{'type': 'test_video'}],
+        'outputs': [{'type': 'webrtc', 'source': 'input1', 'width': 1280, 'height': 720, 'layers': 3}]
+    }
+    config_file = create_config_file(config)
+    run_brave(config_file.name)
+    time.sleep(2)
+    check_brave_is_running()
+
+    # Each layer is half the size of the one before, and has no peers yet:
+    assert_outputs([{'type': 'webrtc', 'id': 1, 'layers': 3, 'video_layers': [
+        {'width': 1280, 'height': 720, 'peers': 0},
+        {'width': 640, 'height': 360, 'peers': 0},
+        {'width': 320, 'height': 180, 'peers': 0}
+    ]}])
+
+    # The number of layers cannot be changed once created:
+    response = api_post('/api/outputs/1', {'layers': 1})
+    assert response.status_code == 400
+
+
+def test_webrtc_output_has_one_layer_by_default(run_brave):
+    run_brave()
+    check_brave_is_running()
+    add_input({'type': 'test_video'})
+    add_output({'type': 'webrtc', 'source': 'input1'})
+    time.sleep(1)
+    assert_outputs([{'type': 'webrtc', 'layers': 1, 'video_layers': [{'width': 480, 'height': 270, 'peers': 0}]}])
+
+
+def test_webrtc_output_with_egress_workers(run_brave):
+    run_brave()
+    check_brave_is_running()
+    add_input({'type': 'test_video'})
+    add_output({'type': 'webrtc', 'source': 'input1', 'egress_workers': 2})
+    add_output({'type': 'webrtc', 'source': 'input1', 'egress_workers': 100}, 400)
+    time.sleep(2)
+    check_brave_is_running()
+
+    # Each worker is started once the output is playing:
+    assert_outputs([{'type': 'webrtc', 'egress_workers': 2}])
+    workers = api_get('/api/outputs').json()[0]['workers']
+    assert len(workers) == 2
+    for worker in workers:
+        assert worker['pid'] is not None
+        assert worker['peers'] == 0
+        assert worker['restarts'] == 0
@@ -0,0 +1,20 @@
+import sys
+sys.path.append('.')
+from brave.abstract_collection import AbstractCollection
+
+
+def test_assign_ids_avoids_ids_already_used_or_in_the_config():
+    collection = AbstractCollection(session=None)
+    collection._items[1] = 'existing'
+    configs = [{'type': 'a'}, {'type': 'b', 'id': 2}, {'type': 'c'}]
+    assert [c['id'] for c in collection.assign_ids(configs)] == [3, 2, 4]
+    # The original configs are not changed:
+    assert 'id' not in configs[0]
+
+
+def test_put_in_order():
+    collection = AbstractCollection(session=None)
+    for id in [5, 1, 3, 2]:
+        collection._items[id] = 'item%d' % id
+    collection.put_in_order([1, 3, 5])
+    assert list(collection.keys()) == [2, 1, 3, 5]
@@ -0,0 +1,61 @@
+import time, pytest, inspect, sys
+from types import SimpleNamespace
+sys.path.append('.')
+from brave.connections import ConnectionCollection
+
+
+def test_lookups_do_not_slow_down_as_connections_are_added():
+    '''
+    Micro-benchmark: finding a block's connections must not depend on how many connections there are.
+    '''
+    small_time = time_lookups(*create_collection(20))
+    large_time = time_lookups(*create_collection(5000))
+    # 250 times as many connections; a linear scan would be ~250 times slower. Allow plenty for noise:
+    assert large_time < small_time * 10, 'Lookups took %fs with 20 connections but %fs with 5000' % \
+        (small_time, large_time)
+
+
+def test_indexes_are_updated_when_a_connection_is_removed():
+    cc, blocks = create_collection(3)
+    source, dest = blocks[1]
+    connection = cc.get_connection_between_source_and_dest(source, dest)
+    assert cc.get_all_for_source(source) == [connection]
+    assert cc.get_first_for_dest(dest) == connection
+
+    cc.pop(connection.id)
+    assert cc.get_connection_between_source_and_dest(source, dest) is None
+    assert cc.get_all_for_source(source) == []
+    assert cc.get_first_for_dest(dest) is None
+    assert len(cc) == 2
+
+    # Other connections are unaffected:
+    assert cc.get_first_for_source(blocks[0][0]).id == 1
+    assert cc.get_all_for_dest(blocks[2][1])[0].id == 3
+
+
+def create_collection(count):
+    '''
+    Creates a collection with 'count' connections, each between a different pair of blocks.
+    Simple objects are used in place of real connections, so that no pipelines are created.
+    '''
+    cc = ConnectionCollection(None)
+    blocks = []
+    for id in range(1, count + 1):
+        source, dest = object(), object()
+        connection = SimpleNamespace(id=id, source=source, dest=dest)
+        cc._items[id] = connection
+        cc._add_to_indexes(connection)
+        blocks.append((source, dest))
+    return cc, blocks
+
+
+def time_lookups(cc, blocks, iterations=2000):
+    # Look up the final pair, which a linear scan would find last:
+    source, dest = blocks[-1]
+    start = time.perf_counter()
+    for i in range(iterations):
+        cc.get_all_for_source(source)
+        cc.get_all_for_dest(dest)
+        cc.get_first_for_dest(dest)
+        cc.get_connection_between_source_and_dest(source, dest)
+    return time.perf_counter() - start
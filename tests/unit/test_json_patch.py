@@ -0,0 +1,35 @@
+import sys
+sys.path.append('.')
+from brave.helpers import create_json_patch
+
+'''
+Unit test for create_json_patch() in brave/helpers.py
+'''
+
+
+def test_no_changes_gives_empty_patch():
+    block = {'id': 1, 'state': 'PLAYING', 'sources': [{'uid': 'input1'}]}
+    assert create_json_patch(block, {**block}) == []
+
+
+def test_changed_added_and_removed_keys():
+    old = {'id': 1, 'volume': 0.5, 'buffering_percent': 50}
+    new = {'id': 1, 'volume': 0.8, 'state': 'PLAYING'}
+    assert create_json_patch(old, new) == [
+        {'op': 'remove', 'path': '/buffering_percent'},
+        {'op': 'replace', 'path': '/volume', 'value': 0.8},
+        {'op': 'add', 'path': '/state', 'value': 'PLAYING'}
+    ]
+
+
+def test_nested_dictionaries_and_lists():
+    old = {'props': {'width': 640, 'height': 360}, 'sources': [{'uid': 'input1'}]}
+    new = {'props': {'width': 1280, 'height': 360}, 'sources': [{'uid': 'input1'}, {'uid': 'input2'}]}
+    assert create_json_patch(old, new) == [
+        {'op': 'replace', 'path': '/props/width', 'value': 1280},
+        {'op': 'replace', 'path': '/sources', 'value': [{'uid': 'input1'}, {'uid': 'input2'}]}
+    ]
+
+
+def test_keys_are_escaped():
+    assert create_json_patch({}, {'a/b~c': 1}) == [{'op': 'add', 'path': '/a~1b~0c', 'value': 1}]
@@ -0,0 +1,39 @@
+import sys
+sys.path.append('.')
+from brave.level_meters import LevelMeters
+
+'''
+Unit test for brave/level_meters.py
+'''
+
+
+class Block():
+    def __init__(self, uid):
+        self.uid = uid
+
+
+class LevelStructure():
+    def __init__(self, **values):
+        self.values = values
+
+    def get_value(self, name):
+        return self.values[name]
+
+
+def test_latest_levels_of_every_block_are_sent_together():
+    level_meters = LevelMeters(session=None)
+    sent = []
+    level_meters.listeners.append(sent.append)
+
+    level_meters.on_level(Block('input1'), LevelStructure(peak=[-10.04, -9.0], rms=[-20.0, -19.0], decay=[-10.0, -9.0]))
+    level_meters.on_level(Block('input1'), LevelStructure(peak=[-5.0, -4.0], rms=[-15.0, -14.0], decay=[-5.0, -4.0]))
+    level_meters.on_level(Block('mixer1'), LevelStructure(peak=[-700.0], rms=[float('-inf')], decay=[-30.0]))
+    assert level_meters.send_levels() is True
+    assert sent == [{
+        'input1': {'peak': [-5.0, -4.0], 'rms': [-15.0, -14.0], 'decay': [-5.0, -4.0]},
+        'mixer1': {'peak': [-100], 'rms': [-100], 'decay': [-30.0]}
+    }]
+
+    # Nothing is sent if nothing has been measured since:
+    level_meters.send_levels()
+    assert len(sent) == 1
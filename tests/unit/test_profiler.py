@@ -0,0 +1,24 @@
+import sys
+sys.path.append('.')
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+from brave.profiler import Profiler
+
+'''
+Unit test for brave/profiler.py
+'''
+
+Gst.init(None)
+
+
+def test_tracer_records_are_only_logged_while_sampling():
+    profiler = Profiler(session=None)
+    assert profiler._tracer_category.get_name() == 'GST_TRACER'
+    assert profiler._tracer_category.get_threshold() == Gst.DebugLevel.NONE
+
+    for i in range(5):
+        assert profiler._start_sample() is True
+        assert profiler._tracer_category.get_threshold() == Gst.DebugLevel.TRACE
+        assert profiler._end_sample() is False
+        assert profiler._tracer_category.get_threshold() == Gst.DebugLevel.NONE
@@ -26,9 +26,9 @@ def run_brave(config_file=None, port=None):
     brave_processes = {}
 
 
-def api_get(path, port=DEFAULT_PORT, stream=False):
+def api_get(path, port=DEFAULT_PORT, stream=False, headers=None):
     url = 'http://localhost:%d%s' % (port, path)
-    return requests.get(url, stream=stream)
+    return requests.get(url, stream=stream, headers=headers)
 
 
 def api_post(path, data, port=DEFAULT_PORT):